@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+"""
+counts the objects kept alive by a decoded record tree of a repetitive
+SOAP message: allocated blocks, distinct record and name objects
+
+usage: python -m benchmarks.allocations [ORDERS]
+"""
+from __future__ import absolute_import, print_function
+
+import gc
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+from wcf.records import Record
+from benchmarks.payloads import orders_response, count_records
+
+
+def walk(records):
+    for r in records:
+        yield r
+        for a in getattr(r, 'attributes', ()):
+            yield a
+        childs = getattr(r, 'childs', None)
+        if childs:
+            for c in walk(childs):
+                yield c
+
+
+def distinct(records):
+    objects = set()
+    names = set()
+    for r in walk(records):
+        objects.add(id(r))
+        for field in ('prefix', 'name'):
+            value = getattr(r, field, None)
+            if value is not None:
+                names.add(id(value))
+    return len(objects), len(names)
+
+
+if __name__ == '__main__':
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    data = orders_response(orders)
+
+    gc.collect()
+    tracemalloc.start()
+    records = Record.parse(BytesIO(data))
+    gc.collect()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = snapshot.statistics('filename')
+    blocks = sum(s.count for s in stats)
+    size = sum(s.size for s in stats)
+
+    start = time.time()
+    for _ in range(3):
+        Record.parse(BytesIO(data))
+    elapsed = (time.time() - start) / 3
+
+    objects, names = distinct(records)
+    print('%d records, %d distinct record objects, %d distinct names' %
+          (count_records(records), objects, names))
+    print('%d live blocks, %d bytes held' % (blocks, size))
+    print('%.3fs per decode' % elapsed)
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+"""
+compares the batch conversion with pickled transfer of the messages and
+results to the transfer through shared memory arenas
+
+usage: python -m benchmarks.batch [ORDERS] [MESSAGES] [WORKERS]
+"""
+from __future__ import absolute_import, print_function, division
+
+import sys
+import time
+
+from wcf.batch import decode_many, encode_many
+from wcf.codec import Codec
+from benchmarks.payloads import orders_response
+
+
+def measure(convert, items, **kwargs):
+    start = time.time()
+    count = sum(1 for r in convert(items, **kwargs) if r.ok)
+    assert count == len(items)
+    return time.time() - start
+
+
+if __name__ == '__main__':
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    data = orders_response(orders)
+    xml = Codec().to_xml(Codec().decode(data))
+    print('%d messages of %d bytes (%d bytes XML), %d workers' %
+          (messages, len(data), len(xml), workers))
+    for name, convert, items, kwargs in (
+            ('decode to XML', decode_many, [data] * messages, {}),
+            ('decode to records', decode_many, [data] * messages,
+             {'xml': False}),
+            ('encode XML', encode_many, [xml] * messages, {})):
+        pickled = measure(convert, items, workers=workers, **kwargs)
+        shared = measure(convert, items, workers=workers,
+                         shared_memory=True, **kwargs)
+        print('%-18s pickled %.2fs, shared memory %.2fs (%.2fx)' %
+              (name, pickled, shared, pickled / shared))
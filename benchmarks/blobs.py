@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+"""
+decodes a message with one large Bytes32 payload from a file, with the
+payload kept in memory or streamed into a TempFileSink, and reports the
+peak RSS of each run
+
+usage: python -m benchmarks.blobs [MEGABYTES]
+"""
+from __future__ import absolute_import, print_function
+
+import os
+import resource
+import struct
+import subprocess
+import sys
+import tempfile
+
+from wcf.records import Record, ShortElementRecord, TempFileSink
+
+
+def write_message(path, size):
+    chunk = b'x' * (1024 * 1024)
+    with open(path, 'wb') as fp:
+        fp.write(ShortElementRecord('Envelope').to_bytes())
+        fp.write(ShortElementRecord('Data').to_bytes())
+        # Bytes32TextWithEndElement
+        fp.write(struct.pack(b'<BI', 0xA3, size))
+        for _ in range(size // len(chunk)):
+            fp.write(chunk)
+        fp.write(ShortElementRecord('Tail').to_bytes() + b'\x99\x02ok\x01')
+
+
+def decode(path, mode):
+    sink = TempFileSink() if mode == 'sink' else None
+    with open(path, 'rb') as fp:
+        records = Record.parse(fp, blob_sink=sink)
+    assert records[0].childs[1].childs[0].value == 'ok'
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        print(decode(sys.argv[1], sys.argv[2]))
+        sys.exit()
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        write_message(path, size * 1024 * 1024)
+        for mode in ('memory', 'sink'):
+            rss = subprocess.check_output(
+                [sys.executable, '-m', 'benchmarks.blobs', path, mode])
+            print('%dMB payload, %-6s: peak RSS %.1f MB' %
+                  (size, mode, int(rss) / 1024.0))
+    finally:
+        os.remove(path)
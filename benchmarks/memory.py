@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+"""
+measures the memory held by a decoded record tree and by the same
+message as CompactDocument
+
+usage: python -m benchmarks.memory [ORDERS]
+"""
+from __future__ import absolute_import, print_function
+
+import gc
+import sys
+import tracemalloc
+from io import BytesIO
+
+from wcf.compact import CompactDocument
+from wcf.records import Record
+from benchmarks.payloads import orders_response, count_records
+
+
+def measure(decode, data):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = decode(data)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size, result
+
+
+if __name__ == '__main__':
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    data = orders_response(orders)
+    size, records = measure(lambda d: Record.parse(BytesIO(d)), data)
+    nodes = count_records(records)
+    del records
+    print('%d bytes input, %d records' % (len(data), nodes))
+    print('%d bytes held by the tree, %.1f bytes per record' %
+          (size, size / float(nodes)))
+    size, doc = measure(CompactDocument, data)
+    print('%d bytes held by the CompactDocument, %.1f bytes per node' %
+          (size, size / float(len(doc))))
@@ -0,0 +1,48 @@
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+"""synthetic SOAP payloads for the benchmarks"""
+from __future__ import absolute_import, unicode_literals
+
+from wcf.records import *
+
+
+def orders_response(count=1000):
+    """
+    returns the binary form of a GetOrdersResponse with count orders
+
+    >>> len(orders_response(2)) > 0
+    True
+    """
+    envelope = PrefixDictionaryElementSRecord(2)
+    envelope.attributes.append(DictionaryXmlnsAttributeRecord('s', 4))
+    body = PrefixDictionaryElementSRecord(14)
+    envelope.childs.append(body)
+    response = ShortElementRecord('GetOrdersResponse')
+    response.attributes.append(ShortXmlnsAttributeRecord('urn:orders'))
+    body.childs.append(response)
+    orders = ShortElementRecord('Orders')
+    response.childs.append(orders)
+    for i in range(count):
+        order = ShortElementRecord('Order')
+        order.attributes.append(ShortAttributeRecord('status',
+                                                     Chars8TextRecord('open')))
+        for name, value in (('Id', Int32TextRecord(100000 + i)),
+                            ('Customer', Chars8TextRecord('customer%d' % i)),
+                            ('Total', DoubleTextRecord(i * 1.25)),
+                            ('Paid', TrueTextRecord() if i % 2 else
+                             FalseTextRecord())):
+            field = ShortElementRecord(name)
+            field.childs.append(value)
+            order.childs.append(field)
+        orders.childs.append(order)
+    return dump_records([envelope])
+
+
+def count_records(records):
+    """counts the records of a tree including attributes"""
+    count = 0
+    for r in records:
+        count += 1 + len(getattr(r, 'attributes', ()))
+        childs = getattr(r, 'childs', None)
+        if childs:
+            count += count_records(childs)
+    return count
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+"""
+sends a message with large Bytes payloads over a socket pair, encoded
+into one bytestring (dump_records + sendall) and as a segment list
+(dump_segments + send_segments)
+
+usage: python -m benchmarks.segments [BLOBS] [KILOBYTES]
+"""
+from __future__ import absolute_import, print_function
+
+import socket
+import sys
+import threading
+import time
+from io import BytesIO
+
+from wcf.records import (Record, ShortElementRecord, Bytes32TextRecord,
+                         Chars8TextRecord, dump_records, dump_segments,
+                         send_segments)
+
+
+def message(blobs, size):
+    envelope = ShortElementRecord('Envelope')
+    for i in range(blobs):
+        part = ShortElementRecord('Part')
+        name = ShortElementRecord('Name')
+        name.childs.append(Chars8TextRecord('part%d' % i))
+        data = ShortElementRecord('Data')
+        data.childs.append(Bytes32TextRecord(b'x' * (size * 1024)))
+        part.childs.extend([name, data])
+        envelope.childs.append(part)
+    return Record.parse(BytesIO(dump_records([envelope])))
+
+
+def drain(sock, total):
+    received = 0
+    while received < total:
+        received += len(sock.recv(1024 * 1024))
+
+
+def run(send, total, rounds=20):
+    a, b = socket.socketpair()
+    best = None
+    for _ in range(rounds):
+        thread = threading.Thread(target=drain, args=(b, total))
+        thread.start()
+        start = time.time()
+        send(a)
+        thread.join()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    a.close()
+    b.close()
+    return best
+
+
+if __name__ == '__main__':
+    blobs = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    records = message(blobs, size)
+    total = len(dump_records(records))
+    contiguous = run(lambda s: s.sendall(dump_records(records)), total)
+    segments = run(lambda s: send_segments(s, dump_segments(records)), total)
+    print('%d bytes, %d payloads' % (total, blobs))
+    print('dump_records + sendall:       %.2f ms' % (contiguous * 1000))
+    print('dump_segments + send_segments: %.2f ms' % (segments * 1000))
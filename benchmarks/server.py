@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+"""
+compares the latency of a decode request to a running wcf.server with
+starting wcf2xml.py per message
+
+usage: python -m benchmarks.server [REQUESTS] [JOBS]
+"""
+from __future__ import absolute_import, print_function, division
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from wcf.server import Server, Client
+from benchmarks.payloads import orders_response
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'wcf2xml.py')
+
+
+if __name__ == '__main__':
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    jobs = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    data = orders_response(1)
+    path = os.path.join(tempfile.mkdtemp(), 'wcf.sock')
+    server = Server(path, jobs=jobs)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        with Client(path) as client:
+            client.decode(data)
+            start = time.time()
+            for i in range(requests):
+                client.decode(data)
+            served = (time.time() - start) / requests
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+    runs = 10
+    start = time.time()
+    for i in range(runs):
+        subprocess.run([sys.executable, SCRIPT], input=data,
+                       stdout=subprocess.DEVNULL, check=True)
+    spawned = (time.time() - start) / runs
+    print('%d byte message, %d workers' % (len(data), jobs))
+    print('server:  %8.1f us per message' % (served * 1e6))
+    print('wcf2xml: %8.1f us per message (%.0fx)' %
+          (spawned * 1e6, spawned / served))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+"""
+measures the decode throughput of a thread pool sharing one Codec for
+an increasing number of threads. On a free-threaded build (python3.13t
+and later, with the GIL disabled) the throughput scales with the
+threads, with the GIL it stays about flat.
+
+usage: python -m benchmarks.threads [ORDERS] [MESSAGES] [MAX_THREADS]
+"""
+from __future__ import absolute_import, print_function, division
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from wcf.codec import Codec
+from benchmarks.payloads import orders_response
+
+
+def gil_enabled():
+    check = getattr(sys, '_is_gil_enabled', None)
+    return True if check is None else check()
+
+
+def run(codec, data, messages, threads):
+    with ThreadPoolExecutor(threads) as pool:
+        start = time.time()
+        for records in pool.map(codec.decode, [data] * messages):
+            assert records
+        return time.time() - start
+
+
+if __name__ == '__main__':
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    max_threads = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    data = orders_response(orders)
+    codec = Codec()
+    run(codec, data, messages // 10 or 1, 1)
+    print('%s, GIL %s, %d byte messages' %
+          (sys.version.split()[0], 'enabled' if gil_enabled() else
+           'disabled', len(data)))
+    base = None
+    threads = 1
+    while threads <= max_threads:
+        elapsed = run(codec, data, messages, threads)
+        rate = messages / elapsed
+        base = base or rate
+        print('%2d threads: %8.1f messages/s, %.2fx' %
+              (threads, rate, rate / base))
+        threads *= 2
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+#  Copyright (c) 2011, Timo Schmid <tschmid@ernw.de>
+#  All rights reserved.
+#  
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#  * Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#  * Neither the name of the ERMW GmbH nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    from wcf.learning import DictionaryLearner
+
+    parser = argparse.ArgumentParser(
+        description='learns a dictionary from a corpus of XML or binary '
+                    'messages')
+    parser.add_argument('files', nargs='+', help='message files')
+    parser.add_argument('--min-count', type=int, default=2,
+                        help='minimal occurrences of a string')
+    parser.add_argument('--max-strings', type=int,
+                        help='maximum number of strings to learn')
+    parser.add_argument('--session-length', type=int, default=1,
+                        help='messages per session (connection)')
+    parser.add_argument('--json', metavar='FILE',
+                        help='writes a loadable dictionary file instead of '
+                             'printing the wcf.dictionary entries')
+    parser.add_argument('--report', action='store_true',
+                        help='prints the projected savings per message')
+    args = parser.parse_args()
+
+    learner = DictionaryLearner(min_count=args.min_count)
+    for path in args.files:
+        learner.add_file(path)
+    learned = learner.learn(args.session_length, args.max_strings)
+    if args.json:
+        learned.save(args.json)
+    else:
+        print(learned.to_python())
+    if learned.session:
+        sys.stderr.write('session dictionary: %s\n' %
+                         ', '.join(learned.session))
+    if args.report:
+        sys.stderr.write(learned.format_report() + '\n')
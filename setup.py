@@ -11,16 +11,22 @@ setup(
     keywords = "wcf wcf-binary xml",
     url = "",
     packages=['wcf', 'wcf.records', 'tests'],
-    scripts=['wcf2xml.py', 'xml2wcf.py'],
+    scripts=['wcf2xml.py', 'xml2wcf.py', 'learndict.py', 'wcfserve.py'],
     long_description="",
     test_suite="tests.alltests.Suite",
-    install_requires=["future"],
+    python_requires=">=3.8",
     classifiers=[
         "Development Status :: 4 - Beta",
         "Topic :: Utilities",
         "License :: OSI Approved :: BSD License",
-        "Programming Language :: Python :: 2",
         "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only",
+        "Programming Language :: Python :: 3.8",
+        "Programming Language :: Python :: 3.9",
+        "Programming Language :: Python :: 3.10",
+        "Programming Language :: Python :: 3.11",
+        "Programming Language :: Python :: 3.12",
+        "Programming Language :: Python :: 3.13",
         "Topic :: Internet :: WWW/HTTP",
         "Topic :: Software Development :: Libraries :: Python Modules",
     ],
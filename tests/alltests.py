@@ -1,4 +1,4 @@
-#!/usr/bin/env python2
+#!/usr/bin/env python3
 # vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
 
 from __future__ import absolute_import
@@ -33,6 +33,24 @@ test_bin = decode(
 "00b7b218e20a000a002d00000005000500280000000601b11d0000000f43"
 "4c5753315745425345525649439f0145010101", "hex_codec")
 
+# net.tcp client stream: preamble, two sized envelopes with session
+# dictionary strings and the End record
+framing_bin = decode(
+"0001000102021f6e65742e7463703a2f2f6c6f63616c686f73743a383030"
+"302f4f726465727303080c06be011b0347657413687474703a2f2f74656d"
+"707572692e6f72672f02696456020b0173040b0161065608440a1e0082b7"
+"3c68007400740070003a002f002f00740065006d0070007500720069002e"
+"006f00720067002f0049004f00720064006500720073002f004700650074"
+"00440c1e0082b73e6e00650074002e007400630070003a002f002f006c00"
+"6f00630061006c0068006f00730074003a0038003000300030002f004f00"
+"7200640065007200730001560e42010a034205892a01010106a301005602"
+"0b0173040b0161065608440a1e0082b73c68007400740070003a002f002f"
+"00740065006d0070007500720069002e006f00720067002f0049004f0072"
+"0064006500720073002f00470065007400440c1e0082b73e6e0065007400"
+"2e007400630070003a002f002f006c006f00630061006c0068006f007300"
+"74003a0038003000300030002f004f007200640065007200730001560e42"
+"010a034205892b01010107", "hex_codec")
+
 class TransformTest(unittest.TestCase):
 
     def runTest(self):
@@ -42,6 +60,1042 @@ class TransformTest(unittest.TestCase):
 
         self.assertEqual(test_bin, new)
 
+class ProjectionTest(unittest.TestCase):
+
+    def runTest(self):
+        from wcf.projection import project
+        paths = ['s:Envelope/s:Header/a:MessageID',
+                 's:Envelope/s:Body/trust:RequestSecurityToken/trust:KeySize',
+                 's:Envelope/s:Body/*/trust:BinaryExchange',
+                 's:Envelope/s:Missing']
+        result = project(test_bin, paths)
+
+        self.assertEqual([str(r.childs[0]) for r in result[paths[0]]],
+                         ['urn:uuid:d493b25d-0bbc-47a5-b9dc-cb2f140fd0c3'])
+        self.assertEqual([str(r.childs[0]) for r in result[paths[1]]],
+                         ['256'])
+        self.assertEqual(len(result[paths[2]]), 1)
+        self.assertEqual(result[paths[3]], [])
+
+class ValidatorTest(unittest.TestCase):
+
+    def runTest(self):
+        from wcf.validator import validate
+        result = validate(test_bin)
+        self.assertTrue(result)
+        self.assertEqual(result.elements, 13)
+        self.assertEqual(result.max_depth, 4)
+
+        for i in range(len(test_bin)):
+            self.assertFalse(validate(test_bin[:i]))
+
+        # text records with EndElement report their own offset
+        for data, offset in ((b'\x9b\x01\x00x', 0),
+                             (b'\x40\x01a\x01\x9b\x01\x00x', 4),
+                             (b'\x40\x01a\x99\x01x\x9b\x01\x00y', 6)):
+            result = validate(data)
+            self.assertEqual(result.error, 'unbalanced EndElement')
+            self.assertEqual(result.offset, offset)
+
+        # one root element, no text outside of it
+        for data, error, offset in (
+                (b'@\x01a\x01@\x01b\x01', 'multiple root elements', 4),
+                (b'@\x01a\x01\x03@\x01a\x01\xb5\x01\x01',
+                 'multiple root elements', 4),
+                (b'\x03@\x01a\x01\xb5\x02\x01\x00',
+                 'multiple root elements', 0),
+                (b'\x98\x01x@\x01a\x01', 'text outside the root element',
+                 0),
+                (b'@\x01a\x01\x98\x01x', 'text outside the root element',
+                 4)):
+            result = validate(data)
+            self.assertEqual((result.error, result.offset), (error, offset))
+        self.assertTrue(validate(b'\x03@\x01a\x01\xb5\x01\x01'))
+
+class LimitsTest(unittest.TestCase):
+
+    def runTest(self):
+        from io import BytesIO
+        limits = DecodeLimits()
+        self.assertEqual(test_bin,
+                dump_records(Record.parse(BytesIO(test_bin), limits=limits)))
+
+        # ArrayRecord claiming 2**28 items
+        hostile = b'\x03@\x04item\x01\x8d\x80\x80\x80\x80\x01'
+        with self.assertRaises(DecodeLimitError) as cm:
+            Record.parse(BytesIO(hostile), limits=limits)
+        self.assertEqual(cm.exception.limit, 'max_array_count')
+
+        # Chars32TextRecord claiming 4 GB
+        hostile = b'@\x01a\x9c\xff\xff\xff\xff'
+        with self.assertRaises(DecodeLimitError) as cm:
+            Record.parse(BytesIO(hostile), limits=limits)
+        self.assertEqual(cm.exception.limit, 'max_string_bytes')
+
+        limits = DecodeLimits(max_records=5)
+        with self.assertRaises(DecodeLimitError) as cm:
+            Record.parse(BytesIO(test_bin), limits=limits)
+        self.assertEqual(cm.exception.limit, 'max_records')
+
+        # 1 KB of booleans, every item decoded as <Envelope>..</Envelope>
+        array = b'\x03B\x02\x01\xb5\xe8\x07' + b'\x01' * 1000
+        limits = DecodeLimits(max_total_bytes=4096)
+        with self.assertRaises(DecodeLimitError) as cm:
+            Record.parse(BytesIO(array), limits=limits)
+        self.assertEqual(cm.exception.limit, 'max_total_bytes')
+        limits = DecodeLimits(max_total_bytes=32 * 1024)
+        self.assertEqual(len(Record.parse(BytesIO(array),
+                                          limits=limits)[0].data), 1000)
+
+class LazyTest(unittest.TestCase):
+
+    def runTest(self):
+        from io import BytesIO, StringIO
+        eager = Record.parse(BytesIO(test_bin))
+        lazy = Record.parse(BytesIO(test_bin), lazy=True)
+
+        header = lazy[0].childs[0]
+        self.assertEqual(str(header), '<s:Header>')
+        self.assertFalse(lazy[0].childs[1].childs.loaded)
+
+        self.assertEqual(test_bin, dump_records(lazy))
+        out_eager, out_lazy = StringIO(), StringIO()
+        print_records(eager, fp=out_eager)
+        print_records(lazy, fp=out_lazy)
+        self.assertEqual(out_eager.getvalue(), out_lazy.getvalue())
+
+class RawTest(unittest.TestCase):
+
+    def runTest(self):
+        from io import BytesIO
+        records = Record.parse(BytesIO(test_bin), raw=True)
+        self.assertEqual(test_bin, dump_records(records))
+
+        envelope = records[0]
+        header, body = envelope.childs
+        message_id = header.childs[1]
+        message_id.childs[0].uuid = message_id.childs[0].uuid.__class__(
+            'urn:uuid:00000000-0000-0000-0000-000000000000')
+        self.assertIsNone(envelope.raw)
+        self.assertIsNone(header.raw)
+        self.assertIsNotNone(body.raw)
+        self.assertIsNotNone(header.childs[0].raw)
+
+        expected = Record.parse(BytesIO(test_bin))
+        expected[0].childs[0].childs[1].childs[0].uuid = \
+            message_id.childs[0].uuid
+        self.assertEqual(dump_records(expected), dump_records(records))
+
+        # tracking survives pickling, plain trees aren't tracked
+        import pickle
+        copy = pickle.loads(pickle.dumps(Record.parse(BytesIO(test_bin),
+                                                      raw=True)))
+        self.assertEqual(type(copy[0]).__name__, type(envelope).__name__)
+        self.assertIsNotNone(copy[0].raw)
+        copy[0].childs[1].childs[0].name = 'Other'
+        self.assertIsNone(copy[0].raw)
+        self.assertIsNotNone(copy[0].childs[0].raw)
+        self.assertFalse(type(expected[0]).__setattr__ is
+                         type(envelope).__setattr__)
+
+class PatchTest(unittest.TestCase):
+
+    def runTest(self):
+        import uuid
+        from io import BytesIO
+        from wcf.patch import PatchIndex
+        index = PatchIndex(test_bin)
+        message_id = 's:Envelope/s:Header/a:MessageID'
+        key_size = ('s:Envelope/s:Body/trust:RequestSecurityToken/'
+                    'trust:KeySize')
+        self.assertEqual(index.paths, sorted([message_id, key_size]))
+
+        new_id = uuid.UUID('12345678-1234-5678-1234-567812345678')
+        data = index.patch({message_id: new_id, key_size: 512})
+        self.assertEqual(len(data), len(test_bin))
+
+        expected = Record.parse(BytesIO(test_bin))
+        header, body = expected[0].childs
+        header.childs[1].childs[0].uuid = new_id
+        body.childs[0].childs[2].childs[0].value = 512
+        self.assertEqual(bytes(data), dump_records(expected))
+
+class CompactTest(unittest.TestCase):
+
+    def runTest(self):
+        import pickle
+        from io import BytesIO
+        from wcf.compact import CompactDocument
+        doc = CompactDocument(test_bin)
+        self.assertEqual(doc.encode(), test_bin)
+        self.assertEqual(dump_records(doc.to_records()), test_bin)
+
+        envelope = doc.cursor()
+        self.assertEqual(envelope.qname, 's:Envelope')
+        self.assertEqual(envelope['xmlns:a'],
+                         'http://www.w3.org/2005/08/addressing')
+        header, body = envelope.children()
+        self.assertEqual(header.parent, envelope)
+        self.assertEqual(header.next_sibling, body)
+        key_size = next(doc.find('KeySize'))
+        self.assertEqual(key_size.qname, 'trust:KeySize')
+        self.assertEqual([c.value for c in key_size.children()], ['256'])
+
+        expected = Record.parse(BytesIO(test_bin))[0].childs[1]
+        self.assertEqual(body.encode(), dump_records([expected]))
+        self.assertEqual(dump_records([body.record()]),
+                         dump_records([expected]))
+
+        copy = pickle.loads(pickle.dumps(doc, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(copy.encode(), test_bin)
+        self.assertEqual(copy.names, doc.names)
+        self.assertEqual(copy.strings, doc.strings)
+
+class SharedTest(unittest.TestCase):
+
+    def runTest(self):
+        from io import BytesIO
+        data = (b'@\x06Orders@\x05Order@\x04Paid\x87\x01'
+                b'@\x05Order@\x04Paid\x85\x01\x01')
+        first, second = Record.parse(BytesIO(data))[0].childs
+        self.assertTrue(first.name is second.name)
+        self.assertTrue(first.childs[0].name is second.childs[0].name)
+        self.assertTrue(first.childs[0].childs[0] is
+                        TrueTextRecord.shared())
+        self.assertTrue(second.childs[0].childs[0] is
+                        FalseTextRecord.shared())
+
+        records = Record.parse(BytesIO(data), raw=True)
+        self.assertEqual(dump_records(records), data)
+        records[0].childs[1].childs[0].childs[0] = TrueTextRecord()
+        self.assertEqual(dump_records(records), data.replace(b'\x85',
+                                                             b'\x87'))
+        self.assertEqual(dump_records(Record.parse(BytesIO(data))), data)
+
+class EncodedTextTest(unittest.TestCase):
+
+    def runTest(self):
+        import pickle
+        from io import BytesIO
+        payload = 'd\xe9j\xe0 vu ' * 100
+        el = ShortElementRecord('a')
+        el.childs = [Chars16TextRecord(payload),
+                     UnicodeChars16TextRecord(payload)]
+        data = dump_records([el])
+
+        records = Record.parse(BytesIO(data))
+        chars, unicode = records[0].childs
+        self.assertTrue(isinstance(chars.data, memoryview))
+        self.assertTrue(chars.data.obj is data)
+        self.assertEqual(dump_records(records), data)
+        self.assertTrue(chars._value is None and unicode._value is None)
+        self.assertEqual(chars.value, payload)
+        self.assertEqual(unicode.value, payload)
+
+        copy = pickle.loads(pickle.dumps(records))
+        self.assertEqual(copy[0].childs[0].value, payload)
+        self.assertEqual(dump_records(copy), data)
+
+        unicode.value = 'x'
+        self.assertEqual(unicode.data, None)
+        self.assertEqual(unicode.to_bytes(), b'\xb8\x02\x00x\x00')
+
+class BytesTest(unittest.TestCase):
+
+    def runTest(self):
+        import base64
+        from io import BytesIO, StringIO
+        blob = bytes(bytearray(range(256))) * 1000
+        el = ShortElementRecord('Data')
+        el.childs = [Bytes32TextRecord(blob)]
+        data = dump_records([el])
+
+        records = Record.parse(BytesIO(data))
+        value = records[0].childs[0].value
+        self.assertTrue(isinstance(value, memoryview))
+        self.assertTrue(value.obj is data)
+        self.assertEqual(value, blob)
+        self.assertEqual(dump_records(records), data)
+
+        out = StringIO()
+        print_records(records, fp=out)
+        self.assertEqual(out.getvalue(), '<Data>%s</Data>' %
+                         base64.b64encode(blob).decode())
+
+class BlobSinkTest(unittest.TestCase):
+
+    def runTest(self):
+        import base64
+        from io import BytesIO, StringIO
+        blob = b'0123456789' * 1000
+        el = ShortElementRecord('Data')
+        el.childs = [Bytes16TextRecord(blob)]
+        tail = ShortElementRecord('Tail')
+        tail.childs = [Chars8TextRecord('ok')]
+        data = dump_records([el, tail])
+
+        sink = TempFileSink(threshold=1000, chunk_size=999)
+        records = Record.parse(BytesIO(data), blob_sink=sink)
+        value = records[0].childs[0].value
+        self.assertTrue(isinstance(value, FileBlob))
+        self.assertEqual(value.mmap(), blob)
+        self.assertEqual(records[1].childs[0].value, 'ok')
+        self.assertEqual(dump_records(records), data)
+        out = StringIO()
+        print_records(records[:1], fp=out)
+        self.assertEqual(out.getvalue(), '<Data>%s</Data>' %
+                         base64.b64encode(blob).decode())
+        value.close()
+
+        limits = DecodeLimits(max_string_bytes=5000)
+        self.assertRaises(DecodeLimitError, Record.parse, BytesIO(data),
+                          limits=limits, blob_sink=sink)
+        self.assertRaises(EOFError, Record.parse, BytesIO(data[:-500]),
+                          blob_sink=sink)
+
+        # a sink without consume can't be created
+        from wcf.records.blobs import BlobSink
+
+        class NoSink(BlobSink):
+            pass
+        self.assertRaises(TypeError, NoSink)
+
+class WriteRecordsTest(unittest.TestCase):
+
+    def runTest(self):
+        import os
+        import socket
+        import tempfile
+        import threading
+        from io import BytesIO
+        blob = os.urandom(300 * 1024)
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(b'header' + blob)
+            el = ShortElementRecord('Data')
+            el.childs = [Bytes32TextRecord(blob)]
+            expected = dump_records([el, ShortElementRecord('Tail')])
+
+            with open(path, 'rb') as fp:
+                fp.seek(6)
+                el.childs = [Bytes32TextRecord.from_file(fp)]
+                records = [el, ShortElementRecord('Tail')]
+                self.assertEqual(dump_records(records), expected)
+                out = BytesIO()
+                write_records(records, out, buffer_size=4096)
+                self.assertEqual(out.getvalue(), expected)
+
+                a, b = socket.socketpair()
+                received = []
+
+                def receive():
+                    while True:
+                        chunk = b.recv(65536)
+                        if not chunk:
+                            break
+                        received.append(chunk)
+                thread = threading.Thread(target=receive)
+                thread.start()
+                write_records(records, a)
+                a.close()
+                thread.join()
+                b.close()
+                self.assertEqual(b''.join(received), expected)
+                el.childs[0].value.close()
+        finally:
+            os.remove(path)
+
+class SegmentsTest(unittest.TestCase):
+
+    def runTest(self):
+        import os
+        import socket
+        import tempfile
+        import threading
+        from io import BytesIO
+        blob = os.urandom(100 * 1024)
+        el = ShortElementRecord('Data')
+        el.childs = [Bytes32TextRecord(blob)]
+        data = dump_records([ShortElementRecord('Head'), el])
+
+        records = Record.parse(BytesIO(data), raw=True)
+        segments = dump_segments(records)
+        self.assertEqual(b''.join(segments), data)
+        # the untouched element is passed on as a view of the source
+        self.assertTrue(any(isinstance(s, memoryview) and s.obj is data
+                            for s in segments))
+
+        a, b = socket.socketpair()
+        received = []
+
+        def receive():
+            while True:
+                chunk = b.recv(65536)
+                if not chunk:
+                    break
+                received.append(chunk)
+        thread = threading.Thread(target=receive)
+        thread.start()
+        send_segments(a, segments)
+        a.close()
+        thread.join()
+        b.close()
+        self.assertEqual(b''.join(received), data)
+
+        with tempfile.TemporaryFile() as fp:
+            fp.write(b'x')
+            send_segments(fp, segments)
+            fp.seek(0)
+            self.assertEqual(fp.read(), b'x' + data)
+
+class MappedTest(unittest.TestCase):
+
+    def runTest(self):
+        import mmap
+        import os
+        import pickle
+        import tempfile
+        el = ShortElementRecord('Data')
+        el.childs = [Bytes32TextRecord(b'x' * 10000)]
+        second = dump_records([el])
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(b'\x00' * 5000 + test_bin + second)
+            records = Record.parse_file(path, 5000, len(test_bin))
+            self.assertEqual(dump_records(records), test_bin)
+
+            offset = 5000 + len(test_bin)
+            records = Record.parse_file(path, offset)
+            value = records[0].childs[0].value
+            self.assertTrue(isinstance(value.obj, mmap.mmap))
+            self.assertEqual(dump_records(records), second)
+
+            lazy = Record.parse_file(path, offset, lazy=True)
+            self.assertEqual(dump_records(lazy), second)
+            raw = Record.parse_file(path, offset, raw=True)
+            self.assertEqual(bytes(raw[0].raw), second)
+            copy = pickle.loads(pickle.dumps(raw))
+            self.assertEqual(bytes(copy[0].raw), second)
+
+            self.assertRaises(ValueError, Record.parse_file, path, offset,
+                              len(second) + 1)
+        finally:
+            os.remove(path)
+
+class SessionTest(unittest.TestCase):
+
+    def runTest(self):
+        from io import BytesIO, StringIO
+        from wcf.compact import CompactDocument
+        from wcf.dictionary import DictionarySession
+        from wcf.projection import project
+        from wcf.xml2records import XMLParser
+        writer = DictionarySession()
+        first = XMLParser.parse('<s:Envelope xmlns:a="urn:orders"><s:Body>'
+                                '<a:Order a:id="1"><a:Item>x</a:Item>'
+                                '</a:Order></s:Body></s:Envelope>', writer)
+        second = XMLParser.parse('<s:Envelope><s:Body><a:Order a:id="2">'
+                                 '</a:Order></s:Body></s:Envelope>', writer)
+        messages = [dump_records(first, writer),
+                    dump_records(second, writer)]
+        body = dump_records(second)
+        # the second message adds no strings, its table is empty
+        self.assertEqual(messages[1], b'\x00' + body)
+
+        reader = DictionarySession()
+        r = Record.parse(BytesIO(messages[0]), session=reader)
+        out = StringIO()
+        print_records(r, fp=out)
+        self.assertEqual(out.getvalue(),
+                         '<s:Envelope xmlns:a="urn:orders">\n'
+                         ' <s:Body>\n'
+                         '  <a:Order a:id="1">\n'
+                         '   <a:Item>x</a:Item>\n'
+                         '  </a:Order>\n'
+                         ' </s:Body>\n'
+                         '</s:Envelope>')
+        self.assertEqual(reader.strings,
+                         ['urn:orders', 'Order', 'id', 'Item'])
+        r = Record.parse(BytesIO(messages[1]), session=reader)
+        self.assertEqual(r[0].childs[0].childs[0].name, 'Order')
+        self.assertEqual(dump_records(r), body)
+
+        for kwargs in [dict(lazy=True), dict(raw=True),
+                       dict(limits=DecodeLimits())]:
+            r = Record.parse(BytesIO(messages[1]), session=reader, **kwargs)
+            self.assertEqual(str(r[0].childs[0].childs[0]),
+                             '<a:Order a:id="2">')
+
+        doc = CompactDocument(body, reader)
+        order = next(doc.find('Order'))
+        self.assertEqual(order.qname, 'a:Order')
+        self.assertEqual(order['a:id'], '2')
+        found = project(body, ['s:Envelope/s:Body/a:Order'], reader)
+        self.assertEqual(len(found['s:Envelope/s:Body/a:Order']), 1)
+
+        # odd ids can't be resolved without the session
+        r = Record.parse(BytesIO(body))
+        self.assertRaises(KeyError, str, r[0].childs[0].childs[0])
+
+class FramingTest(unittest.TestCase):
+
+    def runTest(self):
+        import socket
+        import threading
+        from io import BytesIO
+        from wcf import framing
+        from wcf.framing import FrameDecoder, FrameEncoder, read_frames
+        decoder = FrameDecoder()
+        frames = decoder.feed(framing_bin)
+        self.assertEqual([f.name for f in frames],
+                         ['Version', 'Mode', 'Via', 'KnownEncoding',
+                          'PreambleEnd', 'SizedEnvelope', 'SizedEnvelope',
+                          'End'])
+        self.assertEqual(decoder.via, 'net.tcp://localhost:8000/Orders')
+        self.assertEqual(decoder.mode, framing.DUPLEX)
+        self.assertEqual(decoder.encoding, framing.BINARY_SESSION)
+        self.assertTrue(decoder.ended)
+        # the payloads are views of the received data
+        self.assertTrue(frames[5].value.obj is framing_bin)
+        first, second = decoder.decode(frames[5]), decoder.decode(frames[6])
+        self.assertEqual(decoder.session.strings,
+                         ['Get', 'http://tempuri.org/', 'id'])
+        get = second[0].childs[1].childs[0]
+        self.assertEqual(str(get), '<Get xmlns="http://tempuri.org/">')
+        self.assertEqual(str(get.childs[0].childs[0]), '43')
+
+        # fed byte by byte
+        split = []
+        incremental = FrameDecoder()
+        for i in range(len(framing_bin)):
+            split.extend(incremental.feed(framing_bin[i:i + 1]))
+        self.assertEqual(split, frames)
+        self.assertEqual(list(read_frames(BytesIO(framing_bin))), frames)
+        self.assertRaises(framing.FramingError, list,
+                          read_frames(BytesIO(framing_bin[:-20])))
+        self.assertRaises(framing.FramingError,
+                          FrameDecoder(max_frame=100).feed, framing_bin)
+        self.assertRaises(framing.FramingError, FrameDecoder().feed,
+                          b'\x0f')
+
+        # an UnsizedEnvelope of many chunks arriving in small pieces
+        payload = bytes(bytearray(range(256))) * 40
+        chunked = b''.join(
+            b'\x10' + payload[i:i + 16] for i in range(0, len(payload), 16))
+        unsized = b'\x05' + chunked + b'\x00\x07'
+        incremental = FrameDecoder()
+        split = []
+        for i in range(0, len(unsized), 7):
+            split.extend(incremental.feed(unsized[i:i + 7]))
+            if not split:
+                self.assertEqual(incremental.buffered, i + 7)
+        self.assertEqual(split, [framing.Frame(framing.UNSIZED_ENVELOPE,
+                                               payload),
+                                 framing.Frame(framing.END)])
+        self.assertEqual(incremental.buffered, 0)
+        self.assertEqual(FrameDecoder().feed(b'\x05\x00'),
+                         [framing.Frame(framing.UNSIZED_ENVELOPE, b'')])
+        limited = FrameDecoder(max_frame=1000)
+        self.assertRaises(framing.FramingError, lambda: [
+            limited.feed(unsized[i:i + 7])
+            for i in range(0, len(unsized), 7)])
+
+        encoder = FrameEncoder('net.tcp://localhost:8000/Orders')
+        for name in decoder.session.strings:
+            encoder.session.add(name)
+        data = (encoder.preamble() + encoder.envelope(first) +
+                encoder.envelope(second) + encoder.end())
+        self.assertEqual(data, framing_bin)
+
+        # loopback: a stub service echoing the id of every request
+        client, server = socket.socketpair()
+
+        def serve():
+            decoder = FrameDecoder()
+            encoder = FrameEncoder(None)
+            for frame in read_frames(server, decoder):
+                if frame.type == framing.PREAMBLE_END:
+                    server.sendall(framing.Frame(
+                        framing.PREAMBLE_ACK).to_bytes())
+                elif frame.type == framing.SIZED_ENVELOPE:
+                    records = decoder.decode(frame)
+                    id = records[0].childs[1].childs[0].childs[0]
+                    reply = ShortElementRecord('Reply')
+                    reply.childs = [id.childs[0]]
+                    server.sendall(encoder.envelope([reply]))
+            server.sendall(encoder.end())
+            server.close()
+        thread = threading.Thread(target=serve)
+        thread.start()
+        client.sendall(FrameEncoder(decoder.via).preamble())
+        replies = FrameDecoder(encoding=framing.BINARY_SESSION)
+        received = replies.feed(client.recv(1))
+        self.assertEqual(received, [framing.Frame(framing.PREAMBLE_ACK)])
+        for records in (first, second):
+            send_segments(client, encoder.envelope_segments(records))
+        client.sendall(encoder.end())
+        frames = list(read_frames(client, replies))
+        thread.join()
+        client.close()
+        self.assertEqual([str(replies.decode(f)[0].childs[0])
+                          for f in frames[:-1]], ['42', '43'])
+        self.assertEqual(frames[-1].name, 'End')
+
+class LearningTest(unittest.TestCase):
+
+    def message(self, order, item, text):
+        root = order()
+        for i in range(3):
+            el = item()
+            el.childs = [text()]
+            root.childs.append(el)
+        return [root]
+
+    def runTest(self):
+        from wcf.learning import DictionaryLearner
+        data = dump_records(self.message(
+            lambda: ShortElementRecord('Order'),
+            lambda: ShortElementRecord('Item'),
+            lambda: Chars8TextRecord('pending')))
+        learner = DictionaryLearner()
+        for i in range(4):
+            learner.add_message(data)
+        learner.add_message('<Order><Item>pending</Item></Order>')
+        self.assertEqual(learner.strings['Item'], [13, 65, 5])
+        self.assertEqual(learner.roles['pending'], set(['text']))
+
+        learned = learner.learn()
+        self.assertEqual(learned.session, [])
+        ids = dict((v, k) for k, v in learned.static.items())
+        encoded = dump_records(self.message(
+            lambda: ShortDictionaryElementRecord(ids['Order']),
+            lambda: ShortDictionaryElementRecord(ids['Item']),
+            lambda: DictionaryTextRecord(ids['pending'])))
+        # the projection matches the encoded sizes
+        report = learned.report()
+        self.assertEqual(report[0].size, len(data))
+        self.assertEqual(report[0].saved, len(data) - len(encoded))
+        self.assertTrue(report[0].saved_time > 0)
+
+        # on long sessions the frequent strings take the short session ids
+        learned = learner.learn(session_length=100)
+        self.assertEqual(learned.session, ['pending', 'Item'])
+        self.assertEqual(list(learned.static.values()), ['Order'])
+        self.assertEqual(learner.learn(max_strings=1).static,
+                         {974: 'pending'})
+
+class DictionaryTest(unittest.TestCase):
+
+    def runTest(self):
+        import os
+        import tempfile
+        import threading
+        from io import BytesIO, StringIO
+        from wcf.dictionary import (Dictionary, DictionarySession,
+                                    DEFAULT_DICTIONARY)
+        from wcf.learning import LearnedDictionary
+        from wcf.xml2records import XMLParser
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            LearnedDictionary({974: 'Order', 976: 'Item'}, []).save(path)
+            orders = Dictionary.load(path)
+        finally:
+            os.remove(path)
+        other = DEFAULT_DICTIONARY.extend({974: 'Invoice', 976: 'Line'})
+        self.assertEqual(len(orders), len(DEFAULT_DICTIONARY) + 2)
+        self.assertEqual(DEFAULT_DICTIONARY.get('Order'), None)
+
+        xml = '<Order><Item>x</Item></Order>'
+        data = dump_records(XMLParser.parse(xml, dictionary=orders))
+        self.assertTrue(data.startswith(b'B\xce\x07B\xd0\x07'))
+        # the plain encoding doesn't know the ids
+        self.assertNotEqual(dump_records(XMLParser.parse(xml)), data)
+
+        def decode(dictionary):
+            out = StringIO()
+            print_records(Record.parse(BytesIO(data), dictionary=dictionary),
+                          fp=out)
+            return out.getvalue()
+        self.assertEqual(decode(orders), '<Order>\n <Item>x</Item>\n</Order>')
+        self.assertEqual(decode(other),
+                         '<Invoice>\n <Line>x</Line>\n</Invoice>')
+        self.assertRaises(KeyError, decode, None)
+
+        # differently configured decoders don't share state
+        results = {}
+
+        def worker(name, dictionary):
+            results[name] = set(decode(dictionary) for i in range(200))
+        threads = [threading.Thread(target=worker, args=(n, d))
+                   for n, d in [('orders', orders), ('other', other)] * 2]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(results['orders']), 1)
+        self.assertEqual(len(results['other']), 1)
+        self.assertNotEqual(results['orders'], results['other'])
+
+        session = DictionarySession(orders)
+        self.assertEqual(session[974], 'Order')
+        self.assertRaises(ValueError, Record.parse, BytesIO(b'\x00'),
+                          session=session, dictionary=other)
+
+class ThreadsTest(unittest.TestCase):
+
+    def runTest(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from wcf.codec import Codec
+        from wcf.dictionary import DEFAULT_DICTIONARY
+        orders = DEFAULT_DICTIONARY.extend({974: 'Order'})
+        data = b'B\xce\x07@\x02Id\x89\x07\x01'
+        codecs = [Codec(), Codec(dictionary=orders), Codec(raw=True),
+                  Codec(lazy=True, dictionary=orders)]
+        expected = [codec.to_xml(codec.decode(data)) if i % 2 else None
+                    for i, codec in enumerate(codecs)]
+
+        def work(i):
+            codec = codecs[i % len(codecs)]
+            if i % 2 == 0:
+                # the default dictionary doesn't know the id
+                self.assertRaises(KeyError, lambda:
+                                  codec.to_xml(codec.decode(data)))
+                return i, None
+            return i, codec.to_xml(codec.decode(data))
+        with ThreadPoolExecutor(8) as pool:
+            for i, xml in pool.map(work, range(400)):
+                self.assertEqual(xml, expected[i % len(codecs)])
+        self.assertEqual(expected[1], '<Order>\n <Id>7</Id>\n</Order>')
+
+        # a lazy tree read by several threads is decoded once
+        r = Codec(lazy=True).decode(b'@\x01a' + b'@\x01b\x01' * 50 +
+                                    b'\x01')
+        barrier = threading.Barrier(8)
+        lengths = []
+
+        def read():
+            barrier.wait()
+            lengths.append(len(r[0].childs))
+        threads = [threading.Thread(target=read) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(lengths, [50] * 8)
+
+class BatchTest(unittest.TestCase):
+
+    def runTest(self):
+        from wcf.batch import decode_many, encode_many
+        from wcf.dictionary import DEFAULT_DICTIONARY
+        documents = ['<Order id="%d"><Item>%d</Item></Order>' % (i, i)
+                     for i in range(50)]
+        # bytes aren't accepted by the XML parser
+        documents[7] = b'<Order />'
+        encoded = list(encode_many(iter(documents), workers=2,
+                                   chunk_size=4))
+        self.assertEqual([r.index for r in encoded], list(range(50)))
+        self.assertFalse(encoded[7].ok)
+        messages = [r.value if r.ok else b'?' for r in encoded]
+
+        batch = decode_many(messages, workers=2, chunk_size=3)
+        results = list(batch)
+        self.assertEqual([r.index for r in results], list(range(50)))
+        self.assertEqual(results[3].value,
+                         '<Order id="3">\n <Item>3</Item>\n</Order>')
+        self.assertEqual([r.index for r in results if not r.ok], [7])
+        self.assertEqual(sum(s.items for s in batch.stats.values()), 50)
+        self.assertEqual(sum(s.errors for s in batch.stats.values()), 1)
+        self.assertTrue(batch.format_stats().endswith(
+            'total: 50 messages, 1 errors, %d bytes' %
+            sum(len(m) for m in messages)))
+
+        # unordered results, record trees and codec options
+        orders = DEFAULT_DICTIONARY.extend({974: 'Order'})
+        batch = decode_many([b'B\xce\x07\x01'] * 20, workers=2,
+                            chunk_size=2, ordered=False, xml=False,
+                            dictionary=orders)
+        results = sorted(batch, key=lambda r: r.index)
+        self.assertEqual([r.index for r in results], list(range(20)))
+        self.assertEqual(results[0].value[0].name, 'Order')
+
+        # transfer through shared memory
+        results = list(decode_many(messages, workers=0))
+        for xml in (True, False):
+            batch = decode_many(messages, workers=2, chunk_size=5,
+                                xml=xml, shared_memory=True)
+            shared = list(batch)
+            self.assertEqual([r.error for r in shared],
+                             [r.error for r in results])
+            if xml:
+                self.assertEqual([r.value for r in shared],
+                                 [r.value for r in results])
+            else:
+                self.assertEqual(dump_records(shared[3].value),
+                                 messages[3])
+        shared = list(encode_many(documents, workers=2, chunk_size=5,
+                                  shared_memory=True))
+        self.assertEqual([(r.index, r.ok, r.error, r.value) for r in shared],
+                         [(r.index, r.ok, r.error, r.value)
+                          for r in encoded])
+        # text to decode fails with both transports alike
+        mixed = [messages[0], 'text', bytearray(messages[1])]
+        for shared_memory in (False, True):
+            results = list(decode_many(mixed, workers=1, chunk_size=3,
+                                       shared_memory=shared_memory))
+            self.assertEqual([r.ok for r in results], [True, False, True])
+            self.assertTrue(results[1].error.startswith('TypeError'))
+
+class CliTest(unittest.TestCase):
+
+    def runTest(self):
+        import os
+        import shutil
+        import tempfile
+        from io import BytesIO, StringIO
+        from wcf.cli import expand_paths, convert_files, main
+        root = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(root, 'in', 'sub'))
+            messages = {'a.bin': b'@\x01a\x99\x01x',
+                        os.path.join('sub', 'b.bin'): b'@\x01b\x87',
+                        'c.bin': b'?', 'notes.txt': b''}
+            for name, data in messages.items():
+                with open(os.path.join(root, 'in', name), 'wb') as fp:
+                    fp.write(data)
+            source = os.path.join(root, 'in')
+            files = expand_paths([source], '*.bin')
+            self.assertEqual([name for path, name in files],
+                             ['a.bin', 'c.bin', os.path.join('sub', 'b.bin')])
+            self.assertEqual(expand_paths([os.path.join(source, 'a*')]),
+                             [(os.path.join(source, 'a.bin'), 'a.bin')])
+            self.assertRaises(IOError, expand_paths,
+                              [os.path.join(source, 'x*')])
+
+            for jobs in (1, 2):
+                out, errors = BytesIO(), StringIO()
+                count, size, failed, seconds = convert_files(
+                    'decode', files, out, jobs=jobs, errors=errors)
+                self.assertEqual(out.getvalue(),
+                                 b'<a>x</a>\n<b>true</b>\n')
+                self.assertEqual((count, size), (3, 11))
+                self.assertEqual(failed, [os.path.join(source, 'c.bin')])
+                self.assertTrue(errors.getvalue().startswith(failed[0]))
+
+            # unreadable inputs fail, the others are converted
+            link = os.path.join(source, 'b.bin')
+            os.symlink(os.path.join(root, 'missing'), link)
+            try:
+                unreadable = expand_paths([source], '*.bin')
+                for function, jobs in (('decode', 1), ('decode', 2),
+                                       ('encode', 1)):
+                    out, errors = BytesIO(), StringIO()
+                    count, size, failed, seconds = convert_files(
+                        function, unreadable, out, jobs=jobs,
+                        errors=errors)
+                    self.assertEqual(count, 4)
+                    self.assertTrue(link in failed)
+                    self.assertTrue('%s: FileNotFoundError' % link in
+                                    errors.getvalue())
+                    if function == 'decode':
+                        self.assertEqual(out.getvalue(),
+                                         b'<a>x</a>\n<b>true</b>\n')
+                import contextlib
+                with contextlib.redirect_stderr(StringIO()) as err:
+                    self.assertEqual(main('decode', [
+                        source, '-p', '*.bin', '-o',
+                        os.path.join(root, 'partial')]), 1)
+                self.assertTrue('4 files, 2 failed' in err.getvalue())
+                self.assertTrue(os.path.exists(os.path.join(
+                    root, 'partial', 'sub', 'b.xml')))
+            finally:
+                os.remove(link)
+
+            # the mappings decoded in process are closed
+            import wcf.cli
+            closed = []
+            close = wcf.cli._close
+
+            def spy(data):
+                close(data)
+                closed.append(data.closed)
+            wcf.cli._close = spy
+            try:
+                convert_files('decode', files, BytesIO())
+            finally:
+                wcf.cli._close = close
+            self.assertEqual(closed, [True] * 3)
+
+            xml = os.path.join(root, 'xml')
+            self.assertEqual(main('decode', [source, '-p', '[ab].bin', '-o',
+                                             xml, '-q', '-j', '2']), 0)
+            single = os.path.join(root, 'single')
+            self.assertEqual(main('decode', [source, '-p', '[ab].bin', '-o',
+                                             single, '-q']), 0)
+            for name in ('a.xml', os.path.join('sub', 'b.xml')):
+                with open(os.path.join(xml, name), 'rb') as fp:
+                    with open(os.path.join(single, name), 'rb') as other:
+                        self.assertEqual(fp.read(), other.read())
+            back = os.path.join(root, 'back')
+            self.assertEqual(main('encode', [xml, '-o', back, '-q']), 0)
+            with open(os.path.join(back, 'sub', 'b.bin'), 'rb') as fp:
+                self.assertEqual(fp.read(), b'@\x01b\x87')
+        finally:
+            shutil.rmtree(root)
+
+class StreamTest(unittest.TestCase):
+
+    def runTest(self):
+        import json
+        from io import BytesIO, StringIO
+        from wcf.cli import convert_stream
+        from wcf.dictionary import DictionarySession
+        from wcf.stream import (iter_frames, iter_messages, read_frame,
+                                write_message)
+        from wcf.xml2records import XMLParser
+        messages = [b'@\x05Order\x89%c\x01' % i for i in range(200)]
+        messages[150] = b'@\x01x' * 100
+        for framing in ('varint', 'uint32'):
+            fp = BytesIO()
+            for data in messages:
+                write_message(fp, data, framing)
+            stream = fp.getvalue()
+            self.assertEqual(list(iter_frames(BytesIO(stream), framing)),
+                             messages)
+            self.assertRaises(EOFError, list,
+                              iter_frames(BytesIO(stream[:-1]), framing))
+            self.assertRaises(ValueError, read_frame, BytesIO(stream),
+                              framing, 4)
+        self.assertEqual(stream[:4], b'\x00\x00\x00\n')
+
+        # a session spanning the messages of a stream
+        writer = DictionarySession()
+        fp = BytesIO()
+        for i in range(3):
+            write_message(fp, XMLParser.parse('<Order>%d</Order>' % i,
+                                              writer), session=writer)
+        fp.seek(0)
+        trees = list(iter_messages(fp, session=DictionarySession()))
+        self.assertEqual([str(t[0]) for t in trees], ['<Order>'] * 3)
+
+        stream = b''.join(b'\x00\x00\x00\x0a' + m for m in messages[:100])
+        for jobs in (1, 2):
+            out, errors = BytesIO(), StringIO()
+            count, size, failed, seconds = convert_stream(
+                'decode', [BytesIO(stream + b'\x00\x00\x00\x01?')], out,
+                'uint32', ndjson=True, jobs=jobs, errors=errors)
+            self.assertEqual((count, failed), (101, [100]))
+            lines = [json.loads(l) for l in out.getvalue().splitlines()]
+            self.assertEqual(lines[7], {'index': 7,
+                                        'xml': '<Order>7</Order>'})
+            self.assertEqual(sorted(lines[100]), ['error', 'index'])
+
+            back = BytesIO()
+            count, size, failed, seconds = convert_stream(
+                'encode', [BytesIO(out.getvalue())], back, 'varint',
+                ndjson=True, jobs=jobs)
+            self.assertEqual((count, failed), (101, [100]))
+            decoded = list(iter_messages(BytesIO(back.getvalue())))
+            self.assertEqual(dump_records(decoded[7]),
+                             dump_records(XMLParser.parse(
+                                 '<Order>7</Order>')))
+
+            # failed messages stay failed in the other direction
+            errors = StringIO()
+            count, size, failed, seconds = convert_stream(
+                'encode', [BytesIO(out.getvalue())], BytesIO(), 'varint',
+                ndjson=True, jobs=jobs, errors=errors)
+            self.assertEqual((count, failed), (101, [100]))
+            self.assertTrue(errors.getvalue().startswith(
+                'message 100: input: error: '))
+
+            # without a framing the encoded messages are still prefixed
+            unframed = BytesIO()
+            convert_stream('encode', [BytesIO(out.getvalue())], unframed,
+                           ndjson=True, jobs=jobs)
+            self.assertEqual(unframed.getvalue(), back.getvalue())
+            # and framed messages are decoded to NDJSON
+            lines = BytesIO()
+            convert_stream('decode', [BytesIO(back.getvalue())], lines,
+                           'varint', jobs=jobs)
+            self.assertEqual(json.loads(lines.getvalue().splitlines()[7]),
+                             {'index': 7, 'xml': '<Order>7</Order>'})
+
+class ServerTest(unittest.TestCase):
+
+    def runTest(self):
+        import os
+        import shutil
+        import socket
+        import tempfile
+        import threading
+        from wcf.server import Server, Client, ServerError
+        root = tempfile.mkdtemp()
+        try:
+            for address, jobs in ((os.path.join(root, 'wcf.sock'), 1),
+                                  (('127.0.0.1', 0), 0)):
+                server = Server(address, jobs=jobs, max_size=1024)
+                thread = threading.Thread(target=server.serve_forever)
+                thread.start()
+                try:
+                    self.check(server.server_address, Client, ServerError)
+                finally:
+                    server.shutdown()
+                    server.server_close()
+                    thread.join()
+                self.assertFalse(os.path.exists(os.path.join(root,
+                                                             'wcf.sock')))
+
+            # only a socket left behind by a killed server is replaced
+            path = os.path.join(root, 'stale.sock')
+            stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            stale.bind(path)
+            stale.close()
+            server = Server(path)
+            try:
+                self.assertRaises(OSError, Server, path)
+                self.assertTrue(os.path.exists(path))
+            finally:
+                server.server_close()
+            path = os.path.join(root, 'data.txt')
+            with open(path, 'w') as fp:
+                fp.write('data')
+            self.assertRaises(OSError, Server, path)
+            with open(path) as fp:
+                self.assertEqual(fp.read(), 'data')
+        finally:
+            shutil.rmtree(root)
+
+    def check(self, address, Client, ServerError):
+        import threading
+        results = []
+
+        def work(i):
+            with Client(address, timeout=10) as client:
+                for j in range(20):
+                    xml = '<Order>%d</Order>' % (i * 100 + j)
+                    results.append(client.decode(client.encode(xml)) == xml)
+        threads = [threading.Thread(target=work, args=(i,))
+                   for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, [True] * 80)
+
+        with Client(address, timeout=10) as client:
+            self.assertRaises(ServerError, client.decode, b'?')
+            # the connection stays usable after an error
+            self.assertEqual(client.decode(b'@\x01a\x99\x01x'), '<a>x</a>')
+            self.assertRaises(ServerError, client.request, b'X', b'')
+            # too large requests are skipped
+            self.assertRaises(ServerError, client.decode, b'x' * 2048)
+            self.assertEqual(client.decode(b'@\x01a\x99\x01x'), '<a>x</a>')
+
 class Suite(unittest.TestSuite):
 
     def __init__(self, *args, **kwargs):
@@ -52,6 +1106,29 @@ class Suite(unittest.TestSuite):
         self.addTest(doctest.DocTestSuite(attributes))
         self.addTest(doctest.DocTestSuite(text))
         self.addTest(TransformTest())
+        self.addTest(ProjectionTest())
+        self.addTest(ValidatorTest())
+        self.addTest(LimitsTest())
+        self.addTest(LazyTest())
+        self.addTest(RawTest())
+        self.addTest(PatchTest())
+        self.addTest(CompactTest())
+        self.addTest(SharedTest())
+        self.addTest(EncodedTextTest())
+        self.addTest(BytesTest())
+        self.addTest(BlobSinkTest())
+        self.addTest(WriteRecordsTest())
+        self.addTest(SegmentsTest())
+        self.addTest(MappedTest())
+        self.addTest(SessionTest())
+        self.addTest(FramingTest())
+        self.addTest(LearningTest())
+        self.addTest(DictionaryTest())
+        self.addTest(ThreadsTest())
+        self.addTest(BatchTest())
+        self.addTest(CliTest())
+        self.addTest(StreamTest())
+        self.addTest(ServerTest())
 
 if __name__ == '__main__':
     #unittest.main()
@@ -27,4 +27,6 @@
 #  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 #  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-__all__ = ['records', 'datatypes', 'xml2records']
+__all__ = ['records', 'datatypes', 'xml2records', 'projection',
+           'validator', 'patch', 'compact', 'framing', 'learning',
+           'codec', 'batch', 'cli', 'stream', 'server']
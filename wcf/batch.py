@@ -0,0 +1,423 @@
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+#  Copyright (c) 2011, Timo Schmid <tschmid@ernw.de>
+#  All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#  * Neither the name of the ERMW GmbH nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Batch conversion of many messages with a pool of worker processes.
+
+The messages are sent to the workers in chunks, so the cost of passing
+them between the processes is paid once per chunk instead of once per
+message. Every message gets a :class:`BatchResult`; a message failing to
+convert records its error and doesn't stop the batch.
+
+With ``shared_memory=True`` the messages of a chunk are copied into a
+:class:`multiprocessing.shared_memory.SharedMemory` arena instead of
+being pickled, and the workers write their output into a second arena;
+only the offset tables cross the process boundary.
+
+>>> batch = decode_many([b'@\\x01a\\x99\\x01x', b'?'], workers=0)
+>>> for r in batch:
+...     print(r.index, r.value, r.error)
+0 <a>x</a> None
+1 None error: unpack requires a buffer of 1 bytes
+>>> stats = list(batch.stats.values())[0]
+>>> stats.items, stats.errors
+(2, 1)
+>>> [r.value for r in encode_many(['<Ping/>'], workers=0)]
+[b'@\\x04Ping\\x01']
+"""
+from __future__ import absolute_import, unicode_literals, division
+
+import collections
+import os
+import pickle
+import time
+from concurrent.futures import (ProcessPoolExecutor, FIRST_COMPLETED,
+                                wait)
+from multiprocessing.shared_memory import SharedMemory
+
+from wcf.codec import Codec
+
+__all__ = ['Batch', 'BatchResult', 'WorkerStats', 'decode_many',
+           'encode_many']
+
+
+class BatchResult(object):
+    """
+    result of one message
+
+    :ivar index: position of the message in the input
+    :ivar value: the converted message, None if it failed
+    :ivar error: ``'ExceptionType: message'`` if it failed, else None
+    :ivar worker: process id of the worker which converted it
+    """
+    __slots__ = ('index', 'value', 'error', 'worker')
+
+    def __init__(self, index, value, error=None, worker=None):
+        self.index = index
+        self.value = value
+        self.error = error
+        self.worker = worker
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.error is not None:
+            return '<BatchResult(%d, error=%r)>' % (self.index, self.error)
+        return '<BatchResult(%d)>' % self.index
+
+
+class WorkerStats(object):
+    """
+    throughput of one worker process
+
+    :ivar items: number of messages converted (including failed ones)
+    :ivar errors: number of failed messages
+    :ivar bytes: size of the input messages
+    :ivar seconds: time spent converting
+    """
+
+    def __init__(self, worker):
+        self.worker = worker
+        self.items = 0
+        self.errors = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    @property
+    def rate(self):
+        """messages per second"""
+        return self.items / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return ('<WorkerStats(%d: %d items, %d errors, %.1f items/s)>' %
+                (self.worker, self.items, self.errors, self.rate))
+
+
+def _decode(codec, data, xml):
+    records = codec.decode(data)
+    return codec.to_xml(records) if xml else records
+
+
+def _encode(codec, xml, arg):
+    return codec.encode(codec.from_xml(xml))
+
+
+_FUNCTIONS = {'decode': _decode, 'encode': _encode}
+
+# size of the output arena of a chunk relative to its input, values not
+# fitting into it are returned pickled
+_OUTPUT_FACTOR = {'decode': 4, 'encode': 2}
+
+
+def _pack(function, arg, value):
+    # the bytes of a result in the output arena
+    if function == 'encode':
+        return value
+    if arg:
+        return value.encode('utf-8')
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _unpack(function, arg, data):
+    if function == 'encode':
+        return bytes(data)
+    if arg:
+        return bytes(data).decode('utf-8')
+    return pickle.loads(data)
+
+
+def _attach(name):
+    try:
+        # the arena belongs to the batch, the worker mustn't unlink it
+        return SharedMemory(name, track=False)
+    except TypeError:
+        # before Python 3.13 the worker registers it with the resource
+        # tracker it shares with the batch, unlinking it unregisters it
+        return SharedMemory(name)
+
+
+def _run_chunk(function, options, arg, chunk):
+    # runs in the worker: converts a chunk of (index, message) pairs
+    codec = Codec(**options)
+    convert = _FUNCTIONS[function]
+    results = []
+    size = 0
+    start = time.time()
+    for index, message in chunk:
+        try:
+            size += len(message)
+            results.append((index, convert(codec, message, arg), None))
+        except Exception as e:
+            results.append((index, None, '%s: %s' % (type(e).__name__, e)))
+    return os.getpid(), time.time() - start, size, results
+
+
+def _run_shared(function, options, arg, table, names):
+    # runs in the worker: converts the messages at the (index, start,
+    # end) offsets of the input arena (or (index, message, None) for
+    # those passed on by _arenas), the results are the offsets of
+    # their output in the output arena or the packed output if it doesn't
+    # fit
+    codec = Codec(**options)
+    convert = _FUNCTIONS[function]
+    source = _attach(names[0])
+    target = _attach(names[1])
+    out = target.buf
+    pos = 0
+    results = []
+    size = 0
+    start = time.time()
+    try:
+        for index, begin, end in table:
+            if end is None:
+                # passed on as it is, see _arenas
+                message = begin
+            else:
+                with source.buf[begin:end] as view:
+                    # the readers of the decoder copy the message anyway
+                    message = bytes(view)
+                if function == 'encode':
+                    message = message.decode('utf-8', 'surrogatepass')
+            try:
+                size += len(message)
+                value = _pack(function, arg, convert(codec, message, arg))
+            except Exception as e:
+                results.append((index, None,
+                                '%s: %s' % (type(e).__name__, e)))
+                continue
+            if pos + len(value) <= len(out):
+                out[pos:pos + len(value)] = value
+                results.append((index, (pos, pos + len(value)), None))
+                pos += len(value)
+            else:
+                results.append((index, value, None))
+    finally:
+        del out
+        source.close()
+        target.close()
+    return os.getpid(), time.time() - start, size, results
+
+
+def _bytes_like(value):
+    try:
+        memoryview(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _arenas(function, chunk):
+    # input arena with the messages of chunk and their offset table,
+    # output arena sized by _OUTPUT_FACTOR. Messages of other types than
+    # the codec takes (text to encode, bytes to decode) are put into the
+    # table instead, to fail in the worker like with _run_chunk
+    if function == 'encode':
+        messages = [m.encode('utf-8', 'surrogatepass')
+                    if isinstance(m, str) else None for i, m in chunk]
+    else:
+        messages = [m if _bytes_like(m) else None for i, m in chunk]
+    size = sum(len(m) for m in messages if m is not None)
+    source = SharedMemory(create=True, size=max(size, 1))
+    try:
+        target = SharedMemory(create=True, size=max(
+            size * _OUTPUT_FACTOR[function], 4096))
+    except Exception:
+        _free(source)
+        raise
+    table = []
+    pos = 0
+    for (index, message), data in zip(chunk, messages):
+        if data is None:
+            table.append((index, message, None))
+            continue
+        source.buf[pos:pos + len(data)] = data
+        table.append((index, pos, pos + len(data)))
+        pos += len(data)
+    return table, source, target
+
+
+def _free(*arenas):
+    for arena in arenas:
+        arena.close()
+        arena.unlink()
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in enumerate(items):
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Batch(object):
+    """
+    iterable over the :class:`BatchResult` of a batch, created by
+    :func:`decode_many` and :func:`encode_many`. The messages are read
+    from the input while iterating, at most two chunks per worker are
+    pending at a time. :attr:`stats` maps the process id of every worker
+    to its :class:`WorkerStats` and is updated while iterating.
+    """
+
+    def __init__(self, function, items, options, arg=None, workers=None,
+                 chunk_size=64, ordered=True, shared_memory=False):
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be positive')
+        self.function = function
+        self.items = items
+        self.options = options
+        self.arg = arg
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.chunk_size = chunk_size
+        self.ordered = ordered
+        self.shared_memory = shared_memory
+        self.stats = {}
+
+    def _results(self, done, target=None):
+        worker, seconds, size, results = done
+        stats = self.stats.get(worker)
+        if stats is None:
+            stats = self.stats[worker] = WorkerStats(worker)
+        stats.items += len(results)
+        stats.bytes += size
+        stats.seconds += seconds
+        for index, value, error in results:
+            if error is not None:
+                stats.errors += 1
+            elif target is not None:
+                if isinstance(value, tuple):
+                    with target.buf[value[0]:value[1]] as view:
+                        value = _unpack(self.function, self.arg, view)
+                else:
+                    value = _unpack(self.function, self.arg, value)
+            yield BatchResult(index, value, error, worker)
+
+    def __iter__(self):
+        chunks = _chunks(self.items, self.chunk_size)
+        args = (self.function, self.options, self.arg)
+        if not self.workers:
+            for chunk in chunks:
+                for result in self._results(_run_chunk(*args + (chunk,))):
+                    yield result
+            return
+        # the arenas of the pending chunks by future
+        arenas = {}
+        try:
+            with ProcessPoolExecutor(self.workers) as pool:
+                pending = collections.deque()
+                for chunk in chunks:
+                    if self.shared_memory:
+                        table, source, target = _arenas(self.function,
+                                                        chunk)
+                        future = pool.submit(_run_shared, *args + (
+                            table, (source.name, target.name)))
+                        arenas[future] = (source, target)
+                    else:
+                        future = pool.submit(_run_chunk, *args + (chunk,))
+                    pending.append(future)
+                    while len(pending) >= 2 * self.workers:
+                        for result in self._next(pending, arenas):
+                            yield result
+                while pending:
+                    for result in self._next(pending, arenas):
+                        yield result
+        finally:
+            for source, target in arenas.values():
+                _free(source, target)
+
+    def _next(self, pending, arenas):
+        # results of the first chunk or, unordered, of any finished one
+        if self.ordered:
+            future = pending.popleft()
+        else:
+            done = wait(pending, return_when=FIRST_COMPLETED).done
+            future = next(iter(done))
+            pending.remove(future)
+        done = future.result()
+        if future not in arenas:
+            return list(self._results(done))
+        source, target = arenas.pop(future)
+        try:
+            return list(self._results(done, target))
+        finally:
+            _free(source, target)
+
+    def format_stats(self):
+        """returns a line per worker and one with the totals"""
+        lines = []
+        total = WorkerStats(0)
+        for worker in sorted(self.stats):
+            stats = self.stats[worker]
+            lines.append('worker %d: %d messages, %d errors, %d bytes, '
+                         '%.1f messages/s' % (worker, stats.items,
+                                              stats.errors, stats.bytes,
+                                              stats.rate))
+            total.items += stats.items
+            total.errors += stats.errors
+            total.bytes += stats.bytes
+        lines.append('total: %d messages, %d errors, %d bytes' %
+                     (total.items, total.errors, total.bytes))
+        return '\n'.join(lines)
+
+
+def decode_many(messages, workers=None, chunk_size=64, ordered=True,
+                xml=True, shared_memory=False, **options):
+    """
+    decodes binary messages in worker processes
+
+    :param messages: iterable of bytes
+    :param workers: number of processes, by default one per CPU; 0
+                    converts in the calling process
+    :param chunk_size: number of messages sent to a worker at once
+    :param ordered: yield the results in the order of the messages, else
+                    as soon as their chunk is done
+    :param xml: return the XML of the messages, else their record trees
+                (which have to be pickled to get back from the workers)
+    :param shared_memory: pass the messages and the results in shared
+                          memory arenas instead of pickling them
+    :param options: :class:`wcf.codec.Codec` options (dictionary,
+                    limits, lazy, raw), they have to be picklable
+    :rtype: Batch
+    """
+    return Batch('decode', messages, options, xml, workers, chunk_size,
+                 ordered, shared_memory)
+
+
+def encode_many(documents, workers=None, chunk_size=64, ordered=True,
+                shared_memory=False, **options):
+    """
+    encodes XML documents in worker processes, the values of the results
+    are the binary messages. See :func:`decode_many` for the arguments.
+    """
+    return Batch('encode', documents, options, None, workers, chunk_size,
+                 ordered, shared_memory)
@@ -0,0 +1,425 @@
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+#  Copyright (c) 2011, Timo Schmid <tschmid@ernw.de>
+#  All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#  * Neither the name of the ERMW GmbH nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Command line conversion of many files, used by ``wcf2xml.py`` and
+``xml2wcf.py``.
+
+The inputs can be files, directories (converted recursively) and glob
+patterns. The files are converted by :mod:`wcf.batch`, with ``--jobs N``
+in N worker processes. The results go to stdout, one after the other, or
+with ``--output-dir`` into a file per input.
+
+With ``--stream`` the binary side is a stream of length prefixed
+messages and with ``--ndjson`` the XML side a stream of JSON lines (see
+:mod:`wcf.stream`), so one process converts any number of messages
+from stdin to stdout.
+A stream on one side implies one on the other: ``--stream`` decodes to
+NDJSON and ``--ndjson`` encodes with the ``varint`` framing.
+"""
+from __future__ import absolute_import, print_function, division
+
+import argparse
+import contextlib
+import fnmatch
+import glob
+import io
+import logging
+import mmap
+import os
+import sys
+import time
+
+from wcf.batch import decode_many, encode_many
+from wcf.codec import Codec
+from wcf.records import print_records
+from wcf.stream import (FRAMINGS, iter_frames, iter_ndjson, write_message,
+                        write_ndjson)
+
+__all__ = ['expand_paths', 'convert_files', 'convert_stream', 'main']
+
+# suffix of the output files per direction
+SUFFIXES = {'decode': '.xml', 'encode': '.bin'}
+
+
+def expand_paths(paths, pattern='*'):
+    """
+    returns (path, name) pairs for the files of paths, name is the path
+    relative to a given directory (used for the output file)
+
+    :param paths: files, directories and glob patterns
+    :param pattern: glob pattern of the files taken from directories
+    """
+    files = []
+    for path in paths:
+        if glob.has_magic(path):
+            matches = sorted(glob.glob(path))
+            if not matches:
+                raise IOError('no files match %s' % path)
+        elif os.path.exists(path):
+            matches = [path]
+        else:
+            raise IOError('%s doesn\'t exist' % path)
+        for match in matches:
+            if not os.path.isdir(match):
+                files.append((match, os.path.basename(match)))
+                continue
+            found = []
+            for root, dirs, names in os.walk(match):
+                dirs.sort()
+                for name in sorted(names):
+                    full = os.path.join(root, name)
+                    if fnmatch.fnmatch(name, pattern):
+                        found.append((full, os.path.relpath(full, match)))
+            files.extend(found)
+    return files
+
+
+def _read(files, binary, readable, fail):
+    # the contents of the (path, name) pairs files; the files read are
+    # appended to readable, the others are passed to fail
+    for path, name in files:
+        try:
+            if binary:
+                with open(path, 'rb') as fp:
+                    data = fp.read()
+            else:
+                with io.open(path, encoding='utf-8') as fp:
+                    data = fp.read()
+        except (OSError, UnicodeDecodeError) as e:
+            fail(path, '%s: %s' % (type(e).__name__, e))
+            continue
+        readable.append((path, name))
+        yield data
+
+
+def _map(path):
+    # the contents of a binary file, decoded straight from the mapping,
+    # see Record.parse_file
+    with open(path, 'rb') as fp:
+        if not os.fstat(fp.fileno()).st_size:
+            return b''
+        return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _close(data):
+    if isinstance(data, mmap.mmap):
+        try:
+            data.close()
+        except BufferError:
+            # views of records still referenced (by reference cycles of
+            # raw trees) keep the mapping open until they're collected
+            pass
+
+
+def _print(records, fp):
+    # prints a record tree as XML to the binary file object fp, without
+    # building the XML string first
+    text = io.TextIOWrapper(fp, encoding='utf-8', newline='\n')
+    try:
+        print_records(records, fp=text)
+        text.write('\n')
+    finally:
+        text.flush()
+        text.detach()
+
+
+@contextlib.contextmanager
+def _target(function, output, output_dir, name):
+    # the binary file object the result of the input name is written to
+    if output_dir is None:
+        yield output
+        return
+    target = os.path.join(output_dir, os.path.splitext(name)[0] +
+                          SUFFIXES[function])
+    directory = os.path.dirname(target)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(target, 'wb') as fp:
+        yield fp
+
+
+def convert_files(function, files, output=None, output_dir=None, jobs=1,
+                  errors=None, **options):
+    """
+    converts files with :mod:`wcf.batch`
+
+    :param function: ``'decode'`` (binary to XML) or ``'encode'``
+    :param files: (path, name) pairs, see :func:`expand_paths`
+    :param output: binary file object the results are written to one
+                   after the other (XML documents end with a newline)
+    :param output_dir: directory the results are written to instead,
+                       named like the inputs with the suffix ``.xml`` or
+                       ``.bin``
+    :param jobs: number of worker processes, 1 converts in this process
+    :param errors: text file object the failures are reported to
+    :param options: :class:`wcf.codec.Codec` options
+    :returns: (number of files, bytes read, failed paths, seconds)
+    """
+    start = time.time()
+    failed = []
+
+    def fail(path, error):
+        failed.append(path)
+        if errors is not None:
+            errors.write('%s: %s\n' % (path, error))
+
+    if function == 'decode' and jobs <= 1:
+        # decoded from mappings and printed straight from the records
+        codec = Codec(**options)
+        size = 0
+        for path, name in files:
+            try:
+                data = _map(path)
+            except OSError as e:
+                fail(path, '%s: %s' % (type(e).__name__, e))
+                continue
+            size += len(data)
+            records = None
+            try:
+                records = codec.decode(data)
+                with _target(function, output, output_dir, name) as fp:
+                    _print(records, fp)
+            except OSError:
+                # failed output, not a failed input
+                raise
+            except Exception as e:
+                fail(path, '%s: %s' % (type(e).__name__, e))
+            finally:
+                del records
+                _close(data)
+        return len(files), size, failed, time.time() - start
+
+    convert = decode_many if function == 'decode' else encode_many
+    # the indexes of the results count the files which could be read
+    readable = []
+    batch = convert(_read(files, function == 'decode', readable, fail),
+                    workers=jobs if jobs > 1 else 0, chunk_size=8,
+                    **options)
+    for result in batch:
+        path, name = readable[result.index]
+        if not result.ok:
+            fail(path, result.error)
+            continue
+        data = result.value
+        if function == 'decode':
+            data = (data + '\n').encode('utf-8')
+        with _target(function, output, output_dir, name) as fp:
+            fp.write(data)
+    size = sum(s.bytes for s in batch.stats.values())
+    return len(files), size, failed, time.time() - start
+
+
+def _messages(function, inputs, framing, ndjson):
+    # the messages of the binary file objects inputs
+    for fp in inputs:
+        if function == 'decode' and framing:
+            for data in iter_frames(fp, framing):
+                yield data
+        elif function == 'decode':
+            yield fp.read()
+        elif ndjson:
+            for xml in iter_ndjson(fp, errors=True):
+                yield xml
+        else:
+            yield fp.read().decode('utf-8')
+
+
+def _split(function, inputs, framing, ndjson, positions, skipped, fail):
+    # the messages to convert, their positions in the input are appended
+    # to positions; error objects of a NDJSON input are appended to
+    # skipped and passed to fail
+    for index, message in enumerate(_messages(function, inputs, framing,
+                                              ndjson)):
+        if isinstance(message, dict):
+            skipped.append(index)
+            fail(index, 'input: %s' % message.get('error', message))
+            continue
+        positions.append(index)
+        yield message
+
+
+def convert_stream(function, inputs, output, framing=None, ndjson=False,
+                   jobs=1, errors=None, **options):
+    """
+    converts streams of messages with :mod:`wcf.batch`
+
+    :param function: ``'decode'`` (binary to XML) or ``'encode'``
+    :param inputs: binary file objects
+    :param output: binary file object
+    :param framing: length prefix of the binary messages, see
+                    :data:`wcf.stream.FRAMINGS`; without it every input
+                    and output is one message, except for the messages
+                    encoded from NDJSON which are prefixed with
+                    ``'varint'``
+    :param ndjson: the XML documents are NDJSON lines, always for the
+                   messages decoded from a framed stream; decoded messages
+                   are written as ``{"index": n, "xml": ...}`` or
+                   ``{"index": n, "error": ...}``, error objects to
+                   encode count as failed messages
+    :param jobs: number of worker processes, 1 converts in this process
+    :param errors: text file object the failures are reported to
+    :returns: (number of messages, bytes read, failed indexes, seconds)
+    """
+    convert = decode_many if function == 'decode' else encode_many
+    start = time.time()
+    failed = []
+
+    def fail(index, error):
+        failed.append(index)
+        if errors is not None:
+            errors.write('message %d: %s\n' % (index, error))
+        if function == 'decode' and ndjson:
+            write_ndjson(output, {'index': index, 'error': error})
+
+    # several messages back to back can't be told apart
+    if function == 'encode' and ndjson and framing is None:
+        framing = 'varint'
+    elif function == 'decode' and framing and not ndjson:
+        ndjson = True
+    if function == 'decode' and jobs <= 1 and not ndjson:
+        # printed straight from the records, see _print
+        options['xml'] = False
+    # the indexes of the results count the messages passed to the batch
+    positions = []
+    skipped = []
+    batch = convert(_split(function, inputs, framing, ndjson, positions,
+                           skipped, fail),
+                    workers=jobs if jobs > 1 else 0, chunk_size=8,
+                    **options)
+    for result in batch:
+        index = positions[result.index]
+        if not result.ok:
+            fail(index, result.error)
+        elif function == 'decode' and ndjson:
+            write_ndjson(output, {'index': index, 'xml': result.value})
+        elif function == 'decode' and not isinstance(result.value, str):
+            _print(result.value, output)
+        elif function == 'decode':
+            output.write((result.value + '\n').encode('utf-8'))
+        elif framing:
+            write_message(output, result.value, framing)
+        else:
+            output.write(result.value)
+    size = sum(s.bytes for s in batch.stats.values())
+    return (len(positions) + len(skipped), size, sorted(failed),
+            time.time() - start)
+
+
+def _open(files):
+    for path, name in files:
+        with open(path, 'rb') as fp:
+            yield fp
+
+
+def main(function, argv=None):
+    """
+    entry point of the scripts
+
+    :param function: ``'decode'`` for wcf2xml, ``'encode'`` for xml2wcf
+    :returns: the exit status
+    """
+    source, target = (('binary', 'XML') if function == 'decode' else
+                      ('XML', 'binary'))
+    parser = argparse.ArgumentParser(
+        description='converts %s messages to %s. Without paths stdin is '
+                    'converted.' % (source, target))
+    parser.add_argument('paths', nargs='*',
+                        help='files, directories and glob patterns')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes')
+    parser.add_argument('-o', '--output-dir', metavar='DIR',
+                        help='writes a file per input into DIR instead of '
+                             'all results to stdout')
+    parser.add_argument('-p', '--pattern', default='*',
+                        help='files of directories to convert (default: '
+                             '%(default)s)')
+    parser.add_argument('-s', '--stream', choices=FRAMINGS,
+                        help='the binary messages are a stream of '
+                             'messages prefixed with their length%s' %
+                             (', decoded to --ndjson' if function == 'decode'
+                              else ''))
+    parser.add_argument('--ndjson', action='store_true',
+                        help='the XML documents are a stream of JSON '
+                             'lines%s' % ('' if function == 'decode' else
+                                          ', the messages are written as '
+                                          'with --stream varint by '
+                                          'default'))
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='no summary')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+    if args.stream or args.ndjson:
+        if args.output_dir:
+            parser.error('streams are written to stdout, --output-dir '
+                         'can\'t be used with --stream or --ndjson')
+        try:
+            inputs = (_open(expand_paths(args.paths, args.pattern))
+                      if args.paths else [sys.stdin.buffer])
+        except IOError as e:
+            parser.error(str(e))
+        count, size, failed, seconds = convert_stream(
+            function, inputs, stdout, args.stream, args.ndjson, args.jobs,
+            sys.stderr)
+        stdout.flush()
+        if not args.quiet and (count > 1 or failed):
+            _summary('messages', count, size, failed, seconds)
+        return 1 if failed else 0
+
+    if not args.paths:
+        stdin = sys.stdin.buffer if function == 'decode' else sys.stdin
+        convert = decode_many if function == 'decode' else encode_many
+        options = {'xml': False} if function == 'decode' else {}
+        result = next(iter(convert([stdin.read()], workers=0, **options)))
+        if not result.ok:
+            sys.stderr.write('%s\n' % result.error)
+            return 1
+        if function == 'decode':
+            _print(result.value, stdout)
+        else:
+            stdout.write(result.value)
+        return 0
+
+    try:
+        files = expand_paths(args.paths, args.pattern)
+    except IOError as e:
+        parser.error(str(e))
+    count, size, failed, seconds = convert_files(
+        function, files, stdout, args.output_dir, args.jobs, sys.stderr)
+    if not args.quiet and (count > 1 or failed):
+        _summary('files', count, size, failed, seconds)
+    return 1 if failed else 0
+
+
+def _summary(unit, count, size, failed, seconds):
+    seconds = max(seconds, 1e-6)
+    sys.stderr.write('%d %s, %d failed, %.1f %s/s, %.2f MB/s\n' %
+                     (count, unit, len(failed), count / seconds, unit,
+                      size / seconds / 1e6))
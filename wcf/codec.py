@@ -0,0 +1,160 @@
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+#  Copyright (c) 2011, Timo Schmid <tschmid@ernw.de>
+#  All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#  * Neither the name of the ERMW GmbH nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Codec objects bundling the options of the decoder and the encoder.
+
+All state of a call lives in the call itself: the readers created for
+it, the records and the session passed in. The record classes and the
+dictionaries are only read after import, so a :class:`Codec` (or the
+module functions, which use one per call) can be used by any number of
+threads at the same time. Only a
+:class:`wcf.dictionary.DictionarySession` is mutable, it belongs to one
+direction of one channel and mustn't be shared between threads.
+
+>>> codec = Codec(raw=True)
+>>> records = codec.decode(b'@\\x01a\\x99\\x01x')
+>>> print(codec.to_xml(records))
+<a>x</a>
+>>> data = codec.encode(codec.from_xml('<b:Body><a>x</a></b:Body>'))
+>>> print(codec.to_xml(codec.decode(data)))
+<b:Body>
+ <a>x</a>
+</b:Body>
+>>> decode(b'@\\x01a\\x99\\x01x')
+[<ShortElementRecord(type=0x40)>]
+"""
+from __future__ import absolute_import, unicode_literals
+
+from io import StringIO
+
+from wcf.datatypes import reader_for
+from wcf.records import Record, dump_records, print_records
+from wcf.xml2records import XMLParser
+
+__all__ = ['Codec', 'decode', 'encode']
+
+
+class Codec(object):
+    """
+    the options of a decoder and encoder, see :meth:`Record.parse` for
+    their meaning. Codecs can't be modified, create another one for
+    different options.
+
+    >>> Codec(lazy=True, raw=True)
+    Traceback (most recent call last):
+    ...
+    ValueError: lazy mode can't be combined with limits or raw
+    >>> Codec().lazy = True
+    Traceback (most recent call last):
+    ...
+    AttributeError: Codec objects can't be modified
+
+    :param dictionary: the static :class:`wcf.dictionary.Dictionary`, by
+                       default the default dictionary
+    :param limits: :class:`wcf.records.DecodeLimits` of the decoder
+    :param lazy: decode the childs of elements on first access
+    :param raw: keep the source bytes of the records
+    :param blob_sink: sink for large payloads; it's used by every call,
+                      so a sink shared by threads has to be thread-safe
+                      (:class:`wcf.records.TempFileSink` is)
+    """
+    __slots__ = ('dictionary', 'limits', 'lazy', 'raw', 'blob_sink')
+
+    def __init__(self, dictionary=None, limits=None, lazy=False, raw=False,
+                 blob_sink=None):
+        if lazy and (limits is not None or raw):
+            raise ValueError('lazy mode can\'t be combined with limits or '
+                             'raw')
+        if blob_sink is not None and (lazy or raw):
+            raise ValueError('blob_sink can\'t be combined with lazy or raw')
+        set = super(Codec, self).__setattr__
+        set('dictionary', dictionary)
+        set('limits', limits)
+        set('lazy', lazy)
+        set('raw', raw)
+        set('blob_sink', blob_sink)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Codec objects can\'t be modified')
+
+    def __repr__(self):
+        return '<Codec(%s)>' % ', '.join(
+            '%s=%r' % (name, getattr(self, name)) for name in self.__slots__
+            if getattr(self, name) not in (None, False))
+
+    def _parse(self, fp, session):
+        return Record.parse(fp, limits=self.limits, lazy=self.lazy,
+                            raw=self.raw, blob_sink=self.blob_sink,
+                            session=session, dictionary=self.dictionary)
+
+    def decode(self, data, session=None):
+        """
+        decodes a message
+
+        :param data: bytes like object, mmap or binary file like object
+        :param session: the :class:`wcf.dictionary.DictionarySession` of
+                        the channel
+        :returns: the record tree
+        """
+        if not hasattr(data, 'read'):
+            data = reader_for(data)
+        return self._parse(data, session)
+
+    def decode_file(self, path, offset=0, length=None, session=None):
+        """decodes a message from a mapping of a file, see
+        :meth:`Record.parse_file`"""
+        return Record.parse_file(path, offset, length, limits=self.limits,
+                                 lazy=self.lazy, raw=self.raw,
+                                 blob_sink=self.blob_sink, session=session,
+                                 dictionary=self.dictionary)
+
+    def encode(self, records, session=None):
+        """returns the bytes of a record tree, see
+        :func:`wcf.records.dump_records`"""
+        return dump_records(records, session)
+
+    def from_xml(self, xml, session=None):
+        """returns the record tree of a XML string or file object"""
+        return XMLParser.parse(xml, session, self.dictionary)
+
+    def to_xml(self, records):
+        """returns the XML of a record tree"""
+        out = StringIO()
+        print_records(records, fp=out)
+        return out.getvalue()
+
+
+def decode(data, session=None, **options):
+    """decodes a message with a :class:`Codec` of the options"""
+    return Codec(**options).decode(data, session)
+
+
+def encode(records, session=None):
+    """returns the bytes of a record tree"""
+    return dump_records(records, session)
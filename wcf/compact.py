@@ -0,0 +1,417 @@
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+#  Copyright (c) 2011, Timo Schmid <tschmid@ernw.de>
+#  All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#  * Neither the name of the ERMW GmbH nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Columnar representation of a message.
+
+A :class:`CompactDocument` keeps a single buffer with the encoded message
+and describes its records in parallel :class:`array.array` columns instead
+of one Python object per record. Names are decoded once into a shared
+string table, values stay encoded in the buffer until they are read
+through a :class:`Cursor`.
+"""
+from __future__ import absolute_import, unicode_literals
+
+from array import array
+
+from wcf.datatypes import BufferReader
+from wcf.dictionary import lookup, resolver
+from wcf.records import Record, dump_records
+from wcf.records.scanner import (ScanError, KINDS, ELEMENT, END_ELEMENT,
+                                 ATTRIBUTE, TEXT, TEXT_END, ARRAY,
+                                 read_mbi31, skip_record, element_name,
+                                 attribute_name)
+
+__all__ = ['CompactDocument', 'Cursor']
+
+
+def _name(value, dictionary):
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return lookup(value, dictionary)
+
+
+class CompactDocument(object):
+    """
+    Columnar representation of a message.
+
+    Every record except EndElement is a node; the node index is its
+    position in the document order. For node ``i`` the columns hold:
+
+    ``types``
+        the record type byte
+    ``parents``
+        the index of the enclosing element, -1 on the top level
+    ``firsts``, ``nexts``
+        the index of the first child (attributes first) and of the next
+        sibling, -1 if there is none
+    ``prefixes``, ``names``
+        ids in :attr:`strings` of the prefix and name of elements,
+        attributes and arrays, -1 for other records
+    ``offsets``, ``ends``
+        the span of the record in :attr:`data`. Elements span their
+        header only; attributes and arrays are complete.
+    ``values``
+        the offset of the value: the text record of texts and attributes,
+        the namespace of namespace declarations, 0 for elements
+
+    >>> from wcf.records import *
+    >>> el = ShortElementRecord('Order')
+    >>> el.attributes = [ShortAttributeRecord('id', Chars8TextRecord('o1'))]
+    >>> el.childs = [Int32TextRecord(42)]
+    >>> doc = CompactDocument.from_records([el])
+    >>> len(doc)
+    3
+    >>> doc.strings
+    ['', 'Order', 'id']
+    >>> root = doc.cursor()
+    >>> root.name, root['id'], [c.value for c in root.children()]
+    ('Order', 'o1', ['42'])
+    >>> doc.encode() == dump_records([el])
+    True
+    """
+
+    def __init__(self, data, session=None, dictionary=None):
+        """
+        indexes data without decoding any values
+
+        :param data: the encoded message
+        :type data: bytes
+        :param session: the :class:`wcf.dictionary.DictionarySession`
+                        resolving the odd dictionary ids of the message
+        :param dictionary: the :class:`wcf.dictionary.Dictionary`
+                           resolving the even ids
+        :raises wcf.records.scanner.ScanError: if data is not a valid
+                                               message
+        """
+        self.data = bytes(data)
+        self.dictionary = resolver(dictionary, session)
+        self.types = array(str('B'))
+        self.parents = array(str('i'))
+        self.firsts = array(str('i'))
+        self.nexts = array(str('i'))
+        self.prefixes = array(str('i'))
+        self.names = array(str('i'))
+        self.offsets = array(str('I'))
+        self.ends = array(str('I'))
+        self.values = array(str('I'))
+        self.strings = ['']
+        self._build()
+
+    @classmethod
+    def parse(cls, fp, session=None, dictionary=None):
+        """
+        reads the message from the file like object fp. With a session,
+        the string table preceding the message is read into it first.
+        """
+        if session is not None:
+            session.read_table(fp)
+        return cls(fp.read(), session, dictionary)
+
+    @classmethod
+    def from_records(cls, records):
+        """creates the document from a list of Records"""
+        return cls(dump_records(records))
+
+    def to_records(self):
+        """decodes the document into Record objects"""
+        return Record.parse(self._reader(self.data))
+
+    def _reader(self, data):
+        fp = BufferReader(data)
+        fp.dictionary = self.dictionary
+        return fp
+
+    def _build(self):
+        data = self.data
+        ids = {'': 0}
+        strings = self.strings
+
+        def intern(value):
+            value = _name(value, self.dictionary)
+            id = ids.get(value)
+            if id is None:
+                id = ids[value] = len(strings)
+                strings.append(value)
+            return id
+
+        types, parents = self.types, self.parents
+        firsts, nexts = self.firsts, self.nexts
+        prefixes, names = self.prefixes, self.names
+        offsets, ends, values = self.offsets, self.ends, self.values
+        # open elements and the last child seen on each level
+        stack = []
+        last = [-1]
+        pos = 0
+        end = len(data)
+        while pos < end:
+            type = data[pos]
+            kind = KINDS[type]
+            if kind == END_ELEMENT:
+                if not stack:
+                    raise ScanError('unbalanced EndElement', pos)
+                stack.pop()
+                last.pop()
+                pos += 1
+                continue
+            if kind == ATTRIBUTE and (not stack or last[-1] >= 0 and
+                                      KINDS[types[last[-1]]] != ATTRIBUTE):
+                raise ScanError('attribute without element', pos)
+            index = len(types)
+            parent = stack[-1] if stack else -1
+            next = skip_record(data, pos)
+            prefix = name = -1
+            value = pos
+            if kind == ELEMENT:
+                prefix, name = element_name(data, pos)
+                value = 0
+            elif kind == ATTRIBUTE:
+                prefix, name, value = attribute_name(data, pos)
+            elif kind == ARRAY:
+                prefix, name = element_name(data, pos + 1)
+            if name != -1:
+                prefix, name = intern(prefix), intern(name)
+            types.append(type)
+            parents.append(parent)
+            firsts.append(-1)
+            nexts.append(-1)
+            prefixes.append(prefix)
+            names.append(name)
+            offsets.append(pos)
+            ends.append(next)
+            values.append(value)
+            if last[-1] >= 0:
+                nexts[last[-1]] = index
+            elif parent >= 0:
+                firsts[parent] = index
+            last[-1] = index
+            if kind == ELEMENT:
+                stack.append(index)
+                last.append(-1)
+            elif kind == TEXT_END:
+                if not stack:
+                    raise ScanError('unbalanced EndElement', pos)
+                stack.pop()
+                last.pop()
+            pos = next
+        if stack:
+            raise ScanError('element not closed', pos)
+
+    def __len__(self):
+        return len(self.types)
+
+    def cursor(self, index=0):
+        """returns a Cursor on the node index (the first node by default)"""
+        if not 0 <= index < len(self.types):
+            raise IndexError('node index out of range')
+        return Cursor(self, index)
+
+    def find(self, name):
+        """
+        yields a Cursor for every element or array with the (unprefixed)
+        name
+        """
+        try:
+            id = self.strings.index(name)
+        except ValueError:
+            return
+        types = self.types
+        for index, value in enumerate(self.names):
+            if value == id and KINDS[types[index]] != ATTRIBUTE:
+                yield Cursor(self, index)
+
+    def subtree_end(self, index):
+        """returns the index after the last node below index"""
+        nexts, parents = self.nexts, self.parents
+        while index != -1 and nexts[index] == -1:
+            index = parents[index]
+        return len(self.types) if index == -1 else nexts[index]
+
+    def encode(self, index=None):
+        """
+        encodes the document, or the subtree of the node index, back to
+        binary by copying the spans of the nodes and adding the
+        EndElement records
+        """
+        data = memoryview(self.data)
+        types, parents = self.types, self.parents
+        offsets, ends = self.offsets, self.ends
+        if index is None:
+            start, stop = 0, len(types)
+        else:
+            start, stop = index, self.subtree_end(index)
+        out = []
+        stack = []
+        for i in range(start, stop):
+            parent = parents[i]
+            while stack and stack[-1] != parent:
+                stack.pop()
+                out.append(b'\x01')
+            out.append(data[offsets[i]:ends[i]])
+            kind = KINDS[types[i]]
+            if kind == ELEMENT:
+                stack.append(i)
+            elif kind == TEXT_END and stack:
+                stack.pop()
+        out.extend([b'\x01'] * len(stack))
+        return b''.join(out)
+
+
+class Cursor(object):
+    """
+    A position in a :class:`CompactDocument`. Cursors are cheap views,
+    all information is read from the columns of the document.
+    """
+    __slots__ = ('document', 'index')
+
+    def __init__(self, document, index):
+        self.document = document
+        self.index = index
+
+    def __eq__(self, other):
+        return (isinstance(other, Cursor) and
+                self.document is other.document and
+                self.index == other.index)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.document), self.index))
+
+    def __repr__(self):
+        return '<Cursor(index=%d, type=0x%02X)>' % (self.index, self.type)
+
+    def _cursor(self, index):
+        return None if index == -1 else Cursor(self.document, index)
+
+    @property
+    def type(self):
+        return self.document.types[self.index]
+
+    @property
+    def kind(self):
+        """the record kind, see :mod:`wcf.records.scanner`"""
+        return KINDS[self.document.types[self.index]]
+
+    @property
+    def prefix(self):
+        id = self.document.prefixes[self.index]
+        return None if id == -1 else self.document.strings[id]
+
+    @property
+    def name(self):
+        id = self.document.names[self.index]
+        return None if id == -1 else self.document.strings[id]
+
+    @property
+    def qname(self):
+        prefix = self.prefix
+        return '%s:%s' % (prefix, self.name) if prefix else self.name
+
+    @property
+    def parent(self):
+        return self._cursor(self.document.parents[self.index])
+
+    @property
+    def first_child(self):
+        return self._cursor(self.document.firsts[self.index])
+
+    @property
+    def next_sibling(self):
+        return self._cursor(self.document.nexts[self.index])
+
+    def _childs(self):
+        nexts = self.document.nexts
+        index = self.document.firsts[self.index]
+        while index != -1:
+            yield index
+            index = nexts[index]
+
+    def children(self):
+        """yields the child nodes, except the attributes"""
+        types = self.document.types
+        for index in self._childs():
+            if KINDS[types[index]] != ATTRIBUTE:
+                yield Cursor(self.document, index)
+
+    def attributes(self):
+        """yields the attribute nodes"""
+        types = self.document.types
+        for index in self._childs():
+            if KINDS[types[index]] != ATTRIBUTE:
+                break
+            yield Cursor(self.document, index)
+
+    def __getitem__(self, name):
+        """returns the value of the attribute with the qualified name"""
+        for attribute in self.attributes():
+            if attribute.qname == name:
+                return attribute.value
+        raise KeyError(name)
+
+    def _decode(self, offset, end):
+        data = self.document.data
+        type = data[offset]
+        if KINDS[type] == TEXT_END:
+            type -= 1
+        return Record.records[type].parse(
+            self.document._reader(data[offset + 1:end]))
+
+    @property
+    def value(self):
+        """
+        the value of texts and attributes as text, None for other nodes
+        """
+        doc = self.document
+        index = self.index
+        type = doc.types[index]
+        kind = KINDS[type]
+        if kind == TEXT or kind == TEXT_END:
+            return str(self._decode(doc.offsets[index], doc.ends[index]))
+        elif kind != ATTRIBUTE:
+            return None
+        offset = doc.values[index]
+        if 0x08 <= type <= 0x0B:
+            if type >= 0x0A:
+                return lookup(read_mbi31(doc.data, offset)[0],
+                              doc.dictionary)
+            ln, offset = read_mbi31(doc.data, offset)
+            return doc.data[offset:offset + ln].decode('utf-8')
+        return str(self._decode(offset, doc.ends[index]))
+
+    def record(self):
+        """decodes the node (with its subtree) into a Record"""
+        doc = self.document
+        if self.kind == ELEMENT:
+            return Record.parse(doc._reader(self.encode()))[0]
+        return self._decode(doc.offsets[self.index], doc.ends[self.index])
+
+    def encode(self):
+        """encodes the node with its subtree"""
+        return self.document.encode(self.index)
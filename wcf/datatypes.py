@@ -30,13 +30,152 @@ from __future__ import unicode_literals
 
 from builtins import str, bytes
 
+import mmap
 import struct
 import logging
 import sys
+from io import BytesIO
 
 log = logging.getLogger(__name__)
 
 
+class NameTable(dict):
+    """
+    bounded table of decoded names, keyed by their utf-8 encoding. Every
+    distinct name is decoded once per message; all occurrences share the
+    same string.
+
+    >>> names = NameTable()
+    >>> names.decode(b'Body') is names.decode(b'Body')
+    True
+    """
+
+    def __init__(self, limit=4096, max_length=256):
+        super(NameTable, self).__init__()
+        self.limit = limit
+        self.max_length = max_length
+
+    def decode(self, data):
+        value = self.get(data)
+        if value is None:
+            value = str(data, 'utf-8')
+            if len(self) < self.limit and len(data) <= self.max_length:
+                self[bytes(data)] = value
+        return value
+
+
+class BufferReader(BytesIO):
+    """
+    file like object over an in memory message. :meth:`read_view` returns
+    slices of the source buffer instead of copies; the records decoded
+    from it keep the buffer alive as long as they hold such a slice.
+    Reads shorter than min_view are copied, a memoryview takes more memory
+    than a short bytes object. dictionary is the
+    :class:`wcf.dictionary.Dictionary` or
+    :class:`wcf.dictionary.DictionarySession` the dictionary records
+    decoded from it resolve their ids with (None for the default one).
+
+    >>> fp = BufferReader(b'\\x03abcd', min_view=0)
+    >>> fp.read(1)
+    b'\\x03'
+    >>> view = fp.read_view(3)
+    >>> view.obj is fp.buffer.obj, bytes(view), fp.read()
+    (True, b'abc', b'd')
+    """
+
+    def __init__(self, data, min_view=256):
+        super(BufferReader, self).__init__(data)
+        self.buffer = memoryview(data)
+        self.min_view = min_view
+        self.names = NameTable()
+        self.dictionary = None
+
+    def read_view(self, n):
+        if n < self.min_view:
+            return self.read(n)
+        pos = self.tell()
+        end = min(pos + n, len(self.buffer))
+        self.seek(end)
+        return self.buffer[pos:end]
+
+
+class MappedReader(object):
+    """
+    file like object over a mmap, reads and slices go straight to the
+    mapping. Like :class:`BufferReader`, read_view returns slices of it.
+
+    :param map: the mmap
+    :param start: position of the message in the mapping
+    """
+
+    def __init__(self, map, start=0, min_view=256):
+        self.map = map
+        self.buffer = memoryview(map)
+        self.min_view = min_view
+        self.names = NameTable()
+        self.dictionary = None
+        self.read = map.read
+        self.seek = map.seek
+        self.tell = map.tell
+        map.seek(start)
+
+    read_view = BufferReader.read_view
+
+
+def reader_for(data):
+    """
+    returns a :class:`MappedReader` if data is a mmap, else a
+    :class:`BufferReader`
+    """
+    if isinstance(data, mmap.mmap):
+        return MappedReader(data)
+    return BufferReader(data)
+
+
+class StreamReader(object):
+    """
+    file like wrapper used to decode from a stream without reading it
+    completely, carries the name table, the dictionary and the blob sink
+    of the decoder
+    """
+
+    def __init__(self, fp, blob_sink=None):
+        self.fp = fp
+        self.read = fp.read
+        self.names = NameTable()
+        self.dictionary = None
+        self.blob_sink = blob_sink
+
+    def tell(self):
+        return self.fp.tell()
+
+
+def read_blob(fp, n):
+    """
+    reads the n byte payload of a Bytes record. If the reader has a blob
+    sink (see :mod:`wcf.records.blobs`) and n reaches its threshold, the
+    sink takes the payload and its result is returned.
+    """
+    sink = getattr(fp, 'blob_sink', None)
+    if sink is not None and n >= sink.threshold:
+        check = getattr(fp, 'check_string', None)
+        if check is not None:
+            check(n)
+        return sink.consume(fp, n)
+    return read_view(fp, n)
+
+
+def read_view(fp, n):
+    """
+    reads n bytes from fp, as a slice of the source buffer if fp is a
+    :class:`BufferReader`
+    """
+    read = getattr(fp, 'read_view', None)
+    if read is None:
+        return fp.read(n)
+    return read(n)
+
+
 class MultiByteInt31(object):
 
     def __init__(self, *args):
@@ -89,6 +228,20 @@ class MultiByteInt31(object):
                               value_a)
         return bytes(ret)
 
+    def size(self):
+        """
+        returns the length of the encoded value without encoding it
+
+        >>> [MultiByteInt31(v).size() for v in (0x7f, 0x80, 0x3fffffff)]
+        [1, 2, 5]
+        """
+        value = self.value
+        size = 1
+        while value > 0x7F and size < 5:
+            value >>= 7
+            size += 1
+        return size
+
     def __str__(self):
         return str(self.value)
 
@@ -108,10 +261,13 @@ class MultiByteInt31(object):
         >>> mb = MultiByteInt31.parse(fp)
         >>> mb.value
         1337
+        >>> fp = BytesIO(b'\\x80\\x80\\x80\\x80\\x01')
+        >>> MultiByteInt31.parse(fp).value
+        268435456
         """
         v = 0
         # tmp = ''
-        for pos in range(4):
+        for pos in range(5):
             b = fp.read(1)
             # tmp += b
             value = struct.unpack(b'<B', b)[0]
@@ -144,6 +300,16 @@ class Utf8String(object):
 
         return bytes(MultiByteInt31(strlen).to_bytes() + data)
 
+    def size(self):
+        """
+        returns the length of the encoded string without encoding it
+
+        >>> Utf8String('\xfcber').size()
+        6
+        """
+        length = len(self.value.encode('utf-8'))
+        return MultiByteInt31(length).size() + length
+
     def __str__(self):
         return str(self.value)
 
@@ -157,8 +323,14 @@ class Utf8String(object):
         b'\\x05\\xc3\\xbcber'
         >>> print(str(s))
         über
+        >>> s = Utf8String('x' * 200).to_bytes()
+        >>> len(Utf8String.parse(BytesIO(s)).value)
+        200
         """
-        lngth = struct.unpack(b'<B', fp.read(1))[0]
+        lngth = MultiByteInt31.parse(fp).value
+        names = getattr(fp, 'names', None)
+        if names is not None:
+            return cls(names.decode(fp.read(lngth)))
 
         return cls(fp.read(lngth).decode('utf-8'))
 
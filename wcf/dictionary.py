@@ -26,6 +26,16 @@
 #  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 #  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 #  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from io import BytesIO
+
+from wcf.datatypes import MultiByteInt31, Utf8String
+
+__all__ = ['dictionary', 'inverted_dict', 'Dictionary', 'DEFAULT_DICTIONARY',
+           'DictionarySession', 'lookup', 'resolver']
+
 dictionary = {
 0x00 : 'mustUnderstand',
 0x02 : 'Envelope',
@@ -517,3 +527,248 @@ dictionary = {
 }
 
 inverted_dict = dict([(v, k) for (k, v) in dictionary.items()])
+
+
+class Dictionary(object):
+    """
+    A static dictionary: the strings of the even ids.
+
+    Dictionaries don't change after they were created, so any number of
+    them can be used by several threads or connections at the same time.
+    Strings are looked up by id in a list and ids by string in a dict.
+
+    >>> d = Dictionary({0: 'Envelope', 2: 'Body'})
+    >>> d[2], d.get('Envelope'), d.get('Header')
+    ('Body', 0, None)
+    >>> custom = DEFAULT_DICTIONARY.extend({0x3CE: 'Order'})
+    >>> custom[0x3CE], custom.get('Order'), DEFAULT_DICTIONARY.get('Order')
+    ('Order', 974, None)
+    >>> custom[4] == DEFAULT_DICTIONARY[4]
+    True
+
+    :param entries: dict of the even ids to their strings
+    """
+
+    def __init__(self, entries=()):
+        entries = dict(entries)
+        for id in entries:
+            if id & 1 or id < 0:
+                raise ValueError('static dictionary ids are even, got %d' %
+                                 id)
+        size = max(entries) // 2 + 1 if entries else 0
+        self.strings = [None] * size
+        self.ids = {}
+        for id in sorted(entries):
+            self.strings[id >> 1] = entries[id]
+            self.ids.setdefault(entries[id], id)
+
+    def __getitem__(self, index):
+        if index & 1:
+            raise KeyError('session dictionary id %d without a '
+                           'DictionarySession' % index)
+        try:
+            string = self.strings[index >> 1]
+        except IndexError:
+            string = None
+        if string is None or index < 0:
+            raise KeyError(index)
+        return string
+
+    def __len__(self):
+        return len(self.strings) - self.strings.count(None)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, index):
+        return (not index & 1 and 0 <= index >> 1 < len(self.strings) and
+                self.strings[index >> 1] is not None)
+
+    def keys(self):
+        return [2 * i for i, s in enumerate(self.strings) if s is not None]
+
+    def items(self):
+        return [(2 * i, s) for i, s in enumerate(self.strings)
+                if s is not None]
+
+    def values(self):
+        return [s for s in self.strings if s is not None]
+
+    def get(self, string):
+        """returns the id of string or None"""
+        return self.ids.get(string)
+
+    def extend(self, entries):
+        """
+        returns a new dictionary with the additional entries, e.g. the
+        static entries learned by :mod:`wcf.learning`
+        """
+        merged = dict(self.items())
+        merged.update(entries)
+        return Dictionary(merged)
+
+    @classmethod
+    def load(cls, path, base=None):
+        """
+        returns base (the default dictionary) extended by the static
+        entries of a file written by
+        :meth:`wcf.learning.LearnedDictionary.save`
+        """
+        import io
+        import json
+        with io.open(path, encoding='utf-8') as fp:
+            data = json.load(fp)
+        base = DEFAULT_DICTIONARY if base is None else base
+        return base.extend(dict((int(i), s)
+                                for i, s in data['static'].items()))
+
+
+DEFAULT_DICTIONARY = Dictionary(dictionary)
+
+
+def lookup(index, dictionary=None):
+    """
+    resolves a dictionary id with a :class:`Dictionary` or a
+    :class:`DictionarySession` (by default the default dictionary). Even
+    ids are entries of the static dictionary, odd ids strings of the
+    session dictionary.
+
+    >>> lookup(2)
+    'Envelope'
+    >>> session = DictionarySession()
+    >>> lookup(session.add('Order'), session), lookup(2, session)
+    ('Order', 'Envelope')
+    >>> lookup(1)
+    Traceback (most recent call last):
+    ...
+    KeyError: 'session dictionary id 1 without a DictionarySession'
+    """
+    if dictionary is None:
+        dictionary = DEFAULT_DICTIONARY
+    return dictionary[index]
+
+
+def resolver(dictionary=None, session=None):
+    """
+    returns the object the records resolve their ids with: the session if
+    there is one, else the dictionary. A session uses the static
+    dictionary it was created with.
+    """
+    if session is None:
+        return dictionary
+    if dictionary is not None and session.dictionary is not dictionary:
+        raise ValueError('the session was created for another dictionary')
+    return session
+
+
+class DictionarySession(object):
+    """
+    dynamic dictionary of a session (application/soap+msbinsession1).
+
+    Every message of a session is preceded by a table of the strings it
+    adds to the dictionary. The strings get the odd ids 1, 3, 5, ... in
+    the order they were added and keep them for the rest of the session.
+    Use one session object per direction of a channel: pass it to every
+    :meth:`wcf.records.Record.parse` call to read the tables and resolve
+    the ids, or to :func:`wcf.records.dump_records` to write the strings
+    added since the last message.
+
+    >>> session = DictionarySession()
+    >>> session.add('Order'), session.add('Item'), session.add('Order')
+    (1, 3, 1)
+    >>> table = session.dump_table()
+    >>> table
+    b'\\x0b\\x05Order\\x04Item'
+    >>> session.dump_table()
+    b'\\x00'
+    >>> peer = DictionarySession()
+    >>> peer.read_table(BytesIO(table))
+    ['Order', 'Item']
+    >>> peer[3], peer.get('Order')
+    ('Item', 1)
+
+    :param dictionary: the static :class:`Dictionary` resolving the even
+                       ids, by default the default dictionary
+    :param max_strings: maximum number of strings of the session, reading
+                        a table exceeding it raises a ValueError
+    """
+
+    def __init__(self, dictionary=None, max_strings=65536):
+        self.dictionary = (DEFAULT_DICTIONARY if dictionary is None
+                           else dictionary)
+        self.max_strings = max_strings
+        self.strings = []
+        self.ids = {}
+        # strings from this index on weren't written by dump_table yet
+        self._written = 0
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __getitem__(self, index):
+        if not index & 1:
+            return self.dictionary[index]
+        if not 0 < index < 2 * len(self.strings):
+            raise KeyError('unknown session dictionary id %d' % index)
+        return self.strings[index >> 1]
+
+    def __contains__(self, string):
+        return string in self.ids
+
+    def get(self, string):
+        """returns the id of string or None"""
+        return self.ids.get(string)
+
+    def _append(self, string):
+        if len(self.strings) >= self.max_strings:
+            raise ValueError('session dictionary exceeds %d strings' %
+                             self.max_strings)
+        id = 2 * len(self.strings) + 1
+        self.strings.append(string)
+        self.ids.setdefault(string, id)
+        return id
+
+    def add(self, string):
+        """
+        returns the id of string, adding it to the session if it isn't
+        part of it yet. New strings are written by the next
+        :meth:`dump_table`.
+        """
+        id = self.ids.get(string)
+        if id is None:
+            id = self._append(string)
+        return id
+
+    def read_table(self, fp):
+        """
+        reads the string table preceding a message from fp and adds its
+        strings to the session
+
+        :returns: the new strings
+        """
+        size = MultiByteInt31.parse(fp).value
+        data = fp.read(size)
+        if len(data) != size:
+            raise ValueError('string table truncated')
+        table = BytesIO(data)
+        strings = []
+        while table.tell() < size:
+            length = MultiByteInt31.parse(table).value
+            string = table.read(length)
+            if len(string) != length:
+                raise ValueError('string table truncated')
+            strings.append(string.decode('utf-8'))
+        for string in strings:
+            self._append(string)
+        self._written = len(self.strings)
+        return strings
+
+    def dump_table(self):
+        """
+        returns the string table for the next message: the strings added
+        since the last call
+        """
+        strings = self.strings[self._written:]
+        self._written = len(self.strings)
+        data = b''.join(Utf8String(s).to_bytes() for s in strings)
+        return MultiByteInt31(len(data)).to_bytes() + data
@@ -0,0 +1,515 @@
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+#  Copyright (c) 2011, Timo Schmid <tschmid@ernw.de>
+#  All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#  * Neither the name of the ERMW GmbH nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+.NET Message Framing (net.tcp).
+
+A net.tcp connection starts with a preamble (Version, Mode, Via and
+encoding records) and carries the messages in envelope records::
+
+    >>> encoder = FrameEncoder('net.tcp://localhost/Service')
+    >>> from wcf.records import ShortElementRecord
+    >>> data = (encoder.preamble() +
+    ...         encoder.envelope([ShortElementRecord('Ping')]) +
+    ...         encoder.end())
+    >>> decoder = FrameDecoder()
+    >>> frames = decoder.feed(data)
+    >>> [f.name for f in frames]
+    ['Version', 'Mode', 'Via', 'KnownEncoding', 'PreambleEnd', \
+'SizedEnvelope', 'End']
+    >>> decoder.via
+    'net.tcp://localhost/Service'
+    >>> decoder.decode(frames[5])
+    [<ShortElementRecord(type=0x40)>]
+"""
+from __future__ import absolute_import, unicode_literals
+
+import socket
+import struct
+
+from wcf.datatypes import BufferReader, MultiByteInt31, Utf8String
+from wcf.dictionary import DictionarySession
+from wcf.records import Record, dump_records, dump_segments
+
+__all__ = ['Frame', 'FrameDecoder', 'FrameEncoder', 'FramingError',
+           'parse_frame', 'read_frames']
+
+# record types
+VERSION = 0x00
+MODE = 0x01
+VIA = 0x02
+KNOWN_ENCODING = 0x03
+EXTENSIBLE_ENCODING = 0x04
+UNSIZED_ENVELOPE = 0x05
+SIZED_ENVELOPE = 0x06
+END = 0x07
+FAULT = 0x08
+UPGRADE_REQUEST = 0x09
+UPGRADE_RESPONSE = 0x0A
+PREAMBLE_ACK = 0x0B
+PREAMBLE_END = 0x0C
+
+NAMES = {
+    VERSION: 'Version',
+    MODE: 'Mode',
+    VIA: 'Via',
+    KNOWN_ENCODING: 'KnownEncoding',
+    EXTENSIBLE_ENCODING: 'ExtensibleEncoding',
+    UNSIZED_ENVELOPE: 'UnsizedEnvelope',
+    SIZED_ENVELOPE: 'SizedEnvelope',
+    END: 'End',
+    FAULT: 'Fault',
+    UPGRADE_REQUEST: 'UpgradeRequest',
+    UPGRADE_RESPONSE: 'UpgradeResponse',
+    PREAMBLE_ACK: 'PreambleAck',
+    PREAMBLE_END: 'PreambleEnd',
+}
+
+# modes
+SINGLETON_UNSIZED = 0x01
+DUPLEX = 0x02
+SIMPLEX = 0x03
+SINGLETON_SIZED = 0x04
+
+# known encodings
+SOAP11_UTF8 = 0x00
+SOAP11_UTF16 = 0x01
+SOAP11_UNICODE_LE = 0x02
+SOAP12_UTF8 = 0x03
+SOAP12_UTF16 = 0x04
+SOAP12_UNICODE_LE = 0x05
+MTOM = 0x06
+BINARY = 0x07
+BINARY_SESSION = 0x08
+
+# data chunks of unsized envelopes written by Frame.to_bytes
+CHUNK_SIZE = 0xFFFF
+
+
+class FramingError(ValueError):
+    """raised on invalid framing records"""
+
+
+def _mbi31(buf, pos):
+    # (value, position after it) or None if buf ends before the integer
+    value = 0
+    end = len(buf)
+    for shift in (0, 7, 14, 21, 28):
+        if pos >= end:
+            return None
+        b = buf[pos]
+        pos += 1
+        value |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return value, pos
+    raise FramingError('MultiByteInt31 too long at offset %d' % (pos - 1))
+
+
+class Frame(object):
+    """
+    A record of the framing protocol.
+
+    The value depends on the type: (major, minor) for Version, the mode
+    for Mode, the encoding id for KnownEncoding, the payload for the
+    envelopes, a string for Via, ExtensibleEncoding, Fault and
+    UpgradeRequest and None for the others.
+
+    >>> Frame(VIA, 'net.tcp://a/').to_bytes()
+    b'\\x02\\x0cnet.tcp://a/'
+    >>> Frame(SIZED_ENVELOPE, b'@\\x01a\\x01').to_bytes()
+    b'\\x06\\x04@\\x01a\\x01'
+    """
+    __slots__ = ('type', 'value')
+
+    def __init__(self, type, value=None):
+        if type not in NAMES:
+            raise FramingError('unknown record type 0x%02X' % type)
+        self.type = type
+        self.value = value
+
+    @property
+    def name(self):
+        return NAMES[self.type]
+
+    def __repr__(self):
+        value = self.value
+        if self.type in (SIZED_ENVELOPE, UNSIZED_ENVELOPE):
+            value = '%d bytes' % len(value)
+        if value is None:
+            return '<Frame %s>' % self.name
+        return '<Frame %s(%s)>' % (self.name, value)
+
+    def __eq__(self, other):
+        if not isinstance(other, Frame) or self.type != other.type:
+            return False
+        if self.type in (SIZED_ENVELOPE, UNSIZED_ENVELOPE):
+            return bytes(self.value) == bytes(other.value)
+        return self.value == other.value
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def to_segments(self):
+        """
+        returns the encoded record as list of bytes like segments, the
+        payload of an envelope isn't copied
+        """
+        type = struct.pack(b'<B', self.type)
+        if self.type == VERSION:
+            return [type + struct.pack(b'<BB', *self.value)]
+        elif self.type in (MODE, KNOWN_ENCODING):
+            return [type + struct.pack(b'<B', self.value)]
+        elif self.type in (VIA, EXTENSIBLE_ENCODING, FAULT,
+                           UPGRADE_REQUEST):
+            return [type + Utf8String(self.value).to_bytes()]
+        elif self.type == SIZED_ENVELOPE:
+            return [type + MultiByteInt31(len(self.value)).to_bytes(),
+                    self.value]
+        elif self.type == UNSIZED_ENVELOPE:
+            segments = [type]
+            payload = memoryview(self.value)
+            for pos in range(0, len(payload), CHUNK_SIZE):
+                chunk = payload[pos:pos + CHUNK_SIZE]
+                segments.append(MultiByteInt31(len(chunk)).to_bytes())
+                segments.append(chunk)
+            segments.append(b'\x00')
+            return segments
+        return [type]
+
+    def to_bytes(self):
+        return b''.join(self.to_segments())
+
+
+def parse_frame(buf, pos=0):
+    """
+    parses the record at pos
+
+    :param buf: bytes like object
+    :returns: (frame, position after it); if buf ends inside the record
+              (None, minimal length buf needs to have to continue)
+
+    >>> parse_frame(b'\\x06\\x04@\\x01a\\x01')
+    (<Frame SizedEnvelope(4 bytes)>, 6)
+    >>> parse_frame(b'\\x06\\x04@\\x01')
+    (None, 6)
+    """
+    end = len(buf)
+    if pos >= end:
+        return None, pos + 1
+    type = buf[pos]
+    pos += 1
+    if type == VERSION:
+        if pos + 2 > end:
+            return None, pos + 2
+        return Frame(type, (buf[pos], buf[pos + 1])), pos + 2
+    elif type in (MODE, KNOWN_ENCODING):
+        if pos >= end:
+            return None, pos + 1
+        return Frame(type, buf[pos]), pos + 1
+    elif type in (VIA, EXTENSIBLE_ENCODING, FAULT, UPGRADE_REQUEST,
+                  SIZED_ENVELOPE):
+        size = _mbi31(buf, pos)
+        if size is None:
+            return None, end + 1
+        size, pos = size
+        if pos + size > end:
+            return None, pos + size
+        value = memoryview(buf)[pos:pos + size]
+        if type != SIZED_ENVELOPE:
+            value = bytes(value).decode('utf-8')
+        return Frame(type, value), pos + size
+    elif type == UNSIZED_ENVELOPE:
+        chunks = []
+        while True:
+            size = _mbi31(buf, pos)
+            if size is None:
+                return None, end + 1
+            size, pos = size
+            if not size:
+                break
+            if pos + size > end:
+                return None, pos + size
+            chunks.append(memoryview(buf)[pos:pos + size])
+            pos += size
+        if len(chunks) == 1:
+            value = chunks[0]
+        else:
+            value = b''.join(chunks)
+        return Frame(type, value), pos
+    elif type in NAMES:
+        return Frame(type), pos
+    raise FramingError('unknown record type 0x%02X at offset %d' %
+                       (type, pos - 1))
+
+
+class FrameDecoder(object):
+    """
+    Incremental decoder for one direction of a connection.
+
+    :meth:`feed` takes the data as it is received and returns the
+    completed records. Envelope payloads are views of the received data
+    (which must not be modified afterwards) if they arrived in one piece;
+    the pieces of a split record are joined once, when it's complete.
+
+    The decoder keeps the state announced by the preamble and decodes
+    envelopes with the binary decoder, using the session dictionary of
+    the connection for application/soap+msbinsession1.
+
+    >>> decoder = FrameDecoder()
+    >>> decoder.feed(b'\\x00\\x01\\x00\\x01\\x02\\x03\\x07\\x06\\x04@\\x01')
+    [<Frame Version((1, 0))>, <Frame Mode(2)>, <Frame KnownEncoding(7)>]
+    >>> frames = decoder.feed(b'a\\x01')
+    >>> frames
+    [<Frame SizedEnvelope(4 bytes)>]
+    >>> decoder.decode(frames[0])
+    [<ShortElementRecord(type=0x40)>]
+
+    :param encoding: the encoding for a direction without preamble (the
+                     replies of the server)
+    :param max_frame: maximum size of a record, a longer one raises a
+                      FramingError (before it's buffered, if its size is
+                      known early enough)
+    :param dictionary: the static :class:`wcf.dictionary.Dictionary` of
+                       the service, by default the default dictionary
+    """
+
+    def __init__(self, encoding=None, max_frame=64 * 1024 * 1024,
+                 dictionary=None):
+        self.max_frame = max_frame
+        self.dictionary = dictionary
+        self.version = None
+        self.mode = None
+        self.via = None
+        self.encoding = None
+        self.content_type = None
+        self.session = None
+        self.ended = False
+        self._pending = []
+        self._size = 0
+        self._needed = 1
+        # the chunks received of an incomplete UnsizedEnvelope
+        self._chunks = None
+        self._chunked = 0
+        if encoding is not None:
+            self._track(Frame(KNOWN_ENCODING, encoding))
+
+    def feed(self, data):
+        """
+        :param data: the next received bytes
+        :returns: list of the completed Frames
+        """
+        if not len(data):
+            return []
+        self._pending.append(data)
+        self._size += len(data)
+        if self._size < self._needed:
+            return []
+        if len(self._pending) == 1:
+            buf = memoryview(self._pending[0])
+        else:
+            buf = memoryview(b''.join(self._pending))
+        frames = []
+        pos = 0
+        end = len(buf)
+        next = pos + 1
+        while pos < end:
+            if self._chunks is None and buf[pos] != UNSIZED_ENVELOPE:
+                frame, next = parse_frame(buf, pos)
+                self._check_size(next - pos)
+                if frame is None:
+                    break
+            else:
+                # the chunks of an UnsizedEnvelope are consumed as they
+                # arrive, so a long one isn't parsed again for each
+                if self._chunks is None:
+                    self._chunks = []
+                    self._chunked = 1
+                    pos += 1
+                size = _mbi31(buf, pos)
+                if size is None:
+                    next = end + 1
+                    break
+                size, start = size
+                next = start + size
+                self._check_size(self._chunked + next - pos)
+                if next > end:
+                    break
+                self._chunked += next - pos
+                if size:
+                    self._chunks.append(buf[start:next])
+                    pos = next
+                    continue
+                chunks = self._chunks
+                self._chunks = None
+                frame = Frame(UNSIZED_ENVELOPE, chunks[0] if len(chunks) == 1
+                              else b''.join(chunks))
+            self._track(frame)
+            frames.append(frame)
+            pos = next
+        if pos < end:
+            self._pending = [buf[pos:]]
+            self._size = end - pos
+            self._needed = next - pos
+        else:
+            self._pending = []
+            self._size = 0
+            self._needed = 1
+        return frames
+
+    def _check_size(self, size):
+        if size > self.max_frame:
+            raise FramingError('record of %d bytes exceeds max_frame' %
+                               size)
+
+    @property
+    def buffered(self):
+        """number of received bytes of an incomplete record"""
+        if self._chunks is not None:
+            return self._chunked + self._size
+        return self._size
+
+    def _track(self, frame):
+        type = frame.type
+        if type == VERSION:
+            self.version = frame.value
+        elif type == MODE:
+            self.mode = frame.value
+        elif type == VIA:
+            self.via = frame.value
+        elif type == KNOWN_ENCODING:
+            self.encoding = frame.value
+            if frame.value == BINARY_SESSION and self.session is None:
+                self.session = DictionarySession(self.dictionary)
+        elif type == EXTENSIBLE_ENCODING:
+            self.content_type = frame.value
+        elif type == END:
+            self.ended = True
+
+    def decode(self, frame, **kwargs):
+        """
+        decodes the payload of an envelope record
+
+        :param kwargs: passed on to :meth:`wcf.records.Record.parse`
+        :returns: the records of the message
+        """
+        if frame.type not in (SIZED_ENVELOPE, UNSIZED_ENVELOPE):
+            raise FramingError('%s is no envelope' % frame.name)
+        if self.encoding not in (BINARY, BINARY_SESSION):
+            raise FramingError('can\'t decode envelopes with encoding %r' %
+                               (self.encoding if self.content_type is None
+                                else self.content_type))
+        return Record.parse(BufferReader(frame.value), session=self.session,
+                            dictionary=self.dictionary, **kwargs)
+
+
+class FrameEncoder(object):
+    """
+    Encoder for one direction of a connection, the counterpart of
+    :class:`FrameDecoder`. With the binary session encoding, the strings
+    added to :attr:`session` (e.g. by
+    :meth:`wcf.xml2records.XMLParser.parse`) are written with the next
+    envelope.
+
+    :param via: the uri of the endpoint
+    :param mode: one of SINGLETON_UNSIZED, DUPLEX, SIMPLEX,
+                 SINGLETON_SIZED
+    :param encoding: BINARY or BINARY_SESSION
+    :param dictionary: the static dictionary of the session
+    """
+
+    def __init__(self, via, mode=DUPLEX, encoding=BINARY_SESSION,
+                 version=(1, 0), dictionary=None):
+        if encoding not in (BINARY, BINARY_SESSION):
+            raise FramingError('unsupported encoding %r' % (encoding,))
+        self.via = via
+        self.mode = mode
+        self.encoding = encoding
+        self.version = version
+        self.session = (DictionarySession(dictionary)
+                        if encoding == BINARY_SESSION else None)
+
+    def preamble(self):
+        """returns the preamble records"""
+        frames = [Frame(VERSION, self.version), Frame(MODE, self.mode),
+                  Frame(VIA, self.via), Frame(KNOWN_ENCODING, self.encoding)]
+        if self.mode != SIMPLEX:
+            frames.append(Frame(PREAMBLE_END))
+        return b''.join(f.to_bytes() for f in frames)
+
+    def _type(self):
+        if self.mode == SINGLETON_UNSIZED:
+            return UNSIZED_ENVELOPE
+        return SIZED_ENVELOPE
+
+    def envelope(self, records):
+        """returns the envelope record of a message"""
+        payload = dump_records(records, self.session)
+        return Frame(self._type(), payload).to_bytes()
+
+    def envelope_segments(self, records, min_segment=4096):
+        """
+        returns the envelope record of a message as list of buffers like
+        :func:`wcf.records.dump_segments`, for
+        :func:`wcf.records.send_segments`
+        """
+        segments = dump_segments(records, min_segment, self.session)
+        if self._type() == UNSIZED_ENVELOPE:
+            return Frame(UNSIZED_ENVELOPE, b''.join(segments)).to_segments()
+        size = sum(len(s) for s in segments)
+        return [struct.pack(b'<B', SIZED_ENVELOPE) +
+                MultiByteInt31(size).to_bytes()] + segments
+
+    def end(self):
+        """returns the End record"""
+        return Frame(END).to_bytes()
+
+
+def read_frames(fp, decoder=None, chunk_size=64 * 1024):
+    """
+    yields the records read from a socket or file like object until the
+    End record or the end of the stream
+
+    :param decoder: the FrameDecoder keeping the state of the connection,
+                    a new one by default
+    """
+    if decoder is None:
+        decoder = FrameDecoder()
+    if isinstance(fp, socket.socket):
+        read = fp.recv
+    else:
+        read = getattr(fp, 'read1', fp.read)
+    while not decoder.ended:
+        data = read(chunk_size)
+        if not data:
+            if decoder.buffered:
+                raise FramingError('stream ended inside a record')
+            return
+        for frame in decoder.feed(data):
+            yield frame
@@ -0,0 +1,343 @@
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+#  Copyright (c) 2011, Timo Schmid <tschmid@ernw.de>
+#  All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#  * Neither the name of the ERMW GmbH nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Dictionary learning: finds the strings of a corpus of messages worth
+encoding by dictionary id.
+
+The :class:`DictionaryLearner` counts the element names, attribute
+names, namespaces and short text values of the messages which aren't
+part of the static dictionary yet. :meth:`DictionaryLearner.learn`
+assigns every string worth it either a static id (continuing the static
+dictionary, both ends need the extended dictionary) or a place in the
+session dictionary (written once per session, but with shorter ids) --
+whichever saves more bytes. The savings are computed from the encoded
+sizes of the strings and ids, without encoding the messages again.
+
+>>> from wcf.records import ShortElementRecord, Chars8TextRecord
+>>> from wcf.records import dump_records
+>>> order = ShortElementRecord('Order')
+>>> order.childs.append(Chars8TextRecord('pending'))
+>>> learner = DictionaryLearner()
+>>> for i in range(3):
+...     learner.add_message(dump_records([order]))
+>>> learned = learner.learn()
+>>> learned.static
+{974: 'pending', 976: 'Order'}
+>>> print(learned.to_python())
+dictionary = {
+0x3CE : 'pending',
+0x3D0 : 'Order',
+}
+>>> learned.report()[0].saved
+10
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import io
+import json
+import timeit
+
+from wcf.datatypes import BufferReader, MultiByteInt31, Utf8String
+from wcf.dictionary import DEFAULT_DICTIONARY, lookup
+from wcf.records import (Record, Element, EndElementRecord, Attribute,
+                         ArrayRecord, EncodedText, dump_records)
+from wcf.records.attributes import (ShortXmlnsAttributeRecord,
+                                    XmlnsAttributeRecord,
+                                    ShortDictionaryXmlnsAttributeRecord,
+                                    DictionaryXmlnsAttributeRecord)
+
+__all__ = ['DictionaryLearner', 'LearnedDictionary', 'MessageReport']
+
+ELEMENT = 'element'
+ATTRIBUTE = 'attribute'
+NAMESPACE = 'namespace'
+TEXT = 'text'
+
+# size of the length field of the text records by type
+_LENGTH_FIELDS = {
+    0x98: 1, 0x9A: 2, 0x9C: 4,  # Chars8/16/32
+    0xB6: 1, 0xB8: 2, 0xBA: 4,  # UnicodeChars8/16/32
+}
+_XMLNS = (ShortXmlnsAttributeRecord, XmlnsAttributeRecord,
+          ShortDictionaryXmlnsAttributeRecord,
+          DictionaryXmlnsAttributeRecord)
+
+
+class MessageReport(object):
+    """projected savings for one message of the corpus"""
+    __slots__ = ('size', 'saved', 'parse_time', 'saved_time')
+
+    def __init__(self, size, saved, parse_time, saved_time):
+        self.size = size
+        self.saved = saved
+        self.parse_time = parse_time
+        self.saved_time = saved_time
+
+    def __repr__(self):
+        return '<MessageReport(size=%d, saved=%d)>' % (self.size, self.saved)
+
+
+class DictionaryLearner(object):
+    """
+    Collects the string statistics of a corpus.
+
+    :param base: the static :class:`wcf.dictionary.Dictionary` the learned
+                 ids continue (by default the default dictionary), strings
+                 already part of it are skipped
+    :param min_count: minimal number of occurrences of a string
+    :param max_text: text values longer than this (in encoded bytes)
+                     aren't counted
+    """
+
+    def __init__(self, base=None, min_count=2, max_text=128):
+        self.base = DEFAULT_DICTIONARY if base is None else base
+        self.min_count = min_count
+        self.max_text = max_text
+        self._known = set(self.base.values())
+        # string -> [occurrences, inline bytes, messages]
+        self.strings = {}
+        # string -> set of roles (element, attribute, namespace, text)
+        self.roles = {}
+        # (size, parse time, {string: (occurrences, inline bytes)})
+        self.messages = []
+
+    def add_message(self, data, session=None):
+        """
+        adds a message: binary, or XML (as str or bytes starting with
+        ``<``) which is encoded first
+
+        :param session: the session dictionary of a binary message with a
+                        string table
+        """
+        if not isinstance(data, bytes) or data.lstrip()[:1] == b'<':
+            if isinstance(data, bytes):
+                data = data.decode('utf-8')
+            from wcf.xml2records import XMLParser
+            data = dump_records(XMLParser.parse(data))
+            session = None
+        start = timeit.default_timer()
+        records = Record.parse(BufferReader(data), session=session)
+        parse_time = timeit.default_timer() - start
+        counts = {}
+        self._collect(records, counts)
+        for string, (occurrences, inline) in counts.items():
+            entry = self.strings.get(string)
+            if entry is None:
+                entry = self.strings[string] = [0, 0, 0]
+            entry[0] += occurrences
+            entry[1] += inline
+            entry[2] += 1
+        self.messages.append((len(data), parse_time, counts))
+
+    def add_file(self, path, session=None):
+        """adds the message stored in a file"""
+        with io.open(path, 'rb') as fp:
+            self.add_message(fp.read(), session)
+
+    def _add(self, counts, string, inline, role):
+        if string in self._known:
+            return
+        occurrences, total = counts.get(string, (0, 0))
+        counts[string] = (occurrences + 1, total + inline)
+        self.roles.setdefault(string, set()).add(role)
+
+    def _string(self, record, attr):
+        # the inline string of a record or the string of its session id,
+        # None for strings of the static dictionary
+        index = getattr(record, 'index', None)
+        if index is None:
+            return getattr(record, attr)
+        if index & 1:
+            return lookup(index, record._dictionary)
+        return None
+
+    def _collect(self, records, counts):
+        for r in records:
+            if isinstance(r, ArrayRecord):
+                self._collect([r.element], counts)
+            elif isinstance(r, Element) and not isinstance(r, EndElementRecord):
+                self._name(counts, self._string(r, 'name'), ELEMENT)
+                self._collect(r.attributes, counts)
+                self._collect(r.childs, counts)
+            elif isinstance(r, _XMLNS):
+                self._name(counts, self._string(r, 'value'), NAMESPACE)
+            elif isinstance(r, Attribute):
+                self._name(counts, self._string(r, 'name'), ATTRIBUTE)
+                self._collect([r.value], counts)
+            elif isinstance(r, EncodedText):
+                size = len(r.encode())
+                if size <= self.max_text:
+                    self._add(counts, r.value,
+                              _LENGTH_FIELDS[r.type] + size, TEXT)
+
+    def _name(self, counts, string, role):
+        if string is not None:
+            self._add(counts, string, Utf8String(string).size(), role)
+
+    def learn(self, session_length=1, max_strings=None):
+        """
+        chooses the strings and their dictionaries
+
+        Strings are considered by the bytes they take inline, the most
+        expensive ones get the shortest ids. A string takes the session
+        dictionary if it saves more there: its id is shorter, but the
+        string is written once per session and message containing it.
+
+        :param session_length: messages per session (connection)
+        :param max_strings: maximum number of strings to learn
+        :rtype: LearnedDictionary
+        """
+        static = {}
+        session = []
+        next_static = max(self.base) + 2 if self.base else 0
+        next_static += next_static & 1
+        next_session = 1
+        candidates = sorted(
+            [(entry[1], string) for string, entry in self.strings.items()
+             if entry[0] >= self.min_count], reverse=True)
+        for inline, string in candidates:
+            occurrences, _, messages = self.strings[string]
+            sessions = -(-messages // session_length)
+            static_saving = (inline - occurrences *
+                             MultiByteInt31(next_static).size())
+            session_saving = (inline - occurrences *
+                              MultiByteInt31(next_session).size() -
+                              sessions * Utf8String(string).size())
+            if max(static_saving, session_saving) <= 0:
+                continue
+            if static_saving >= session_saving:
+                static[next_static] = string
+                next_static += 2
+            else:
+                session.append(string)
+                next_session += 2
+            if (max_strings is not None and
+                    len(static) + len(session) >= max_strings):
+                break
+        return LearnedDictionary(static, session, self, session_length)
+
+
+class LearnedDictionary(object):
+    """
+    The result of :meth:`DictionaryLearner.learn`.
+
+    :ivar static: dict of the new static ids to their strings
+    :ivar session: list of the strings to add to the session dictionary,
+                   in the order of their ids
+    """
+
+    def __init__(self, static, session, learner=None, session_length=1):
+        self.static = static
+        self.session = session
+        self.learner = learner
+        self.session_length = session_length
+
+    def report(self):
+        """
+        projects the savings of every message of the corpus
+
+        The byte savings are computed from the sizes of the strings and
+        their ids; the parse time is assumed to shrink with the message
+        size.
+
+        :returns: list of :class:`MessageReport`
+        """
+        ids = dict((s, i) for i, s in self.static.items())
+        table = {}
+        for i, string in enumerate(self.session):
+            ids[string] = 2 * i + 1
+            # the session table, spread over the messages of a session
+            table[string] = Utf8String(string).size() / self.session_length
+        reports = []
+        for size, parse_time, counts in self.learner.messages:
+            saved = 0
+            for string, (occurrences, inline) in counts.items():
+                id = ids.get(string)
+                if id is not None:
+                    saved += (inline - occurrences *
+                              MultiByteInt31(id).size() -
+                              table.get(string, 0))
+            saved = int(round(saved))
+            reports.append(MessageReport(size, saved, parse_time,
+                                         parse_time * saved / size
+                                         if size else 0.0))
+        return reports
+
+    def format_report(self):
+        """returns the report as text table"""
+        lines = ['%8s %8s %8s %6s %10s %10s' % (
+            'message', 'bytes', 'saved', '%', 'parse us', 'saved us')]
+        total = saved = 0
+        for i, r in enumerate(self.report()):
+            total += r.size
+            saved += r.saved
+            lines.append('%8d %8d %8d %5.1f%% %10.1f %10.1f' % (
+                i, r.size, r.saved, 100.0 * r.saved / r.size if r.size
+                else 0, r.parse_time * 1e6, r.saved_time * 1e6))
+        lines.append('%8s %8d %8d %5.1f%%' % (
+            'total', total, saved, 100.0 * saved / total if total else 0))
+        return '\n'.join(lines)
+
+    def to_python(self):
+        """returns the static entries in the format of wcf.dictionary"""
+        lines = ['dictionary = {']
+        for id in sorted(self.static):
+            lines.append('0x%X : %r,' % (id, str(self.static[id])))
+        lines.append('}')
+        return '\n'.join(lines)
+
+    def to_json(self):
+        """returns the learned dictionary as JSON, see :meth:`load`"""
+        return json.dumps({
+            'static': dict(('%d' % i, s) for i, s in self.static.items()),
+            'session': self.session,
+        }, indent=1, sort_keys=True)
+
+    def save(self, path):
+        with io.open(path, 'w', encoding='utf-8') as fp:
+            fp.write(self.to_json())
+
+    @classmethod
+    def load(cls, path):
+        """
+        loads a dictionary written by :meth:`save`
+
+        >>> import os, tempfile
+        >>> fd, path = tempfile.mkstemp()
+        >>> os.close(fd)
+        >>> LearnedDictionary({974: 'Order'}, ['Item']).save(path)
+        >>> learned = LearnedDictionary.load(path)
+        >>> learned.static, learned.session
+        ({974: 'Order'}, ['Item'])
+        >>> os.remove(path)
+        """
+        with io.open(path, encoding='utf-8') as fp:
+            data = json.load(fp)
+        static = dict((int(i), s) for i, s in data['static'].items())
+        return cls(static, data['session'])
@@ -0,0 +1,193 @@
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+#  Copyright (c) 2011, Timo Schmid <tschmid@ernw.de>
+#  All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#  * Neither the name of the ERMW GmbH nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+In-place patching of fixed width text values.
+
+A message is indexed once; afterwards new values are packed directly
+into a copy of the buffer with ``struct.pack_into``, no records are
+created and nothing is encoded again.
+"""
+from __future__ import absolute_import, unicode_literals, division
+
+import datetime
+import struct
+import uuid
+
+from wcf.dictionary import lookup, resolver
+from wcf.records.scanner import (KINDS, ELEMENT, END_ELEMENT, TEXT,
+                                 TEXT_END, element_name, skip_element_header,
+                                 skip_record)
+
+__all__ = ['PatchIndex']
+
+_EPOCH = datetime.datetime(1, 1, 1)
+
+
+def _packer(fmt):
+    return struct.Struct(fmt).pack_into
+
+
+def _pack_uuid(buf, offset, value):
+    if not isinstance(value, uuid.UUID):
+        value = uuid.UUID(value)
+    buf[offset:offset + 16] = value.bytes_le
+
+
+def _pack_datetime(buf, offset, value):
+    if isinstance(value, datetime.datetime):
+        value = (value.replace(tzinfo=None) - _EPOCH) // \
+            datetime.timedelta(microseconds=1) * 10
+    # keep the timezone flags of the original value
+    tz = buf[offset + 7] & 0xC0
+    struct.pack_into(b'<Q', buf, offset, value & 0x3FFFFFFFFFFFFFFF)
+    buf[offset + 7] |= tz
+
+
+def _pack_timespan(buf, offset, value):
+    if isinstance(value, datetime.timedelta):
+        value = value // datetime.timedelta(microseconds=1) * 10
+    struct.pack_into(b'<q', buf, offset, value)
+
+
+# text record types whose value can be replaced in place
+PACKERS = {
+    0x88: _packer(b'<b'),   # Int8Text
+    0x8A: _packer(b'<h'),   # Int16Text
+    0x8C: _packer(b'<i'),   # Int32Text
+    0x8E: _packer(b'<q'),   # Int64Text
+    0x90: _packer(b'<f'),   # FloatText
+    0x92: _packer(b'<d'),   # DoubleText
+    0x96: _pack_datetime,   # DateTimeText
+    0xAC: _pack_uuid,       # UniqueIdText
+    0xAE: _pack_timespan,   # TimeSpanText
+    0xB0: _pack_uuid,       # UuidText
+    0xB2: _packer(b'<Q'),   # UInt64Text
+    0xB4: _packer(b'<?'),   # BoolText
+}
+
+
+def _qualified_name(prefix, name, dictionary=None):
+    if not isinstance(name, bytes):
+        name = lookup(name, dictionary)
+    else:
+        name = name.decode('utf-8')
+    if prefix:
+        return '%s:%s' % (prefix.decode('utf-8'), name)
+    return name
+
+
+class PatchIndex(object):
+    """
+    Index of the fixed width text values (Int*, UInt64, Float, Double,
+    Bool, DateTime, TimeSpan, UniqueId and Uuid records) of a message by
+    element path.
+
+    Values encoded without payload (e.g. ZeroText, OneText) or with a
+    variable length (Chars, Bytes) can't be patched. Element names
+    encoded by dictionary ids are resolved with dictionary or, for session
+    dictionary ids, session (see :mod:`wcf.dictionary`).
+
+    >>> from io import BytesIO
+    >>> from wcf.records import *
+    >>> el = ShortElementRecord('Count')
+    >>> el.childs.append(Int32TextRecord(1337))
+    >>> index = PatchIndex(dump_records([el]))
+    >>> index.paths
+    ['Count']
+    >>> data = index.patch({'Count': 42})
+    >>> str(Record.parse(BytesIO(data))[0].childs[0])
+    '42'
+    """
+
+    def __init__(self, data, session=None, dictionary=None):
+        self.data = bytes(data)
+        self.dictionary = resolver(dictionary, session)
+        self.fields = {}
+        self._index()
+
+    def _index(self):
+        data = self.data
+        path = []
+        pos = 0
+        end = len(data)
+        while pos < end:
+            kind = KINDS[data[pos]]
+            if kind == ELEMENT:
+                prefix, name = element_name(data, pos)
+                name = _qualified_name(prefix, name, self.dictionary)
+                path.append(path[-1] + '/' + name if path else name)
+                pos = skip_element_header(data, pos)
+                continue
+            if (kind == TEXT or kind == TEXT_END) and path:
+                type = data[pos] & 0xFE
+                if type in PACKERS:
+                    self.fields.setdefault(path[-1], []).append(
+                        (pos + 1, PACKERS[type]))
+            pos = skip_record(data, pos)
+            if (kind == END_ELEMENT or kind == TEXT_END) and path:
+                path.pop()
+
+    @property
+    def paths(self):
+        """the element paths with patchable values"""
+        return sorted(self.fields)
+
+    def offsets(self, path):
+        """the payload offsets of the values of the element at path"""
+        return [offset for offset, _ in self.fields[path]]
+
+    def patch(self, values):
+        """
+        returns a copy of the message with the given values
+
+        :param values: dict mapping element paths to new values. A list
+                       assigns one value per occurrence of the path.
+        :rtype: bytearray
+        """
+        buf = bytearray(self.data)
+        self.patch_into(buf, values)
+        return buf
+
+    def patch_into(self, buf, values):
+        """
+        writes the given values into buf, which has to be a writable copy
+        of the indexed message
+        """
+        fields = self.fields
+        for path, value in values.items():
+            targets = fields[path]
+            if isinstance(value, list):
+                if len(value) != len(targets):
+                    raise ValueError('%s occurs %d times, got %d values' %
+                                     (path, len(targets), len(value)))
+                for (offset, pack), v in zip(targets, value):
+                    pack(buf, offset, v)
+            else:
+                for offset, pack in targets:
+                    pack(buf, offset, value)
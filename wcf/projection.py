@@ -0,0 +1,191 @@
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+#  Copyright (c) 2011, Timo Schmid <tschmid@ernw.de>
+#  All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#  * Neither the name of the ERMW GmbH nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Path projection: decodes only the elements matching a set of paths.
+
+Everything outside of the requested paths is skipped by computing the
+record lengths with :mod:`wcf.records.scanner`, so no record objects are
+created and no strings are decoded for it.
+"""
+from __future__ import absolute_import, unicode_literals
+
+from wcf.datatypes import BufferReader
+from wcf.records import Record
+from wcf.records.scanner import (KINDS, ELEMENT, ARRAY, END_ELEMENT,
+                                 TEXT_END, element_name, skip_element,
+                                 skip_element_header, skip_record)
+from wcf.dictionary import inverted_dict, resolver
+
+__all__ = ['Projection', 'project']
+
+
+class _Node(object):
+
+    def __init__(self):
+        self.matchers = []
+        self.path = None
+
+    def child(self, component):
+        for matcher, node in self.matchers:
+            if matcher[3] == component:
+                return node
+        if component == '*':
+            matcher = (None, None, None, component)
+        else:
+            prefix, _, name = component.rpartition(':')
+            matcher = (prefix.encode('utf-8'), name.encode('utf-8'),
+                       inverted_dict.get(name), component)
+        node = _Node()
+        self.matchers.append((matcher, node))
+        return node
+
+    def match(self, prefix, name, found):
+        for (m_prefix, m_name, m_index, _), node in self.matchers:
+            if m_prefix is None or (prefix == m_prefix and
+                                    (name == m_name or name == m_index)):
+                found.append(node)
+
+
+class Projection(object):
+    """
+    A compiled set of element paths.
+
+    Paths are ``/`` separated qualified element names as printed by
+    :func:`wcf.records.print_records`, e.g. ``s:Envelope/s:Body/Order``.
+    ``*`` matches any single element.
+
+    >>> from wcf.records import ShortElementRecord, ElementRecord
+    >>> from wcf.records import Chars8TextRecord, dump_records
+    >>> root = ElementRecord('s', 'Envelope')
+    >>> a, b = ShortElementRecord('a'), ShortElementRecord('b')
+    >>> a.childs.append(Chars8TextRecord('skipped'))
+    >>> b.childs.append(Chars8TextRecord('wanted'))
+    >>> root.childs.extend([a, b])
+    >>> data = dump_records([root])
+    >>> result = Projection(['s:Envelope/b']).project(data)
+    >>> [str(r) for r in result['s:Envelope/b']]
+    ['<b>']
+    >>> str(result['s:Envelope/b'][0].childs[0])
+    'wanted'
+    """
+
+    def __init__(self, paths):
+        self.root = _Node()
+        self.paths = []
+        for path in paths:
+            node = self.root
+            for component in path.strip('/').split('/'):
+                node = node.child(component)
+            node.path = path
+            self.paths.append(path)
+
+    def project(self, data, session=None, dictionary=None):
+        """
+        decodes the elements matching the paths
+
+        :param data: bytes like object or file like object
+        :param session: the :class:`wcf.dictionary.DictionarySession`
+                        resolving the odd dictionary ids of the message
+        :param dictionary: the :class:`wcf.dictionary.Dictionary`
+                           resolving the even ids
+        :returns: dict mapping each path to the list of matching records
+        """
+        if hasattr(data, 'read'):
+            data = data.read()
+        result = dict((path, []) for path in self.paths)
+        dictionary = resolver(dictionary, session)
+        for path, start, end in self.iter_spans(data, dictionary):
+            fp = BufferReader(bytes(data[start:end]))
+            fp.dictionary = dictionary
+            result[path].append(Record.parse(fp)[0])
+        return result
+
+    def iter_spans(self, data, dictionary=None):
+        """
+        yields (path, start, end) for every element matching one of the
+        paths, in document order. Only records along the paths are looked
+        at.
+
+        :param dictionary: the dictionary or session resolving the ids of
+                           the message, by default the default dictionary
+        """
+        stack = [(self.root,)]
+        pos = 0
+        end = len(data)
+        while pos < end:
+            kind = KINDS[data[pos]]
+            if kind == ELEMENT or kind == ARRAY:
+                prefix, name = element_name(data, pos + 1 if kind == ARRAY
+                                            else pos)
+                if dictionary is not None and not isinstance(name, bytes):
+                    # the paths are compiled with the default ids
+                    name = dictionary[name].encode('utf-8')
+                nodes = []
+                for node in stack[-1]:
+                    node.match(prefix, name, nodes)
+                if not nodes:
+                    pos = self._skip(data, pos, kind)
+                    continue
+                stop = None
+                descend = False
+                for node in nodes:
+                    if node.path is not None:
+                        if stop is None:
+                            stop = self._skip(data, pos, kind)
+                        yield node.path, pos, stop
+                    descend = descend or bool(node.matchers)
+                if kind == ARRAY or not descend:
+                    pos = self._skip(data, pos, kind) if stop is None else stop
+                    continue
+                stack.append(nodes)
+                pos = skip_element_header(data, pos)
+                continue
+            pos = skip_record(data, pos)
+            if kind == END_ELEMENT or kind == TEXT_END:
+                if len(stack) > 1:
+                    stack.pop()
+
+    @staticmethod
+    def _skip(data, pos, kind):
+        if kind == ARRAY:
+            return skip_record(data, pos)
+        return skip_element(data, pos)
+
+
+def project(data, paths, session=None, dictionary=None):
+    """
+    decodes only the elements matching the given paths
+
+    :param data: bytes like object or file like object
+    :param paths: iterable of element paths (see :class:`Projection`)
+    :param session: session dictionary, see :meth:`Projection.project`
+    :param dictionary: static dictionary, see :meth:`Projection.project`
+    :returns: dict mapping each path to the list of matching records
+    """
+    return Projection(paths).project(data, session, dictionary)
@@ -29,12 +29,17 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
 from builtins import str
+import os
 import sys
+import socket
+import struct
 import logging
 
 log = logging.getLogger(__name__)
 
 from wcf.records.base import *
+from wcf.records.limits import *
+from wcf.records.blobs import *
 from wcf.records.text import *
 from wcf.records.attributes import *
 from wcf.records.elements import *
@@ -60,6 +65,8 @@ def print_records(records, skip=0, fp=None, first_call=True):
             continue
         if isinstance(r, Element):
             fp.write(('\n' if not first_call else '') + ' ' * skip + str(r))
+        elif isinstance(r, Bytes8TextRecord):
+            r.write_base64(fp)
         else:
             fp.write(str(r))
        
@@ -87,38 +94,210 @@ def repr_records(records, skip=0):
         if hasattr(r, 'childs'):
             repr_records(r.childs, skip+1)
 
-def dump_records(records):
+def dump_records(records, session=None):
     """
     returns the byte representation of a given record tree
 
+    Records parsed with ``raw=True`` which weren't modified since are
+    copied from the source bytes instead of being encoded again.
+
     :param records: the record tree
     :type records: wcf.records.Record
+    :param session: the :class:`wcf.dictionary.DictionarySession` of the
+                    channel; the table of the strings added to it since the
+                    last message is written first
     :returns: a bytestring
     :rtype: str|bytes
+
+    >>> from io import BytesIO
+    >>> data = b'@\\x01a@\\x01b\\x98\\x01x\\x01@\\x01c\\x01\\x01'
+    >>> r = Record.parse(BytesIO(data), raw=True)
+    >>> r[0].childs[1].name = 'd'
+    >>> dump_records(r)
+    b'@\\x01a@\\x01b\\x98\\x01x\\x01@\\x01d\\x01\\x01'
     """
-    out = b''
+    out = [] if session is None else [session.dump_table()]
+    _collect_segments(records, out, log.isEnabledFor(logging.DEBUG))
+    return b''.join([s.mmap() if isinstance(s, Blob) else s for s in out])
 
-    for r in records:
-        msg = 'Write %s' % type(r).__name__
-        if r == records[-1]:
+
+def dump_segments(records, min_segment=4096, session=None):
+    """
+    returns the byte representation of a given record tree as a list of
+    buffers instead of one bytestring
+
+    Segments of at least min_segment bytes (Bytes payloads, source bytes
+    of unmodified records parsed with ``raw=True``) are passed on as they
+    are, the small ones in between are joined. The list can be written
+    with :func:`send_segments` without joining it first. session is
+    handled like by :func:`dump_records`.
+
+    >>> el = ShortElementRecord('a')
+    >>> el.childs.append(Bytes16TextRecord(b'x' * 5000))
+    >>> segments = dump_segments([el])
+    >>> [len(s) for s in segments]
+    [6, 5000]
+    >>> b''.join(segments) == dump_records([el])
+    True
+    """
+    out = [] if session is None else [session.dump_table()]
+    _collect_segments(records, out, log.isEnabledFor(logging.DEBUG))
+    segments = []
+    pending = bytearray()
+    for segment in out:
+        if isinstance(segment, Blob):
+            segment = segment.mmap()
+        if len(segment) < min_segment:
+            pending += segment
+            continue
+        if pending:
+            segments.append(bytes(pending))
+            pending = bytearray()
+        segments.append(segment)
+    if pending:
+        segments.append(bytes(pending))
+    return segments
+
+
+def send_segments(fp, segments):
+    """
+    writes a list of buffers with one gathering system call per batch:
+    ``socket.sendmsg`` for sockets, ``os.writev`` for file descriptors or
+    objects with a fileno. Partial writes are continued.
+
+    :param fp: socket, file descriptor or file object
+    :param segments: list of bytes like objects, see :func:`dump_segments`
+    """
+    if isinstance(fp, socket.socket):
+        send = fp.sendmsg
+    else:
+        if not isinstance(fp, int):
+            # data buffered by the file object has to go first
+            fp.flush()
+        fd = fp if isinstance(fp, int) else fp.fileno()
+
+        def send(buffers):
+            return os.writev(fd, buffers)
+    try:
+        iov_max = os.sysconf('SC_IOV_MAX')
+    except (AttributeError, ValueError, OSError):
+        iov_max = 1024
+    segments = [memoryview(s) for s in segments if len(s)]
+    start = 0
+    while start < len(segments):
+        sent = send(segments[start:start + iov_max])
+        # skip the written segments, continue inside a partial one
+        while sent and sent >= len(segments[start]):
+            sent -= len(segments[start])
+            start += 1
+        if sent:
+            segments[start] = segments[start][sent:]
+
+
+def write_records(records, fp, buffer_size=64 * 1024, session=None):
+    """
+    writes the byte representation of a given record tree to fp
+
+    Small records are collected and written in blocks of buffer_size.
+    Payloads stored in files (see :meth:`Bytes8TextRecord.from_file`)
+    are streamed: with ``socket.sendfile`` if fp is a socket, else
+    through a reusable buffer filled with ``readinto``.
+
+    :param records: the record tree
+    :param fp: binary file like object or socket
+    :param session: session dictionary, see :func:`dump_records`
+
+    >>> from io import BytesIO
+    >>> out = BytesIO()
+    >>> el = ShortElementRecord('a')
+    >>> el.childs.append(Bytes8TextRecord(b'abc'))
+    >>> write_records([el], out)
+    >>> out.getvalue() == dump_records([el])
+    True
+    """
+    out = [] if session is None else [session.dump_table()]
+    _collect_segments(records, out, log.isEnabledFor(logging.DEBUG))
+    is_socket = isinstance(fp, socket.socket)
+    write = fp.sendall if is_socket else fp.write
+    pending = bytearray()
+    buf = None
+    for segment in out:
+        if not isinstance(segment, Blob) and len(segment) < buffer_size:
+            pending += segment
+            if len(pending) >= buffer_size:
+                write(pending)
+                pending = bytearray()
+            continue
+        if pending:
+            write(pending)
+            pending = bytearray()
+        if not isinstance(segment, Blob):
+            write(segment)
+        elif is_socket and isinstance(segment, FileBlob):
+            fp.sendfile(segment.file, segment.offset, segment.length)
+        elif isinstance(segment, FileBlob):
+            if buf is None:
+                buf = memoryview(bytearray(buffer_size))
+            _copy_blob(segment, write, buf)
+        else:
+            for chunk in segment.chunks(buffer_size):
+                write(chunk)
+    if pending:
+        write(pending)
+
+
+def _copy_blob(blob, write, buf):
+    file = blob.file
+    file.seek(blob.offset)
+    remaining = blob.length
+    while remaining > 0:
+        n = file.readinto(buf[:min(len(buf), remaining)])
+        if not n:
+            raise EOFError('payload file is truncated')
+        write(buf[:n])
+        remaining -= n
+
+
+def _collect_segments(records, out, debug):
+    # appends the encoded records to out, the segments of the childs are
+    # added to the same list so the message is only joined once
+    last = len(records) - 1
+
+    for i, r in enumerate(records):
+        raw = r.raw
+        if raw is not None:
+            if debug:
+                log.debug('Copy %s', type(r).__name__)
             if isinstance(r, Text):
-                r.type = r.type + 1
-                msg += ' with EndElement (0x%X)' % r.type
-        log.debug(msg)
-        log.debug('Value %s' % str(r))
-        if isinstance(r, Element) and not isinstance(r, EndElementRecord) and len(r.attributes):
-            log.debug(' Attributes:')
-            for a in r.attributes:
-                log.debug(' %s: %s' % (type(a).__name__, str(a)))
-        out += r.to_bytes()
-        
+                # the end element flag depends on the position of the text
+                out.append(struct.pack(b'<B', (raw[0] & 0xFE) |
+                                       (1 if i == last else 0)))
+                out.append(raw[1:])
+            else:
+                out.append(raw)
+            continue
+
+        segments = r.to_segments()
+        if i == last and isinstance(r, Text):
+            segments[0] = (struct.pack(b'<B', r.type + 1) +
+                           segments[0][1:])
+        if debug:
+            log.debug('Write %s (0x%X)', type(r).__name__, segments[0][0])
+            log.debug('Value %s', r)
+            if isinstance(r, Element) and not isinstance(r, EndElementRecord) and len(r.attributes):
+                log.debug(' Attributes:')
+                for a in r.attributes:
+                    log.debug(' %s: %s', type(a).__name__, a)
+        out.extend(segments)
+
         if hasattr(r, 'childs'):
-            out += dump_records(r.childs)
+            _collect_segments(r.childs, out, debug)
             if len(r.childs) == 0 or not isinstance(r.childs[-1], Text):
-                log.debug('Write EndElement for %s' % r.name)
-                out += EndElementRecord().to_bytes()
+                if debug:
+                    log.debug('Write EndElement for %s', r.name)
+                out.append(EndElementRecord().to_bytes())
         elif isinstance(r, Element) and not isinstance(r, EndElementRecord):
-            log.debug('Write EndElement for %s' % (r.name,))
-            out += EndElementRecord().to_bytes()
+            if debug:
+                log.debug('Write EndElement for %s', r.name)
+            out.append(EndElementRecord().to_bytes())
 
-    return out
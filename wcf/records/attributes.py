@@ -41,16 +41,16 @@ import logging
 import sys
 
 log = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 from wcf.datatypes import *
 from wcf.records.base import *
 from wcf.records.text import *
-from wcf.dictionary import dictionary
+from wcf.dictionary import lookup
 
 
 class ShortAttributeRecord(Attribute):
     type = 0x04
+    __slots__ = ('name', 'value')
 
     def __init__(self, name, value):
         self.name = name
@@ -90,6 +90,7 @@ class ShortAttributeRecord(Attribute):
 
 class AttributeRecord(Attribute):
     type = 0x05
+    __slots__ = ('prefix', 'name', 'value')
 
     def __init__(self, prefix, name, value):
         self.prefix = prefix
@@ -134,10 +135,12 @@ class AttributeRecord(Attribute):
 
 class ShortDictionaryAttributeRecord(Attribute):
     type = 0x06
+    __slots__ = ('index', 'value', '_dictionary')
 
-    def __init__(self, index, value):
+    def __init__(self, index, value, dictionary=None):
         self.index = index
         self.value = value
+        self._dictionary = dictionary
 
     def to_bytes(self):
         """
@@ -151,7 +154,8 @@ class ShortDictionaryAttributeRecord(Attribute):
         return bytes(bt)
 
     def __str__(self):
-        return '%s="%s"' % (dictionary[self.index], str(self.value))
+        return '%s="%s"' % (lookup(self.index, self._dictionary),
+                            str(self.value))
 
     @classmethod
     def parse(cls, fp):
@@ -170,16 +174,18 @@ class ShortDictionaryAttributeRecord(Attribute):
         type  = struct.unpack(b'<B', fp.read(1))[0]
         value = Record.records[type].parse(fp)
 
-        return cls(index, value)
+        return cls(index, value, getattr(fp, 'dictionary', None))
 
 
 class DictionaryAttributeRecord(Attribute):
     type = 0x07
+    __slots__ = ('prefix', 'index', 'value', '_dictionary')
 
-    def __init__(self, prefix, index, value):
+    def __init__(self, prefix, index, value, dictionary=None):
         self.prefix = prefix
         self.index = index
         self.value = value
+        self._dictionary = dictionary
 
     def to_bytes(self):
         """
@@ -194,8 +200,8 @@ class DictionaryAttributeRecord(Attribute):
         return bytes(bt)
 
     def __str__(self):
-        return '%s:%s="%s"' % (self.prefix, dictionary[self.index],
-                str(self.value))
+        return '%s:%s="%s"' % (self.prefix,
+                lookup(self.index, self._dictionary), str(self.value))
 
     @classmethod
     def parse(cls, fp):
@@ -215,17 +221,19 @@ class DictionaryAttributeRecord(Attribute):
         type  = struct.unpack(b'<B', fp.read(1))[0]
         value = Record.records[type].parse(fp)
 
-        return cls(prefix, index, value)
+        return cls(prefix, index, value, getattr(fp, 'dictionary', None))
 
 
 class ShortDictionaryXmlnsAttributeRecord(Attribute):
     type = 0x0A
+    __slots__ = ('index', '_dictionary')
 
-    def __init__(self, index):
+    def __init__(self, index, dictionary=None):
         self.index = index
+        self._dictionary = dictionary
 
     def __str__(self):
-        return 'xmlns="%s"' % (dictionary[self.index],)
+        return 'xmlns="%s"' % (lookup(self.index, self._dictionary),)
 
     def to_bytes(self):
         """
@@ -249,18 +257,21 @@ class ShortDictionaryXmlnsAttributeRecord(Attribute):
         'xmlns="http://www.w3.org/2005/08/addressing"'
         """
         index = MultiByteInt31.parse(fp).value
-        return cls(index)
+        return cls(index, getattr(fp, 'dictionary', None))
 
 
 class DictionaryXmlnsAttributeRecord(Attribute):
     type = 0x0B
+    __slots__ = ('prefix', 'index', '_dictionary')
 
-    def __init__(self, prefix, index):
+    def __init__(self, prefix, index, dictionary=None):
         self.prefix = prefix
         self.index = index
+        self._dictionary = dictionary
 
     def __str__(self):
-        return 'xmlns:%s="%s"' % (self.prefix, dictionary[self.index])
+        return 'xmlns:%s="%s"' % (self.prefix,
+                                  lookup(self.index, self._dictionary))
 
     def to_bytes(self):
         """
@@ -288,11 +299,12 @@ class DictionaryXmlnsAttributeRecord(Attribute):
         """
         prefix = Utf8String.parse(fp).value
         index = MultiByteInt31.parse(fp).value
-        return cls(prefix, index)
+        return cls(prefix, index, getattr(fp, 'dictionary', None))
 
 
 class ShortXmlnsAttributeRecord(Attribute):
     type = 0x08
+    __slots__ = ('value',)
 
     def __init__(self, value, *args, **kwargs):
         super(ShortXmlnsAttributeRecord, self).__init__(*args, **kwargs)
@@ -325,6 +337,7 @@ class ShortXmlnsAttributeRecord(Attribute):
 
 class XmlnsAttributeRecord(Attribute):
     type = 0x09
+    __slots__ = ('name', 'value')
 
     def __init__(self, name, value, *args, **kwargs):
         super(XmlnsAttributeRecord, self).__init__(*args, **kwargs)
@@ -358,8 +371,15 @@ class XmlnsAttributeRecord(Attribute):
 
 
 class PrefixAttributeRecord(AttributeRecord):
+    __slots__ = ()
+
     def __init__(self, name, value):
-        super(PrefixAttributeRecord, self).__init__(self.char, name, value)
+        self.name = name
+        self.value = value
+
+    @property
+    def prefix(self):
+        return self.char
 
     def to_bytes(self):
         r"""
@@ -386,9 +406,16 @@ class PrefixAttributeRecord(AttributeRecord):
 
 
 class PrefixDictionaryAttributeRecord(DictionaryAttributeRecord):
-    def __init__(self, index, value):
-        super(PrefixDictionaryAttributeRecord, self).__init__(self.char,
-                                                              index, value)
+    __slots__ = ()
+
+    def __init__(self, index, value, dictionary=None):
+        self.index = index
+        self.value = value
+        self._dictionary = dictionary
+
+    @property
+    def prefix(self):
+        return self.char
 
     def to_bytes(self):
         r"""
@@ -411,7 +438,7 @@ class PrefixDictionaryAttributeRecord(DictionaryAttributeRecord):
         index = MultiByteInt31.parse(fp).value
         type = struct.unpack(b'<B', fp.read(1))[0]
         value = Record.records[type].parse(fp)
-        return cls(index, value)
+        return cls(index, value, getattr(fp, 'dictionary', None))
 
 
 Record.add_records((
@@ -439,6 +466,7 @@ for c in range(0x0C, 0x25 + 1):
            dict(
                 type=c,
                 char=char,
+                __slots__=(),
             )
            )
     setattr(__module__, clsname, cls)
@@ -455,6 +483,7 @@ for c in range(0x26, 0x3F + 1):
            dict(
                 type=c,
                 char=char,
+                __slots__=(),
             )
            )
     setattr(__module__, clsname, cls)
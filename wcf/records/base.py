@@ -31,18 +31,110 @@ from __future__ import unicode_literals
 
 from builtins import str, bytes
 
+import mmap
+import os
 import struct
 import logging
+from io import BytesIO
 
 from wcf.datatypes import *
+from wcf.dictionary import lookup, resolver
+from wcf.records.limits import LimitedReader
 
 log = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
+
+
+_shared = {}
+_slots = {}
 
 
 class Record(object):
+    __slots__ = ('type', '_raw', '_parent')
+
     records = dict()
 
+    # records without state are decoded into one shared instance
+    stateless = False
+
+    def __new__(cls, *args, **kwargs):
+        self = object.__new__(cls)
+        # source bytes (data, start, end) of a parsed record while
+        # unmodified and the record containing it, see Record.touch
+        _set_raw(self, None)
+        _set_parent(self, None)
+        return self
+
+    def __getstate__(self):
+        state = {}
+        for name, slot in _slot_descriptors(type(self)):
+            try:
+                value = slot.__get__(self)
+            except AttributeError:
+                continue
+            if isinstance(value, memoryview):
+                value = value.tobytes()
+            elif name == '_raw' and isinstance(value, tuple):
+                data, start, end = value
+                if not isinstance(data, bytes):
+                    # a view of a mapping, keep only the bytes needed
+                    value = (bytes(data[start:end]), 0, end - start)
+            state[name] = value
+        return state
+
+    def __setstate__(self, state):
+        for name, slot in _slot_descriptors(type(self)):
+            if name in state:
+                slot.__set__(self, state[name])
+
+    @classmethod
+    def parse_file(cls, path, offset=0, length=None, **kwargs):
+        """
+        decodes a message from a file without reading it into memory: the
+        file is mapped with mmap and the records are decoded straight from
+        the mapping. Large payloads stay views of it.
+
+        :param path: the file name
+        :param offset: start of the message in the file
+        :param length: length of the message, by default up to the end of
+                       the file
+        :param kwargs: passed on to :meth:`parse`
+        """
+        with open(path, 'rb') as fp:
+            size = os.fstat(fp.fileno()).st_size
+            if length is None:
+                length = size - offset
+            if offset < 0 or length < 0 or offset + length > size:
+                raise ValueError('message at %d+%d exceeds the file (%d '
+                                 'bytes)' % (offset, length, size))
+            if length == 0:
+                return []
+            # mmap offsets have to be aligned
+            start = offset - offset % mmap.ALLOCATIONGRANULARITY
+            map = mmap.mmap(fp.fileno(), offset - start + length,
+                            access=mmap.ACCESS_READ, offset=start)
+        return cls.parse(MappedReader(map, offset - start), **kwargs)
+
+    @classmethod
+    def shared(cls):
+        """
+        returns the shared instance of a stateless record class, which the
+        decoder returns for every occurrence. Shared records must not be
+        modified.
+
+        >>> from wcf.records import *
+        >>> TrueTextRecord.shared() is TrueTextRecord.shared()
+        True
+        >>> r = Record.parse(BytesIO(b'@\\x01a\\x86@\\x01b\\x87\\x01'))
+        >>> r[0].childs[0] is r[0].childs[1].childs[0]
+        True
+        """
+        obj = _shared.get(cls)
+        if obj is None:
+            # setdefault keeps the instance of the first of several
+            # threads creating one at the same time
+            obj = _shared.setdefault(cls, cls())
+        return obj
+
     @classmethod
     def add_records(cls, records):
         """adds records to the lookup table
@@ -69,17 +161,90 @@ class Record(object):
         """
         return bytes(struct.pack(b'<B', self.type))
 
+    def to_segments(self):
+        """
+        Generates the representing bytes of the record as a list of bytes
+        like segments. Large payloads are returned as they are instead of
+        being copied into one bytestring, payloads stored in files as their
+        :class:`wcf.records.blobs.Blob`.
+
+        >>> from wcf.records import *
+        >>> ShortElementRecord('a').to_segments()
+        [b'@\\x01a']
+        """
+        return [self.to_bytes()]
+
     def __repr__(self):
         args = ['type=0x%X' % self.type]
         return '<%s(%s)>' % (type(self).__name__, ','.join(args))
 
+    def touch(self):
+        """
+        marks the record and all of its parents as modified, so they are
+        encoded again instead of copying their source bytes. For records
+        parsed with raw=True assignments to attributes and changes of
+        childs or attributes lists call this automatically.
+        """
+        record = self
+        while record is not None:
+            _set_raw(record, None)
+            record = record._parent
+
+    @property
+    def raw(self):
+        """
+        the source bytes of the record if it was parsed with raw=True and
+        wasn't modified since (for elements including all childs), else None
+
+        >>> from io import BytesIO
+        >>> r = Record.parse(BytesIO(b'@\\x01a\\x99\\x01x'), raw=True)
+        >>> bytes(r[0].raw)
+        b'@\\x01a\\x99\\x01x'
+        >>> r[0].childs[0].value = 'y'
+        >>> r[0].raw is None
+        True
+        """
+        if self._raw is None:
+            return None
+        data, start, end = self._raw
+        return memoryview(data)[start:end]
+
     @classmethod
-    def parse(cls, fp):
+    def parse(cls, fp, limits=None, lazy=False, raw=False, blob_sink=None,
+              session=None, dictionary=None):
         """
         Parses the binary data from fp into Record objects
 
         :param fp: file like object to read from
-        :returns: a root Record object with its child Records
+        :param limits: optional DecodeLimits, exceeding one of them raises
+                       a DecodeLimitError
+        :type limits: wcf.records.DecodeLimits
+        :param lazy: reads fp completely and scans it once; the childs of
+                     the elements are decoded on first access (see
+                     :class:`wcf.records.lazy.LazyChilds`). Can't be
+                     combined with limits.
+        :param raw: reads fp completely and keeps the source bytes of
+                    every record. Unmodified records are copied verbatim by
+                    :func:`wcf.records.dump_records` (see :attr:`raw`).
+        :param blob_sink: streams large Bytes payloads into a sink instead
+                          of memory (see :mod:`wcf.records.blobs`); fp is
+                          read incrementally then. Can't be combined with
+                          lazy or raw.
+        :param session: the :class:`wcf.dictionary.DictionarySession` of
+                        the channel (application/soap+msbinsession1). The
+                        string table preceding the message is read into it
+                        and the odd dictionary ids of the records are
+                        resolved with it.
+        :param dictionary: the :class:`wcf.dictionary.Dictionary`
+                           resolving the even ids, by default the
+                           default dictionary. With a session the
+                           dictionary of the session is used.
+        :returns: a root Record object with its child Records. Elements
+                  without childs or attributes share an empty tuple
+                  instead of holding empty lists; assign a new list to
+                  add some. Stateless records are shared (see
+                  :meth:`shared`) and equal names are decoded into the
+                  same string.
         :rtype: Record
 
         >>> from wcf.records import *
@@ -96,66 +261,282 @@ class Record(object):
         <a:test></a:test>
         """
         if cls != Record:
-            return cls()
+            return cls.shared() if cls.stateless else cls()
+        if blob_sink is not None and (lazy or raw):
+            raise ValueError('blob_sink can\'t be combined with lazy or raw')
+        dictionary = resolver(dictionary, session)
+        if session is not None:
+            session.read_table(fp if limits is None else
+                               LimitedReader(fp, limits))
+        if lazy:
+            if limits is not None or raw:
+                raise ValueError('lazy mode can\'t be combined with limits '
+                                 'or raw')
+            from wcf.records.lazy import span_index, parse_lazy
+            if isinstance(fp, MappedReader):
+                data = fp.map
+                start = fp.tell()
+            else:
+                data = fp.read()
+                start = 0
+            return parse_lazy(data, start, len(data),
+                              span_index(data, start), dictionary)
+        if blob_sink is not None:
+            fp = StreamReader(fp, blob_sink)
+        elif raw and isinstance(fp, MappedReader):
+            data = fp.buffer
+        elif raw:
+            data = fp.read()
+            fp = BufferReader(data)
+        elif isinstance(fp, (BufferReader, MappedReader)):
+            pass
+        elif limits is None or isinstance(fp, BytesIO):
+            fp = BufferReader(fp.read())
+        elif dictionary is not None:
+            fp = StreamReader(fp)
+        if dictionary is not None:
+            fp.dictionary = dictionary
+        start = 0
+        elements = []
+        if limits is not None:
+            fp = LimitedReader(fp, limits)
         root = []
         records = root
         parents = []
         last_el = None
+        debug = log.isEnabledFor(logging.DEBUG)
         type = True
         while type:
+            if raw:
+                start = fp.tell()
             type = fp.read(1)
             if type:
                 type = struct.unpack(b'<B', type)[0]
                 if type in Record.records:
-                    log.debug('%s found' % Record.records[type].__name__)
+                    if debug:
+                        log.debug('%s found', Record.records[type].__name__)
                     obj = Record.records[type].parse(fp)
+                    if limits is not None:
+                        fp.add_records()
+                        fp.add_output(_expanded_size(obj, dictionary))
                     if isinstance(obj, EndElementRecord):
                         if len(parents) > 0:
                             records = parents.pop()
+                            if raw:
+                                _keep_raw(elements.pop(), data, fp.tell())
+                            else:
+                                _compact(elements.pop()[0])
                         #records.append(obj)
+                    elif raw and isinstance(obj, Element):
+                        last_el = obj
+                        list.append(records, obj)
+                        parents.append(records)
+                        if limits is not None:
+                            fp.check_depth(len(parents))
+                        obj.childs = TrackedList(obj)
+                        obj.attributes = TrackedList(obj, obj.attributes)
+                        obj._parent = elements[-1][0] if elements else None
+                        elements.append((obj, start))
+                        records = obj.childs
                     elif isinstance(obj, Element):
                         last_el = obj
                         records.append(obj)
                         parents.append(records)
+                        if limits is not None:
+                            fp.check_depth(len(parents))
                         obj.childs = []
+                        elements.append((obj, start))
                         records = obj.childs
                     elif isinstance(obj, Attribute) and last_el:
-                        last_el.attributes.append(obj)
+                        if raw:
+                            list.append(last_el.attributes, obj)
+                            obj._parent = last_el
+                            _keep_raw((obj, start), data, fp.tell())
+                        else:
+                            last_el.attributes.append(obj)
+                    elif raw and not obj.stateless:
+                        list.append(records, obj)
+                        obj._parent = elements[-1][0] if elements else None
+                        _keep_raw((obj, start), data, fp.tell())
+                    elif raw:
+                        list.append(records, obj)
                     else:
                         records.append(obj)
-                    log.debug('Value: %s' % str(obj))
+                    if debug:
+                        log.debug('Value: %s', obj)
                 elif type-1 in Record.records:
-                    log.debug('%s with end element found (0x%x)' %
-                            (Record.records[type-1].__name__, type))
-                    records.append(Record.records[type-1].parse(fp))
+                    if debug:
+                        log.debug('%s with end element found (0x%x)',
+                                  Record.records[type-1].__name__, type)
+                    obj = Record.records[type-1].parse(fp)
+                    if raw and not obj.stateless:
+                        list.append(records, obj)
+                        obj._parent = elements[-1][0] if elements else None
+                        _keep_raw((obj, start), data, fp.tell())
+                    elif raw:
+                        list.append(records, obj)
+                    else:
+                        records.append(obj)
+                    if limits is not None:
+                        fp.add_records()
+                        fp.add_output(_expanded_size(obj, dictionary))
                     #records.append(EndElementRecord())
                     last_el = None
                     if len(parents) > 0:
                         records = parents.pop()
+                        if raw:
+                            _keep_raw(elements.pop(), data, fp.tell())
+                        else:
+                            _compact(elements.pop()[0])
                 else:
                     log.warn('type 0x%x not found' % type)
 
         return root
 
 
+_set_raw = Record._raw.__set__
+_set_parent = Record._parent.__set__
+_tracking_classes = {}
+
+
+class _Tracking(object):
+    # mixin of the records parsed with raw=True, see _track: only these
+    # pay for the dirty tracking on every assignment
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name[0] != '_':
+            self.touch()
+
+    def __reduce_ex__(self, protocol):
+        return _new_tracked, (self._untracked,), self.__getstate__()
+
+
+def _tracking_class(cls):
+    tracking = _tracking_classes.get(cls)
+    if tracking is None:
+        tracking = type(cls.__name__, (_Tracking, cls),
+                        dict(__slots__=(), __module__=cls.__module__,
+                             _untracked=cls))
+        tracking = _tracking_classes.setdefault(cls, tracking)
+        _tracking_classes.setdefault(tracking, tracking)
+    return tracking
+
+
+def _track(record):
+    # switches a parsed record to the tracking subclass of its class
+    object.__setattr__(record, '__class__', _tracking_class(type(record)))
+
+
+def _new_tracked(cls):
+    return Record.__new__(_tracking_class(cls))
+
+
+def _slot_descriptors(cls):
+    # (name, descriptor) of all slots of cls, also of those shadowed by
+    # class attributes like type
+    slots = _slots.get(cls)
+    if slots is None:
+        slots = _slots[cls] = [
+            (name, klass.__dict__[name]) for klass in cls.__mro__
+            for name in klass.__dict__.get('__slots__', ())]
+    return slots
+
+
+def _expanded_size(record, dictionary):
+    # length of the dictionary strings a record refers to, for the
+    # max_total_bytes limit
+    size = 0
+    records = [record]
+    if isinstance(record, Attribute):
+        records.append(getattr(record, 'value', None))
+    for r in records:
+        index = getattr(r, 'index', None)
+        if isinstance(index, int):
+            try:
+                size += len(lookup(index, dictionary))
+            except KeyError:
+                pass
+    return size
+
+
+def _compact(element):
+    # decoded elements share the empty tuple instead of empty lists
+    if not element.childs:
+        element.childs = ()
+    if not element.attributes:
+        element.attributes = ()
+
+
+def _keep_raw(record, data, end):
+    obj, start = record
+    if isinstance(obj, ArrayRecord):
+        obj.data = TrackedList(obj, obj.data)
+        obj.attributes = TrackedList(obj, obj.attributes)
+        for child in [obj.element] + obj.data + obj.attributes:
+            _track(child)
+            child._parent = obj
+    elif (isinstance(getattr(obj, 'value', None), Record) and
+          not obj.value.stateless):
+        _track(obj.value)
+        obj.value._parent = obj
+    _track(obj)
+    obj._raw = (data, start, end)
+
+
+class TrackedList(list):
+    """list of childs or attributes which marks its owner as modified on
+    any change"""
+
+    def __init__(self, owner, *args):
+        super(TrackedList, self).__init__(*args)
+        self.owner = owner
+
+    def __reduce_ex__(self, protocol):
+        return list, (list(self),)
+
+
+def _touching(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        self.owner.touch()
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+for _name in ('__setitem__', '__delitem__', '__iadd__', '__imul__',
+              '__setslice__', '__delslice__', 'append', 'extend', 'insert',
+              'pop', 'remove', 'sort', 'reverse', 'clear'):
+    if hasattr(list, _name):
+        setattr(TrackedList, _name, _touching(_name))
+del _name
+
+
 class Element(Record):
-    pass
+    __slots__ = ()
 
 
 class Attribute(Record):
-    pass
+    __slots__ = ()
 
 
 class Text(Record):
-    pass
+    __slots__ = ()
 
 
 class EndElementRecord(Element):
     type = 0x01
+    __slots__ = ()
+    stateless = True
 
 
 class CommentRecord(Record):
     type = 0x02
+    __slots__ = ('comment',)
 
     def __init__(self, comment, *args, **kwargs):
         self.comment = comment
@@ -185,6 +566,7 @@ class CommentRecord(Record):
 
 class ArrayRecord(Record):
     type = 0x03
+    __slots__ = ('element', 'count', 'data', 'recordtype', 'attributes')
 
     datatypes = {
         0xB5: ('BoolTextWithEndElement', 1, '?'),
@@ -210,7 +592,7 @@ class ArrayRecord(Record):
             else:
                 assert recordtype == data.type + 1
         self.recordtype = recordtype
-        self.attributes = []
+        self.attributes = attributes
 
     def to_bytes(self):
         """
@@ -254,12 +636,21 @@ class ArrayRecord(Record):
                 attributes.append(obj)
             else:
                 raise ValueError('unknown type: %s' % hex(type))
+        _compact(element)
         recordtype = struct.unpack(b'<B', fp.read(1))[0]
         count = MultiByteInt31.parse(fp).value
+        if isinstance(fp, LimitedReader):
+            fp.check_array(count)
+            # every item is written with the tags of the element
+            try:
+                tags = len(str(element)) + len(element.name) + 3
+            except KeyError:
+                tags = 0
+            fp.add_output(count * tags)
         data = []
         for i in range(count):
             data.append(Record.records[recordtype-1].parse(fp))
-        return cls(element, data, attributes)
+        return cls(element, data, attributes or ())
 
     def __str__(self):
         """
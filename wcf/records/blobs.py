@@ -0,0 +1,228 @@
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+#  Copyright (c) 2011, Timo Schmid <tschmid@ernw.de>
+#  All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#  * Neither the name of the ERMW GmbH nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Sinks for large Bytes record payloads.
+
+Passed as ``blob_sink`` to :meth:`wcf.records.Record.parse`, a sink takes
+every Bytes8/16/32 payload of at least ``threshold`` bytes while it is
+read from the stream, so the payload is never held in memory as a whole.
+The record gets a :class:`Blob` as value instead of the bytes.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import abc
+import mmap
+import os
+import tempfile
+
+__all__ = ['Blob', 'FileBlob', 'BlobSink', 'TempFileSink', 'CallbackSink']
+
+
+class Blob(object):
+    """
+    payload of a Bytes record which was passed to a callback while
+    decoding; only its length is known
+    """
+
+    def __init__(self, length):
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __repr__(self):
+        return '<%s(length=%d)>' % (type(self).__name__, self.length)
+
+    def mmap(self):
+        raise ValueError('the payload was passed to a callback while '
+                         'decoding and is no longer available')
+
+    def chunks(self, size):
+        raise ValueError('the payload was passed to a callback while '
+                         'decoding and is no longer available')
+
+
+class FileBlob(Blob):
+    """
+    payload of a Bytes record stored in a file. Records with a FileBlob are
+    encoded by :func:`wcf.records.write_records` without reading the file
+    into memory.
+
+    :param file: binary file object holding the payload at offset
+    """
+
+    def __init__(self, file, length, offset=0):
+        super(FileBlob, self).__init__(length)
+        self.file = file
+        self.offset = offset
+        self._map = None
+
+    @classmethod
+    def open(cls, file, length=None, offset=None):
+        """
+        creates a FileBlob for the file object or path file
+
+        :param length: length of the payload, by default up to the end of
+                       the file
+        :param offset: start of the payload, by default the current
+                       position of a file object or 0 for a path
+        """
+        if not hasattr(file, 'read'):
+            file = open(file, 'rb')
+        if offset is None:
+            offset = file.tell() if hasattr(file, 'tell') else 0
+        if length is None:
+            length = os.fstat(file.fileno()).st_size - offset
+        return cls(file, length, offset)
+
+    def mmap(self):
+        """
+        returns a read only mmap of the payload. It supports the buffer
+        protocol, so it can be used like bytes without reading the file.
+        """
+        if self.length == 0:
+            return b''
+        if self._map is None:
+            # mmap offsets have to be aligned
+            start = self.offset - self.offset % mmap.ALLOCATIONGRANULARITY
+            self._map = mmap.mmap(self.file.fileno(),
+                                  self.offset - start + self.length,
+                                  access=mmap.ACCESS_READ, offset=start)
+            self._start = self.offset - start
+        return memoryview(self._map)[self._start:self._start + self.length]
+
+    def chunks(self, size):
+        """yields the payload in chunks of at most size bytes"""
+        self.file.seek(self.offset)
+        remaining = self.length
+        while remaining > 0:
+            chunk = self.file.read(min(size, remaining))
+            if not chunk:
+                raise EOFError('payload file is truncated')
+            remaining -= len(chunk)
+            yield chunk
+
+    def close(self):
+        """closes the mmap and the file"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self.file.close()
+
+
+class BlobSink(abc.ABC):
+    """
+    base class of the sinks, subclasses implement :meth:`consume`
+
+    :param threshold: payloads of at least this size are passed to the sink
+    :param chunk_size: size of the reads from the stream
+    """
+
+    def __init__(self, threshold=1024 * 1024, chunk_size=64 * 1024):
+        self.threshold = threshold
+        self.chunk_size = chunk_size
+
+    def _chunks(self, fp, length):
+        remaining = length
+        while remaining > 0:
+            chunk = fp.read(min(self.chunk_size, remaining))
+            if not chunk:
+                raise EOFError('stream ended inside a Bytes record')
+            remaining -= len(chunk)
+            yield chunk
+
+    @abc.abstractmethod
+    def consume(self, fp, length):
+        """
+        reads a payload of length bytes from fp
+
+        :returns: the value of the Bytes record
+        """
+
+
+class TempFileSink(BlobSink):
+    """
+    writes the payloads into temporary files, the records get a
+    :class:`FileBlob`. The files are removed once they are closed.
+
+    >>> from io import BytesIO
+    >>> from wcf.records import *
+    >>> data = b'@\\x04Data\\x9f\\x06secret'
+    >>> r = Record.parse(BytesIO(data), blob_sink=TempFileSink(threshold=4))
+    >>> blob = r[0].childs[0].value
+    >>> blob
+    <FileBlob(length=6)>
+    >>> bytes(blob.mmap())
+    b'secret'
+    >>> dump_records(r) == data
+    True
+    """
+
+    def __init__(self, threshold=1024 * 1024, chunk_size=64 * 1024,
+                 dir=None):
+        super(TempFileSink, self).__init__(threshold, chunk_size)
+        self.dir = dir
+
+    def consume(self, fp, length):
+        file = tempfile.TemporaryFile(dir=self.dir)
+        for chunk in self._chunks(fp, length):
+            file.write(chunk)
+        file.flush()
+        return FileBlob(file, length)
+
+
+class CallbackSink(BlobSink):
+    """
+    passes the payloads in chunks to callback(chunk, offset, length), with
+    the offset of the chunk in the payload and the length of the payload.
+    The records get a :class:`Blob` and can't be encoded again.
+
+    >>> from io import BytesIO
+    >>> from wcf.records import *
+    >>> chunks = []
+    >>> sink = CallbackSink(lambda *args: chunks.append(args), threshold=4,
+    ...                     chunk_size=4)
+    >>> r = Record.parse(BytesIO(b'@\\x04Data\\x9f\\x06secret'),
+    ...                  blob_sink=sink)
+    >>> r[0].childs[0].value
+    <Blob(length=6)>
+    >>> chunks
+    [(b'secr', 0, 6), (b'et', 4, 6)]
+    """
+
+    def __init__(self, callback, threshold=1024 * 1024, chunk_size=64 * 1024):
+        super(CallbackSink, self).__init__(threshold, chunk_size)
+        self.callback = callback
+
+    def consume(self, fp, length):
+        offset = 0
+        for chunk in self._chunks(fp, length):
+            self.callback(chunk, offset, length)
+            offset += len(chunk)
+        return Blob(length)
@@ -41,7 +41,6 @@ import struct
 import logging
 
 log = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 from wcf.datatypes import *
 from wcf.records.base import *
@@ -50,6 +49,7 @@ from wcf.dictionary import *
 
 class ShortElementRecord(Element):
     type = 0x40
+    __slots__ = ('childs', 'name', 'attributes')
 
     def __init__(self, name, *args, **kwargs):
         self.childs = []
@@ -92,6 +92,7 @@ class ShortElementRecord(Element):
 
 class ElementRecord(ShortElementRecord):
     type = 0x41
+    __slots__ = ('prefix',)
 
     def __init__(self, prefix, name, *args, **kwargs):
         super(ElementRecord, self).__init__(name)
@@ -129,12 +130,17 @@ class ElementRecord(ShortElementRecord):
 
 class ShortDictionaryElementRecord(Element):
     type = 0x42
+    __slots__ = ('childs', 'index', 'attributes', '_dictionary')
 
-    def __init__(self, index, *args, **kwargs):
+    def __init__(self, index, dictionary=None, *args, **kwargs):
         self.childs = []
         self.index = index
         self.attributes = []
-        self.name = dictionary[self.index]
+        self._dictionary = dictionary
+
+    @property
+    def name(self):
+        return lookup(self.index, self._dictionary)
 
     def __str__(self):
         attribs = ' '.join([str(a) for a in self.attributes])
@@ -166,18 +172,23 @@ class ShortDictionaryElementRecord(Element):
         '<Envelope>'
         """
         index = MultiByteInt31.parse(fp).value
-        return cls(index)
+        return cls(index, getattr(fp, 'dictionary', None))
 
 
 class DictionaryElementRecord(Element):
     type = 0x43
+    __slots__ = ('childs', 'prefix', 'index', 'attributes', '_dictionary')
 
-    def __init__(self, prefix, index, *args, **kwargs):
+    def __init__(self, prefix, index, dictionary=None, *args, **kwargs):
         self.childs = []
         self.prefix = prefix
         self.index = index
         self.attributes = []
-        self.name = dictionary[self.index]
+        self._dictionary = dictionary
+
+    @property
+    def name(self):
+        return lookup(self.index, self._dictionary)
 
     def __str__(self):
         """
@@ -216,12 +227,18 @@ class DictionaryElementRecord(Element):
         """
         prefix = Utf8String.parse(fp).value
         index = MultiByteInt31.parse(fp).value
-        return cls(prefix, index)
+        return cls(prefix, index, getattr(fp, 'dictionary', None))
 
 
 class PrefixElementRecord(ElementRecord):
+    __slots__ = ()
+
     def __init__(self, name):
-        super(PrefixElementRecord, self).__init__(self.char, name)
+        ShortElementRecord.__init__(self, name)
+
+    @property
+    def prefix(self):
+        return self.char
 
     def to_bytes(self):
         r"""
@@ -251,8 +268,17 @@ class PrefixElementRecord(ElementRecord):
 
 
 class PrefixDictionaryElementRecord(DictionaryElementRecord):
-    def __init__(self, index):
-        super(PrefixDictionaryElementRecord, self).__init__(self.char, index)
+    __slots__ = ()
+
+    def __init__(self, index, dictionary=None):
+        self.childs = []
+        self.index = index
+        self.attributes = []
+        self._dictionary = dictionary
+
+    @property
+    def prefix(self):
+        return self.char
 
     def to_bytes(self):
         r"""
@@ -277,7 +303,7 @@ class PrefixDictionaryElementRecord(DictionaryElementRecord):
         '<s:Envelope>'
         """
         index = MultiByteInt31.parse(fp).value
-        return cls(index)
+        return cls(index, getattr(fp, 'dictionary', None))
 
 
 Record.add_records((
@@ -301,6 +327,7 @@ for c in range(0x44, 0x5D + 1):
            dict(
                 type=c,
                 char=char,
+                __slots__=(),
             )
            )
     setattr(__module__, clsname, cls)
@@ -317,6 +344,7 @@ for c in range(0x5E, 0x77 + 1):
            dict(
                 type=c,
                 char=char,
+                __slots__=(),
             )
            )
     setattr(__module__, clsname, cls)
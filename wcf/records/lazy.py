@@ -0,0 +1,190 @@
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+#  Copyright (c) 2011, Timo Schmid <tschmid@ernw.de>
+#  All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#  * Neither the name of the ERMW GmbH nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Lazy decoding: elements are created with the byte span of their content
+and their childs are decoded on first access.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import threading
+from io import BytesIO
+
+from wcf.datatypes import reader_for
+from wcf.records.base import Record
+from wcf.records.scanner import (KINDS, ELEMENT, END_ELEMENT, ATTRIBUTE,
+                                 TEXT_END, ScanError, skip_element_header,
+                                 skip_record)
+
+__all__ = ['LazyChilds', 'span_index', 'parse_lazy']
+
+def span_index(data, start=0, end=None):
+    """
+    scans data once and maps the start offset of every element to the
+    offset after its closing record
+
+    >>> span_index(b'@\\x01a@\\x01b\\x99\\x01x\\x01') == {0: 10, 3: 9}
+    True
+    """
+    if end is None:
+        end = len(data)
+    index = {}
+    starts = []
+    pos = start
+    while pos < end:
+        kind = KINDS[data[pos]]
+        if kind == ELEMENT:
+            starts.append(pos)
+            pos = skip_element_header(data, pos)
+            continue
+        pos = skip_record(data, pos)
+        if kind == END_ELEMENT or kind == TEXT_END:
+            if starts:
+                index[starts.pop()] = pos
+    if starts:
+        raise ScanError('element not closed', starts[-1])
+    return index
+
+
+def parse_lazy(data, start, end, index, dictionary=None):
+    """
+    decodes the records between start and end. Elements aren't descended
+    into, their childs are decoded on first access.
+
+    :param data: the source buffer
+    :param index: span index of data (see :func:`span_index`)
+    :param dictionary: the dictionary or session resolving the ids
+    :returns: list of records
+    """
+    fp = reader_for(data)
+    fp.dictionary = dictionary
+    fp.seek(start)
+    records = []
+    pos = start
+    while pos < end:
+        type = data[pos]
+        kind = KINDS[type]
+        fp.seek(pos + 1)
+        if kind == ELEMENT:
+            stop = index[pos]
+            obj = Record.records[type].parse(fp)
+            pos = fp.tell()
+            while pos < end and KINDS[data[pos]] == ATTRIBUTE:
+                fp.seek(pos + 1)
+                obj.attributes.append(Record.records[data[pos]].parse(fp))
+                pos = fp.tell()
+            if not obj.attributes:
+                obj.attributes = ()
+            obj.childs = LazyChilds(data, pos, stop, index, dictionary)
+            records.append(obj)
+            pos = stop
+        elif kind == END_ELEMENT:
+            pos += 1
+        elif kind == TEXT_END:
+            records.append(Record.records[type - 1].parse(fp))
+            pos = fp.tell()
+        else:
+            records.append(Record.records[type].parse(fp))
+            pos = fp.tell()
+    return records
+
+
+class LazyChilds(list):
+    """
+    list of child records which is decoded on first access
+
+    >>> from wcf.records import print_records, dump_records
+    >>> data = b'@\\x01a@\\x01b\\x99\\x01x@\\x01c\\x01\\x01'
+    >>> r = Record.parse(BytesIO(data), lazy=True)
+    >>> r[0].childs.loaded
+    False
+    >>> r[0].childs.span
+    (3, 14)
+    >>> len(r[0].childs)
+    2
+    >>> r[0].childs[1].childs.loaded
+    False
+    >>> _ = print_records(r)
+    <a>
+     <b>x</b>
+     <c></c>
+    </a>
+    >>> dump_records(r) == data
+    True
+    """
+
+    def __init__(self, data, start, end, index, dictionary=None):
+        super(LazyChilds, self).__init__()
+        self.span = (start, end)
+        self._source = (data, index, dictionary)
+        # serializes the first access by several threads
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._source is None
+
+    def load(self):
+        """
+        decodes the childs if this didn't happen yet. A tree can be read
+        by several threads, the childs are only decoded once.
+        """
+        if self._source is None:
+            return
+        with self._lock:
+            if self._source is not None:
+                data, index, dictionary = self._source
+                list.extend(self, parse_lazy(data, self.span[0],
+                                             self.span[1], index,
+                                             dictionary))
+                self._source = None
+
+    def __reduce_ex__(self, protocol):
+        return list, (list(self),)
+
+
+def _loading(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        self.load()
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+for _name in ('__len__', '__iter__', '__reversed__', '__contains__',
+              '__getitem__', '__setitem__', '__delitem__', '__eq__',
+              '__ne__', '__lt__', '__le__', '__gt__', '__ge__', '__add__',
+              '__iadd__', '__mul__', '__imul__', '__repr__', 'append',
+              'extend', 'insert', 'pop', 'remove', 'index', 'count', 'sort',
+              'reverse', 'clear', 'copy'):
+    if hasattr(list, _name):
+        setattr(LazyChilds, _name, _loading(_name))
+del _name
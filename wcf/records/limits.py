@@ -0,0 +1,176 @@
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+#  Copyright (c) 2011, Timo Schmid <tschmid@ernw.de>
+#  All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#  * Neither the name of the ERMW GmbH nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from __future__ import absolute_import, unicode_literals
+
+from wcf.datatypes import NameTable
+
+__all__ = ['DecodeLimits', 'DecodeLimitError']
+
+
+class DecodeLimitError(ValueError):
+    """raised if a decoded message exceeds one of its DecodeLimits"""
+
+    def __init__(self, limit, value, maximum):
+        super(DecodeLimitError, self).__init__(
+            '%s exceeded: %d > %d' % (limit, value, maximum))
+        self.limit = limit
+        self.value = value
+        self.maximum = maximum
+
+
+class DecodeLimits(object):
+    """
+    resource limits for :meth:`wcf.records.Record.parse`. None disables
+    the corresponding check.
+
+    :param max_depth: maximal element nesting
+    :param max_records: maximal number of records (array items included)
+    :param max_string_bytes: maximal length of a single string or blob
+    :param max_array_count: maximal item count of an ArrayRecord
+    :param max_total_bytes: maximal decoded size of one message: the
+                            bytes read plus the strings the dictionary
+                            ids stand for, the items of an ArrayRecord
+                            count with the tags of their element
+
+    >>> from io import BytesIO
+    >>> from wcf.records import Record
+    >>> limits = DecodeLimits(max_depth=1)
+    >>> Record.parse(BytesIO(b'@\\x01a@\\x01b\\x01\\x01'), limits=limits)
+    Traceback (most recent call last):
+    ...
+    wcf.records.limits.DecodeLimitError: max_depth exceeded: 2 > 1
+    >>> limits = DecodeLimits(max_string_bytes=16)
+    >>> Record.parse(BytesIO(b'@\\x01a\\x99\\x11' + b'x' * 17), limits=limits)
+    Traceback (most recent call last):
+    ...
+    wcf.records.limits.DecodeLimitError: max_string_bytes exceeded: 17 > 16
+
+    Dictionary ids expand to their strings, the decoded size of a
+    message can be much larger than the message:
+
+    >>> limits = DecodeLimits(max_total_bytes=64)
+    >>> Record.parse(BytesIO(b'B\\x02' * 20), limits=limits)
+    Traceback (most recent call last):
+    ...
+    wcf.records.limits.DecodeLimitError: max_total_bytes exceeded: 70 > 64
+    """
+
+    def __init__(self, max_depth=256, max_records=1000000,
+                 max_string_bytes=16 * 1024 * 1024, max_array_count=1000000,
+                 max_total_bytes=64 * 1024 * 1024):
+        self.max_depth = max_depth
+        self.max_records = max_records
+        self.max_string_bytes = max_string_bytes
+        self.max_array_count = max_array_count
+        self.max_total_bytes = max_total_bytes
+
+
+class LimitedReader(object):
+    """
+    file like wrapper enforcing DecodeLimits on the reads of a decoder.
+
+    Every read is checked before any data is read. Fixed size fields are
+    at most 16 bytes long, so reads up to that size always pass the
+    max_string_bytes check.
+    """
+
+    def __init__(self, fp, limits):
+        self.fp = fp
+        self.limits = limits
+        self.names = getattr(fp, 'names', None)
+        if self.names is None:
+            self.names = NameTable()
+        self.total = 0
+        self.records = 0
+        self._max_string = (max(limits.max_string_bytes, 16)
+                            if limits.max_string_bytes is not None else -1)
+        self._max_total = (limits.max_total_bytes
+                           if limits.max_total_bytes is not None else -1)
+        self._max_records = (limits.max_records
+                             if limits.max_records is not None else -1)
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            data = self.fp.read()
+            self._count(len(data))
+            return data
+        self.check_string(n)
+        self._count(n)
+        return self.fp.read(n)
+
+    def read_view(self, n):
+        self.check_string(n)
+        self._count(n)
+        read = getattr(self.fp, 'read_view', None)
+        if read is None:
+            return self.fp.read(n)
+        return read(n)
+
+    def tell(self):
+        return self.fp.tell()
+
+    @property
+    def blob_sink(self):
+        return getattr(self.fp, 'blob_sink', None)
+
+    @property
+    def dictionary(self):
+        return getattr(self.fp, 'dictionary', None)
+
+    def check_string(self, n):
+        if 0 <= self._max_string < n:
+            raise DecodeLimitError('max_string_bytes', n, self._max_string)
+
+    def add_output(self, n):
+        """counts n decoded bytes which weren't read, see
+        DecodeLimits.max_total_bytes"""
+        self._count(n)
+
+    def _count(self, n):
+        self.total += n
+        if 0 <= self._max_total < self.total:
+            raise DecodeLimitError('max_total_bytes', self.total,
+                                   self._max_total)
+
+    def add_records(self, count=1):
+        self.records += count
+        if 0 <= self._max_records < self.records:
+            raise DecodeLimitError('max_records', self.records,
+                                   self._max_records)
+
+    def check_depth(self, depth):
+        maximum = self.limits.max_depth
+        if maximum is not None and depth > maximum:
+            raise DecodeLimitError('max_depth', depth, maximum)
+
+    def check_array(self, count):
+        maximum = self.limits.max_array_count
+        if maximum is not None and count > maximum:
+            raise DecodeLimitError('max_array_count', count, maximum)
+        self.add_records(count)
@@ -0,0 +1,389 @@
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+#  Copyright (c) 2011, Timo Schmid <tschmid@ernw.de>
+#  All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#  * Neither the name of the ERMW GmbH nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Helpers to walk a binary xml buffer without creating record objects.
+
+All functions work on a bytes like object (bytes, bytearray, mmap,
+memoryview) and a position pointing at the type byte of a record. Lengths
+are computed from the wire format (string lengths, Chars/Bytes lengths,
+ArrayRecord counts times the item width), payloads are never decoded.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import struct
+
+from wcf.records.base import ArrayRecord
+
+__all__ = ['ScanError', 'UNKNOWN', 'ELEMENT', 'END_ELEMENT', 'ATTRIBUTE',
+           'TEXT', 'TEXT_END', 'COMMENT', 'ARRAY', 'KINDS',
+           'read_mbi31', 'text_payload', 'skip_record', 'skip_element',
+           'skip_element_header', 'element_name', 'attribute_name']
+
+
+class ScanError(ValueError):
+    """raised if the buffer doesn't contain a valid record"""
+
+    def __init__(self, msg, offset):
+        super(ScanError, self).__init__('%s at offset %d' % (msg, offset))
+        self.msg = msg
+        self.offset = offset
+
+
+UNKNOWN = 0
+ELEMENT = 1
+END_ELEMENT = 2
+ATTRIBUTE = 3
+TEXT = 4
+TEXT_END = 5
+COMMENT = 6
+ARRAY = 7
+
+# record kind by type byte
+KINDS = [UNKNOWN] * 256
+KINDS[0x01] = END_ELEMENT
+KINDS[0x02] = COMMENT
+KINDS[0x03] = ARRAY
+for _t in range(0x04, 0x3F + 1):
+    KINDS[_t] = ATTRIBUTE
+for _t in range(0x40, 0x77 + 1):
+    KINDS[_t] = ELEMENT
+
+# payload width of fixed size text records
+TEXT_WIDTHS = {
+    0x80: 0,   # ZeroText
+    0x82: 0,   # OneText
+    0x84: 0,   # FalseText
+    0x86: 0,   # TrueText
+    0x88: 1,   # Int8Text
+    0x8A: 2,   # Int16Text
+    0x8C: 4,   # Int32Text
+    0x8E: 8,   # Int64Text
+    0x90: 4,   # FloatText
+    0x92: 8,   # DoubleText
+    0x94: 16,  # DecimalText
+    0x96: 8,   # DateTimeText
+    0xA4: 0,   # StartListText
+    0xA6: 0,   # EndListText
+    0xA8: 0,   # EmptyText
+    0xAC: 16,  # UniqueIdText
+    0xAE: 8,   # TimeSpanText
+    0xB0: 16,  # UuidText
+    0xB2: 8,   # UInt64Text
+    0xB4: 1,   # BoolText
+    0xBC: 4,   # QNameDictionaryText
+}
+
+# size of the length prefix of variable sized text records
+TEXT_LENGTHS = {
+    0x98: struct.Struct(b'<B'),  # Chars8Text
+    0x9A: struct.Struct(b'<H'),  # Chars16Text
+    0x9C: struct.Struct(b'<I'),  # Chars32Text
+    0x9E: struct.Struct(b'<B'),  # Bytes8Text
+    0xA0: struct.Struct(b'<H'),  # Bytes16Text
+    0xA2: struct.Struct(b'<I'),  # Bytes32Text
+    0xB6: struct.Struct(b'<B'),  # UnicodeChars8Text
+    0xB8: struct.Struct(b'<H'),  # UnicodeChars16Text
+    0xBA: struct.Struct(b'<I'),  # UnicodeChars32Text
+}
+
+DICTIONARY_TEXT = 0xAA
+
+for _t in list(TEXT_WIDTHS) + list(TEXT_LENGTHS) + [DICTIONARY_TEXT]:
+    KINDS[_t] = TEXT
+    KINDS[_t + 1] = TEXT_END
+
+# header fields following the type byte: S = string, I = MultiByteInt31
+ELEMENT_LAYOUTS = {0x40: 'S', 0x41: 'SS', 0x42: 'I', 0x43: 'SI'}
+for _t in range(0x44, 0x5D + 1):
+    ELEMENT_LAYOUTS[_t] = 'I'
+for _t in range(0x5E, 0x77 + 1):
+    ELEMENT_LAYOUTS[_t] = 'S'
+
+# as above, T = trailing text record holding the value
+ATTRIBUTE_LAYOUTS = {
+    0x04: 'ST',
+    0x05: 'SST',
+    0x06: 'IT',
+    0x07: 'SIT',
+    0x08: 'S',
+    0x09: 'SS',
+    0x0A: 'I',
+    0x0B: 'SI',
+}
+for _t in range(0x0C, 0x25 + 1):
+    ATTRIBUTE_LAYOUTS[_t] = 'IT'
+for _t in range(0x26, 0x3F + 1):
+    ATTRIBUTE_LAYOUTS[_t] = 'ST'
+
+# prefix letter of the Prefix* element records
+ELEMENT_PREFIXES = {}
+for _t in range(0x44, 0x5D + 1):
+    ELEMENT_PREFIXES[_t] = bytes(bytearray([_t - 0x44 + ord('a')]))
+for _t in range(0x5E, 0x77 + 1):
+    ELEMENT_PREFIXES[_t] = bytes(bytearray([_t - 0x5E + ord('a')]))
+
+# prefix letter of the Prefix* attribute records
+ATTRIBUTE_PREFIXES = {}
+for _t in range(0x0C, 0x25 + 1):
+    ATTRIBUTE_PREFIXES[_t] = bytes(bytearray([_t - 0x0C + ord('a')]))
+for _t in range(0x26, 0x3F + 1):
+    ATTRIBUTE_PREFIXES[_t] = bytes(bytearray([_t - 0x26 + ord('a')]))
+
+# item width of the ArrayRecord item types
+ARRAY_WIDTHS = dict((t, v[1]) for t, v in ArrayRecord.datatypes.items())
+
+del _t
+
+
+def read_mbi31(buf, pos):
+    """
+    reads a MultiByteInt31
+
+    :returns: (value, position after the integer)
+
+    >>> read_mbi31(b'\\xb9\\x0a', 0)
+    (1337, 2)
+    >>> read_mbi31(b'\\x80\\x80\\x80\\x80\\x01', 0)
+    (268435456, 5)
+    """
+    value = 0
+    end = len(buf)
+    for shift in (0, 7, 14, 21, 28):
+        if pos >= end:
+            raise ScanError('truncated MultiByteInt31', pos)
+        b = buf[pos]
+        pos += 1
+        value |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return value, pos
+    raise ScanError('MultiByteInt31 too long', pos - 1)
+
+
+def _skip_fields(buf, pos, layout):
+    for field in layout:
+        if field == 'S':
+            ln, pos = read_mbi31(buf, pos)
+            pos += ln
+        elif field == 'I':
+            pos = read_mbi31(buf, pos)[1]
+        else:
+            if pos >= len(buf):
+                raise ScanError('missing attribute value', pos)
+            if KINDS[buf[pos]] != TEXT:
+                raise ScanError('invalid attribute value type 0x%02X' %
+                                buf[pos], pos)
+            pos = text_payload(buf, pos)[1]
+    if pos > len(buf):
+        raise ScanError('record exceeds buffer', pos)
+    return pos
+
+
+def text_payload(buf, pos):
+    """
+    returns the span of the payload of the text record at pos
+
+    :returns: (start, end) of the payload, end is the end of the record
+
+    >>> text_payload(b'\\x99\\x04test', 0)
+    (2, 6)
+    >>> text_payload(b'\\x8c\\x01\\x00\\x00\\x00', 0)
+    (1, 5)
+    """
+    type = buf[pos] & 0xFE
+    start = pos + 1
+    width = TEXT_WIDTHS.get(type)
+    if width is not None:
+        end = start + width
+    elif type in TEXT_LENGTHS:
+        length = TEXT_LENGTHS[type]
+        if start + length.size > len(buf):
+            raise ScanError('truncated length', start)
+        ln = length.unpack_from(buf, start)[0]
+        start += length.size
+        end = start + ln
+    elif type == DICTIONARY_TEXT:
+        end = read_mbi31(buf, start)[1]
+    else:
+        raise ScanError('unknown text record type 0x%02X' % buf[pos], pos)
+    if end > len(buf):
+        raise ScanError('text record exceeds buffer', pos)
+    return start, end
+
+
+def skip_element_header(buf, pos):
+    """
+    skips the element record at pos and its attributes
+
+    :returns: position of the first child record
+    """
+    pos = _skip_fields(buf, pos + 1, ELEMENT_LAYOUTS[buf[pos]])
+    end = len(buf)
+    while pos < end and KINDS[buf[pos]] == ATTRIBUTE:
+        pos = _skip_fields(buf, pos + 1, ATTRIBUTE_LAYOUTS[buf[pos]])
+    return pos
+
+
+def _skip_array(buf, pos):
+    start = pos
+    pos += 1
+    if pos >= len(buf) or KINDS[buf[pos]] != ELEMENT:
+        raise ScanError('ArrayRecord without element', pos)
+    pos = skip_element_header(buf, pos)
+    if pos + 1 >= len(buf) or buf[pos] != 0x01:
+        raise ScanError('ArrayRecord element not closed', pos)
+    width = ARRAY_WIDTHS.get(buf[pos + 1])
+    if width is None:
+        raise ScanError('invalid ArrayRecord type 0x%02X' % buf[pos + 1],
+                        pos + 1)
+    count, pos = read_mbi31(buf, pos + 2)
+    pos += count * width
+    if pos > len(buf):
+        raise ScanError('ArrayRecord exceeds buffer', start)
+    return pos
+
+
+def skip_record(buf, pos):
+    """
+    skips a single record. Elements are skipped without their childs,
+    attributes with their value and arrays as a whole.
+
+    :returns: position of the next record
+
+    >>> skip_record(b'\\x40\\x04test\\x04\\x01a\\x86\\x01', 0)
+    6
+    >>> skip_record(b'\\x03\\x40\\x01a\\x01\\x8b\\x02\\x01\\x00\\x02\\x00', 0)
+    11
+    """
+    kind = KINDS[buf[pos]]
+    if kind == ELEMENT:
+        return _skip_fields(buf, pos + 1, ELEMENT_LAYOUTS[buf[pos]])
+    elif kind == TEXT or kind == TEXT_END:
+        return text_payload(buf, pos)[1]
+    elif kind == ATTRIBUTE:
+        return _skip_fields(buf, pos + 1, ATTRIBUTE_LAYOUTS[buf[pos]])
+    elif kind == END_ELEMENT:
+        return pos + 1
+    elif kind == COMMENT:
+        return _skip_fields(buf, pos + 1, 'S')
+    elif kind == ARRAY:
+        return _skip_array(buf, pos)
+    raise ScanError('unknown record type 0x%02X' % buf[pos], pos)
+
+
+def skip_element(buf, pos):
+    """
+    skips the element at pos including all of its childs
+
+    :returns: position after the closing record of the element
+
+    >>> skip_element(b'\\x40\\x01a\\x40\\x01b\\x99\\x01x\\x01\\x80', 0)
+    10
+    """
+    depth = 0
+    end = len(buf)
+    while pos < end:
+        kind = KINDS[buf[pos]]
+        pos = skip_record(buf, pos)
+        if kind == ELEMENT:
+            depth += 1
+        elif kind == END_ELEMENT or kind == TEXT_END:
+            depth -= 1
+            if depth <= 0:
+                return pos
+    raise ScanError('element not closed', pos)
+
+
+def element_name(buf, pos):
+    """
+    returns the prefix and name of the element record at pos without
+    decoding them
+
+    :returns: (prefix, name); the prefix is a bytestring (empty if the
+              element has none), the name either a bytestring or the
+              dictionary index
+
+    >>> element_name(b'\\x41\\x01s\\x04Body', 0) == (b's', b'Body')
+    True
+    >>> element_name(b'\\x56\\x02', 0) == (b's', 2)
+    True
+    """
+    type = buf[pos]
+    layout = ELEMENT_LAYOUTS[type]
+    pos += 1
+    prefix = ELEMENT_PREFIXES.get(type, b'')
+    if layout[0] == 'S' and len(layout) == 2:
+        ln, pos = read_mbi31(buf, pos)
+        prefix = bytes(buf[pos:pos + ln])
+        pos += ln
+    if layout[-1] == 'I':
+        return prefix, read_mbi31(buf, pos)[0]
+    ln, pos = read_mbi31(buf, pos)
+    if pos + ln > len(buf):
+        raise ScanError('name exceeds buffer', pos)
+    return prefix, bytes(buf[pos:pos + ln])
+
+
+def attribute_name(buf, pos):
+    """
+    returns the prefix and name of the attribute record at pos without
+    decoding them. Namespace declarations are named like in xml: xmlns
+    (without prefix) or xmlns:prefix.
+
+    :returns: (prefix, name, value position); prefix and name as in
+              :func:`element_name`, the value position points to the text
+              record holding the value or, for namespace declarations, to
+              the namespace string or dictionary index
+
+    >>> attribute_name(b'\\x04\\x02id\\x98\\x01x', 0) == (b'', b'id', 4)
+    True
+    >>> attribute_name(b'\\x09\\x01s\\x00', 0) == (b'xmlns', b's', 3)
+    True
+    >>> attribute_name(b'\\x0c\\x1c\\x98\\x01x', 0) == (b'a', 28, 2)
+    True
+    """
+    type = buf[pos]
+    layout = ATTRIBUTE_LAYOUTS[type]
+    pos += 1
+    if 0x08 <= type <= 0x0B:
+        if len(layout) == 1:
+            return b'', b'xmlns', pos
+        ln, pos = read_mbi31(buf, pos)
+        return b'xmlns', bytes(buf[pos:pos + ln]), pos + ln
+    prefix = ATTRIBUTE_PREFIXES.get(type, b'')
+    if len(layout) == 3:
+        ln, pos = read_mbi31(buf, pos)
+        prefix = bytes(buf[pos:pos + ln])
+        pos += ln
+    if layout[-2] == 'I':
+        name, pos = read_mbi31(buf, pos)
+        return prefix, name, pos
+    ln, pos = read_mbi31(buf, pos)
+    if pos + ln > len(buf):
+        raise ScanError('name exceeds buffer', pos)
+    return prefix, bytes(buf[pos:pos + ln]), pos + ln
@@ -54,59 +54,68 @@ def escape(text):
 
 
 log = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 from wcf.datatypes import *
 from wcf.records.base import *
-from wcf.dictionary import dictionary
+from wcf.records.blobs import Blob, FileBlob
+from wcf.dictionary import lookup
 
 
 class ZeroTextRecord(Text):
     type = 0x80
+    __slots__ = ()
+    stateless = True
 
     def __str__(self):
         return '0'
 
     @classmethod
     def parse(cls, fp):
-        return cls()
+        return cls.shared()
 
 
 class OneTextRecord(Text):
     type = 0x82
+    __slots__ = ()
+    stateless = True
 
     def __str__(self):
         return '1'
 
     @classmethod
     def parse(cls, fp):
-        return cls()
+        return cls.shared()
 
 
 class FalseTextRecord(Text):
     type = 0x84
+    __slots__ = ()
+    stateless = True
 
     def __str__(self):
         return 'false'
 
     @classmethod
     def parse(cls, fp):
-        return cls()
+        return cls.shared()
 
 
 class TrueTextRecord(Text):
     type = 0x86
+    __slots__ = ()
+    stateless = True
 
     def __str__(self):
         return 'true'
 
     @classmethod
     def parse(cls, fp):
-        return cls()
+        return cls.shared()
 
 
 class Int8TextRecord(Text):
     type = 0x88
+    __slots__ = ('value',)
 
     def __init__(self, value):
         self.value = value
@@ -139,6 +148,7 @@ class Int8TextRecord(Text):
 
 class Int16TextRecord(Int8TextRecord):
     type = 0x8A
+    __slots__ = ()
 
     def to_bytes(self):
         r"""
@@ -161,6 +171,7 @@ class Int16TextRecord(Int8TextRecord):
 
 class Int32TextRecord(Int8TextRecord):
     type = 0x8C
+    __slots__ = ()
 
     def to_bytes(self):
         r"""
@@ -183,6 +194,7 @@ class Int32TextRecord(Int8TextRecord):
 
 class Int64TextRecord(Int8TextRecord):
     type = 0x8E
+    __slots__ = ()
 
     def to_bytes(self):
         r"""
@@ -205,6 +217,7 @@ class Int64TextRecord(Int8TextRecord):
 
 class UInt64TextRecord(Int64TextRecord):
     type = 0xB2
+    __slots__ = ()
 
     def to_bytes(self):
         r"""
@@ -227,6 +240,7 @@ class UInt64TextRecord(Int64TextRecord):
 
 class BoolTextRecord(Text):
     type = 0xB4
+    __slots__ = ('value',)
 
     def __init__(self, value):
         self.value = value
@@ -260,14 +274,76 @@ class BoolTextRecord(Text):
         return cls(value)
 
 
-class UnicodeChars8TextRecord(Text):
+class EncodedText(Text):
+    """
+    text record which keeps the encoded payload it was decoded from and
+    decodes it on the first access of value. Unless value is assigned
+    the payload is written back as it is.
+
+    >>> from io import BytesIO
+    >>> r = Record.parse(BytesIO(b'@\\x01a\\x99\\x03abc'))[0].childs[0]
+    >>> bytes(r.data)
+    b'abc'
+    >>> r.value
+    'abc'
+    >>> r.value = 'xyz'
+    >>> r.data is None, r.to_bytes()
+    (True, b'\\x98\\x03xyz')
+    """
+    __slots__ = ('_value', '_data')
+
+    encoding = 'utf-8'
+
+    def __init__(self, value):
+        self.value = value
+
+    @property
+    def value(self):
+        value = self._value
+        if value is None:
+            value = self._value = str(self._data, self.encoding)
+        return value
+
+    @value.setter
+    def value(self, value):
+        if not isinstance(value, str):
+            value = str(value)
+        self._value = value
+        self._data = None
+
+    @property
+    def data(self):
+        """
+        the encoded payload of a decoded record (bytes or a memoryview
+        into the source buffer), None once value was assigned
+        """
+        return self._data
+
+    def encode(self):
+        """returns the encoded payload"""
+        if self._data is not None:
+            return self._data
+        return self.value.encode(self.encoding)
+
+    @classmethod
+    def from_data(cls, data):
+        """creates the record from its encoded payload"""
+        obj = cls.__new__(cls)
+        obj._value = None
+        obj._data = data
+        return obj
+
+
+class UnicodeChars8TextRecord(EncodedText):
     type = 0xB6
+    __slots__ = ()
 
-    def __init__(self, string):
-        if isinstance(string, str):
-            self.value = string
-        else:
-            self.value = str(string)
+    encoding = 'utf-16'
+
+    def encode(self):
+        if self._data is not None:
+            return self._data
+        return self.value.encode('utf-16')[2:]  # skip bom
 
     def to_bytes(self):
         """
@@ -276,7 +352,7 @@ class UnicodeChars8TextRecord(Text):
         >>> UnicodeChars8TextRecord(u'abc').to_bytes()
         b'\\xb6\\x06a\\x00b\\x00c\\x00'
         """
-        data = self.value.encode('utf-16')[2:]  # skip bom
+        data = self.encode()
         bt = struct.pack(b'<B', self.type)
         bt += struct.pack(b'<B', len(data))
         bt += data
@@ -298,12 +374,12 @@ class UnicodeChars8TextRecord(Text):
         'abc'
         """
         ln = struct.unpack(b'<B', fp.read(1))[0]
-        data = fp.read(ln)
-        return cls(data.decode('utf-16'))
+        return cls.from_data(read_view(fp, ln))
 
 
 class UnicodeChars16TextRecord(UnicodeChars8TextRecord):
     type = 0xB8
+    __slots__ = ()
 
     def to_bytes(self):
         """
@@ -312,7 +388,7 @@ class UnicodeChars16TextRecord(UnicodeChars8TextRecord):
         >>> UnicodeChars16TextRecord(u'abc').to_bytes()
         b'\\xb8\\x06\\x00a\\x00b\\x00c\\x00'
         """
-        data = self.value.encode('utf-16')[2:]  # skip bom
+        data = self.encode()
         bt = struct.pack(b'<B', self.type)
         bt += struct.pack(b'<H', len(data))
         bt += data
@@ -327,12 +403,12 @@ class UnicodeChars16TextRecord(UnicodeChars8TextRecord):
         'abc'
         """
         ln = struct.unpack(b'<H', fp.read(2))[0]
-        data = fp.read(ln)
-        return cls(data.decode('utf-16'))
+        return cls.from_data(read_view(fp, ln))
 
 
 class UnicodeChars32TextRecord(UnicodeChars8TextRecord):
     type = 0xBA
+    __slots__ = ()
 
     def to_bytes(self):
         """
@@ -341,7 +417,7 @@ class UnicodeChars32TextRecord(UnicodeChars8TextRecord):
         >>> UnicodeChars32TextRecord(u'abc').to_bytes()
         b'\\xba\\x06\\x00\\x00\\x00a\\x00b\\x00c\\x00'
         """
-        data = self.value.encode('utf-16')[2:]  # skip bom
+        data = self.encode()
         bt = struct.pack(b'<B', self.type)
         bt += struct.pack(b'<I', len(data))
         bt += data
@@ -356,16 +432,17 @@ class UnicodeChars32TextRecord(UnicodeChars8TextRecord):
         'abc'
         """
         ln = struct.unpack(b'<I', fp.read(4))[0]
-        data = fp.read(ln)
-        return cls(data.decode('utf-16'))
+        return cls.from_data(read_view(fp, ln))
 
 
 class QNameDictionaryTextRecord(Text):
     type = 0xBC
+    __slots__ = ('prefix', 'index', '_dictionary')
 
-    def __init__(self, prefix, index):
+    def __init__(self, prefix, index, dictionary=None):
         self.prefix = prefix
         self.index = index
+        self._dictionary = dictionary
 
     def to_bytes(self):
         """
@@ -385,7 +462,7 @@ class QNameDictionaryTextRecord(Text):
         >>> str(QNameDictionaryTextRecord('b', 2))
         'b:Envelope'
         """
-        return '%s:%s' % (self.prefix, dictionary[self.index])
+        return '%s:%s' % (self.prefix, lookup(self.index, self._dictionary))
 
     @classmethod
     def parse(cls, fp):
@@ -398,11 +475,12 @@ class QNameDictionaryTextRecord(Text):
         prefix = chr(struct.unpack(b'<B', fp.read(1))[0] + ord('a'))
         idx = struct.unpack(b'<BBB', fp.read(3))
         index = idx[0] << 16 | idx[1] << 8 | idx[2]
-        return cls(prefix, index)
+        return cls(prefix, index, getattr(fp, 'dictionary', None))
 
 
 class FloatTextRecord(Text):
     type = 0x90
+    __slots__ = ('value',)
 
     def __init__(self, value):
         self.value = value
@@ -447,6 +525,7 @@ class FloatTextRecord(Text):
 
 class DoubleTextRecord(FloatTextRecord):
     type = 0x92
+    __slots__ = ()
 
     def __init__(self, value):
         self.value = value
@@ -491,6 +570,7 @@ class DoubleTextRecord(FloatTextRecord):
 
 class DecimalTextRecord(Text):
     type = 0x94
+    __slots__ = ('value',)
 
     def __init__(self, value):
         self.value = value
@@ -524,6 +604,7 @@ class DecimalTextRecord(Text):
 
 class DatetimeTextRecord(Text):
     type = 0x96
+    __slots__ = ('value', 'tz')
 
     def __init__(self, value, tz):
         self.value = value
@@ -573,14 +654,9 @@ class DatetimeTextRecord(Text):
         return DatetimeTextRecord(value, tz)
 
 
-class Chars8TextRecord(Text):
+class Chars8TextRecord(EncodedText):
     type = 0x98
-
-    def __init__(self, value):
-        if isinstance(value, str):
-            self.value = value
-        else:
-            self.value = str(value)
+    __slots__ = ()
 
     def __str__(self):
         r"""
@@ -596,7 +672,7 @@ class Chars8TextRecord(Text):
         >>> Chars8TextRecord('abc').to_bytes()
         b'\x98\x03abc'
         """
-        data = self.value.encode('utf-8')
+        data = self.encode()
         bt = struct.pack(b'<B', self.type)
         bt += struct.pack(b'<B', len(data))
         bt += data
@@ -612,19 +688,19 @@ class Chars8TextRecord(Text):
         'test'
         """
         ln = struct.unpack(b'<B', fp.read(1))[0]
-        value = fp.read(ln).decode('utf-8')
-        return cls(value)
+        return cls.from_data(read_view(fp, ln))
 
 
 class Chars16TextRecord(Chars8TextRecord):
     type = 0x9A
+    __slots__ = ()
 
     def to_bytes(self):
         r"""
         >>> Chars16TextRecord('abc').to_bytes()
         b'\x9a\x03\x00abc'
         """
-        data = self.value.encode('utf-8')
+        data = self.encode()
         bt = struct.pack(b'<B', self.type)
         bt += struct.pack(b'<H', len(data))
         bt += data
@@ -640,19 +716,19 @@ class Chars16TextRecord(Chars8TextRecord):
         'test'
         """
         ln = struct.unpack(b'<H', fp.read(2))[0]
-        value = fp.read(ln).decode('utf-8')
-        return cls(value)
+        return cls.from_data(read_view(fp, ln))
 
 
 class Chars32TextRecord(Chars8TextRecord):
     type = 0x9C
+    __slots__ = ()
 
     def to_bytes(self):
         r"""
         >>> Chars32TextRecord('abc').to_bytes()
         b'\x9c\x03\x00\x00\x00abc'
         """
-        data = self.value.encode('utf-8')
+        data = self.encode()
         bt = struct.pack(b'<B', self.type)
         bt += struct.pack(b'<I', len(data))
         bt += data
@@ -668,12 +744,12 @@ class Chars32TextRecord(Chars8TextRecord):
         'test'
         """
         ln = struct.unpack(b'<I', fp.read(4))[0]
-        value = fp.read(ln).decode('utf-8')
-        return cls(value)
+        return cls.from_data(read_view(fp, ln))
 
 
 class UniqueIdTextRecord(Text):
     type = 0xAC
+    __slots__ = ('uuid',)
 
     def __init__(self, *args, **kwargs):
         self.uuid = uuid.UUID(*args, **kwargs)
@@ -710,6 +786,7 @@ class UniqueIdTextRecord(Text):
 
 class UuidTextRecord(UniqueIdTextRecord):
     type = 0xB0
+    __slots__ = ()
 
     def __str__(self):
         """
@@ -721,115 +798,146 @@ class UuidTextRecord(UniqueIdTextRecord):
 
 class Bytes8TextRecord(Text):
     type = 0x9E
+    __slots__ = ('value',)
+
+    length = struct.Struct(b'<B')
+
+    # bytes encoded per write by write_base64, a multiple of 3 so the
+    # chunks concatenate to valid base64
+    BASE64_CHUNK = 3 * 16 * 1024
 
     def __init__(self, data):
         self.value = data
 
+    def _payload(self):
+        # the value as bytes like object, blobs are mapped from their file
+        if isinstance(self.value, Blob):
+            return self.value.mmap()
+        return self.value
+
+    @classmethod
+    def from_file(cls, file, length=None, offset=None):
+        """
+        creates the record for a payload stored in a file, see
+        :meth:`wcf.records.blobs.FileBlob.open`
+        """
+        return cls(FileBlob.open(file, length, offset))
+
+    def to_segments(self):
+        r"""
+        A payload stored in a file is returned as its
+        :class:`wcf.records.blobs.FileBlob`.
+
+        >>> Bytes8TextRecord(b'abc').to_segments()
+        [b'\x9e\x03', b'abc']
+        """
+        return [struct.pack(b'<B', self.type) +
+                self.length.pack(len(self.value)), self.value]
+
     def to_bytes(self):
         r"""
         >>> Bytes8TextRecord(b'abc').to_bytes()
         b'\x9e\x03abc'
         """
-        bt = struct.pack(b'<B', self.type)
-        bt += struct.pack(b'<B', len(self.value))
-        bt += self.value
-
-        return bytes(bt)
+        return b''.join([struct.pack(b'<B', self.type) +
+                         self.length.pack(len(self.value)), self._payload()])
 
     def __str__(self):
         r"""
         >>> str(Bytes8TextRecord(b'abc'))
         'YWJj'
         """
-        return base64.b64encode(self.value).decode()
+        return base64.b64encode(self._payload()).decode()
+
+    def write_base64(self, fp, chunk_size=None):
+        r"""
+        writes the value base64 encoded to the text stream fp, in chunks of
+        chunk_size (rounded down to a multiple of 3) bytes
+
+        >>> import io
+        >>> out = io.StringIO()
+        >>> Bytes8TextRecord(b'abcdefg').write_base64(out, chunk_size=4)
+        >>> out.getvalue()
+        'YWJjZGVmZw=='
+        """
+        chunk_size = chunk_size or self.BASE64_CHUNK
+        chunk_size = max(3, chunk_size - chunk_size % 3)
+        if isinstance(self.value, Blob):
+            chunks = self.value.chunks(chunk_size)
+        else:
+            value = memoryview(self.value)
+            chunks = (value[pos:pos + chunk_size]
+                      for pos in range(0, len(value), chunk_size))
+        for chunk in chunks:
+            fp.write(base64.b64encode(chunk).decode())
 
     @classmethod
     def parse(cls, fp):
         r"""
+        The value is a memoryview into the source buffer if fp is a
+        BufferReader, a :class:`wcf.records.blobs.Blob` if the payload
+        was passed to a blob sink, else bytes.
+
         >>> from io import BytesIO
         >>> fp = BytesIO(b'\x03abc')
         >>> bytes(Bytes8TextRecord.parse(fp).value)
         b'abc'
         """
-        ln = struct.unpack(b'<B', fp.read(1))[0]
-        data = struct.unpack(('%ds' % ln).encode(), fp.read(ln))[0]
-        return cls(data)
+        length = cls.length
+        ln = length.unpack(fp.read(length.size))[0]
+        return cls(read_blob(fp, ln))
 
 
 class Bytes16TextRecord(Bytes8TextRecord):
+    r"""
+    >>> Bytes16TextRecord(b'abc').to_bytes()
+    b'\xa0\x03\x00abc'
+    >>> from io import BytesIO
+    >>> bytes(Bytes16TextRecord.parse(BytesIO(b'\x03\x00abc')).value)
+    b'abc'
+    """
     type = 0xA0
+    __slots__ = ()
 
-    def __init__(self, data):
-        super(Bytes16TextRecord, self).__init__(data)
-
-    def to_bytes(self):
-        r"""
-        >>> Bytes16TextRecord(b'abc').to_bytes()
-        b'\xa0\x03\x00abc'
-        """
-        bt = struct.pack(b'<B', self.type)
-        bt += struct.pack(b'<H', len(self.value))
-        bt += self.value
-
-        return bytes(bt)
-
-    @classmethod
-    def parse(cls, fp):
-        r"""
-        >>> from io import BytesIO
-        >>> fp = BytesIO(b'\x03\x00abc')
-        >>> bytes(Bytes16TextRecord.parse(fp).value)
-        b'abc'
-        """
-        ln = struct.unpack(b'<H', fp.read(2))[0]
-        data = struct.unpack(('%ds' % ln).encode(), fp.read(ln))[0]
-        return cls(data)
+    length = struct.Struct(b'<H')
 
 
 class Bytes32TextRecord(Bytes8TextRecord):
+    r"""
+    >>> Bytes32TextRecord(b'abc').to_bytes()
+    b'\xa2\x03\x00\x00\x00abc'
+    >>> from io import BytesIO
+    >>> fp = BytesIO(b'\x03\x00\x00\x00abc')
+    >>> bytes(Bytes32TextRecord.parse(fp).value)
+    b'abc'
+    """
     type = 0xA2
+    __slots__ = ()
 
-    def __init__(self, data):
-        super(Bytes32TextRecord, self).__init__(data)
-
-    def to_bytes(self):
-        r"""
-        >>> Bytes32TextRecord(b'abc').to_bytes()
-        b'\xa2\x03\x00\x00\x00abc'
-        """
-        bt = struct.pack(b'<B', self.type)
-        bt += struct.pack(b'<I', len(self.value))
-        bt += self.value
-
-        return bytes(bt)
-
-    @classmethod
-    def parse(cls, fp):
-        r"""
-        >>> from io import BytesIO
-        >>> fp = BytesIO(b'\x03\x00\x00\x00abc')
-        >>> bytes(Bytes32TextRecord.parse(fp).value)
-        b'abc'
-        """
-        ln = struct.unpack(b'<I', fp.read(4))[0]
-        data = struct.unpack(('%ds' % ln).encode(), fp.read(ln))[0]
-        return cls(data)
+    length = struct.Struct(b'<I')
 
 
 class StartListTextRecord(Text):
     type = 0xA4
+    __slots__ = ()
+    stateless = True
 
 
 class EndListTextRecord(Text):
     type = 0xA6
+    __slots__ = ()
+    stateless = True
 
 
 class EmptyTextRecord(Text):
     type = 0xA8
+    __slots__ = ()
+    stateless = True
 
 
 class TimeSpanTextRecord(Text):
     type = 0xAE
+    __slots__ = ('value',)
 
     def __init__(self, value):
         self.value = value
@@ -859,9 +967,11 @@ class TimeSpanTextRecord(Text):
 
 class DictionaryTextRecord(Text):
     type = 0xAA
+    __slots__ = ('index', '_dictionary')
 
-    def __init__(self, index):
+    def __init__(self, index, dictionary=None):
         self.index = index
+        self._dictionary = dictionary
 
     def to_bytes(self):
         r"""
@@ -876,7 +986,7 @@ class DictionaryTextRecord(Text):
         >>> str(DictionaryTextRecord(2))
         'Envelope'
         """
-        return dictionary[self.index]
+        return lookup(self.index, self._dictionary)
 
     @classmethod
     def parse(cls, fp):
@@ -887,7 +997,7 @@ class DictionaryTextRecord(Text):
         'Envelope'
         """
         index = MultiByteInt31.parse(fp).value
-        return cls(index)
+        return cls(index, getattr(fp, 'dictionary', None))
 
 Record.add_records((ZeroTextRecord,
                     OneTextRecord,
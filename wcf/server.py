@@ -0,0 +1,312 @@
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+#  Copyright (c) 2011, Timo Schmid <tschmid@ernw.de>
+#  All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#  * Neither the name of the ERMW GmbH nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Long-running transcoding server.
+
+Starting Python and importing the record classes costs more than
+converting a typical message. A :class:`Server` does that once and
+converts messages sent over a Unix domain socket (or a localhost TCP
+socket) for any number of clients.
+
+Protocol, on a connection any number of requests are answered in order:
+
+- request: a byte with the operation (``D`` decodes a binary message to
+  XML, ``E`` encodes a XML document), the length of the payload as 4
+  byte unsigned integer in network byte order, the payload (XML in
+  UTF-8)
+- response: a byte with the status (``O`` ok, ``E`` error), the length
+  and the payload: the result or the error message. Requests larger
+  than the limit of the server are skipped and answered with an error.
+
+>>> import os, tempfile, threading
+>>> path = os.path.join(tempfile.mkdtemp(), 'wcf.sock')
+>>> server = Server(path)
+>>> thread = threading.Thread(target=server.serve_forever)
+>>> thread.start()
+>>> with Client(path) as client:
+...     data = client.encode('<Ping>1</Ping>')
+...     print(client.decode(data))
+<Ping>1</Ping>
+>>> server.shutdown(); server.server_close(); thread.join()
+"""
+from __future__ import absolute_import, unicode_literals
+
+import errno
+import os
+import socket
+import socketserver
+import stat
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+from wcf.codec import Codec
+
+__all__ = ['Server', 'Client', 'ServerError', 'DECODE', 'ENCODE']
+
+DECODE = b'D'
+ENCODE = b'E'
+OK = b'O'
+ERROR = b'E'
+
+_HEADER = struct.Struct(b'>cI')
+
+
+class ServerError(ValueError):
+    """the server couldn't convert a message, raised by the client"""
+
+
+def _recv_exactly(sock, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    pos = 0
+    while pos < size:
+        n = sock.recv_into(view[pos:])
+        if not n:
+            raise EOFError('connection closed inside a message')
+        pos += n
+    return bytes(buf)
+
+
+def _recv_header(sock):
+    # (type, size) of the next message, None if the peer closed the
+    # connection between messages
+    first = sock.recv(_HEADER.size)
+    if not first:
+        return None
+    if len(first) < _HEADER.size:
+        first += _recv_exactly(sock, _HEADER.size - len(first))
+    return _HEADER.unpack(first)
+
+
+def _skip(sock, size):
+    while size > 0:
+        n = len(sock.recv(min(size, 64 * 1024)))
+        if not n:
+            raise EOFError('connection closed inside a message')
+        size -= n
+
+
+def _send_message(sock, type, payload):
+    sock.sendall(_HEADER.pack(type, len(payload)) + payload)
+
+
+def _convert(options, operation, payload):
+    # runs in the server or a worker: returns (status, payload)
+    codec = Codec(**options)
+    try:
+        if operation == DECODE:
+            return OK, codec.to_xml(codec.decode(payload)).encode('utf-8')
+        if operation == ENCODE:
+            return OK, codec.encode(codec.from_xml(payload.decode('utf-8')))
+        return ERROR, b'unknown operation %r' % operation
+    except Exception as e:
+        return ERROR, ('%s: %s' % (type(e).__name__, e)).encode('utf-8')
+
+
+def _warm_up():
+    # imports everything the conversion needs before the first request
+    _convert({}, ENCODE, b'<Ping />')
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        server = self.server
+        sock = self.request
+        try:
+            while True:
+                header = _recv_header(sock)
+                if header is None:
+                    return
+                operation, size = header
+                if size > server.max_size:
+                    _skip(sock, size)
+                    status, payload = ERROR, (
+                        'request of %d bytes exceeds %d bytes' %
+                        (size, server.max_size)).encode('utf-8')
+                else:
+                    status, payload = server.convert(
+                        operation, _recv_exactly(sock, size))
+                _send_message(sock, status, payload)
+        except (EOFError, socket.error):
+            return
+
+
+def _remove_stale_socket(path):
+    # removes a socket left behind by a server which was killed; raises
+    # if path is something else or a server is still listening on it
+    try:
+        mode = os.stat(path).st_mode
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            return
+        raise
+    if not stat.S_ISSOCK(mode):
+        raise OSError(errno.EEXIST, 'exists and is no socket', path)
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except socket.error as e:
+        if e.errno != errno.ECONNREFUSED:
+            raise
+    else:
+        raise OSError(errno.EADDRINUSE, 'a server is listening on it',
+                      path)
+    finally:
+        probe.close()
+    os.unlink(path)
+
+
+class _UnixServer(socketserver.ThreadingMixIn,
+                  socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Server(object):
+    """
+    serves conversions on a Unix domain socket or a TCP socket, every
+    connection is handled by a thread
+
+    :param address: path of the Unix socket or (host, port) of a TCP
+                    socket; the TCP server has no authentication, bind it
+                    to localhost only
+    :param jobs: number of worker processes converting the messages, 0
+                 converts in the connection threads
+    :param max_size: maximum size of a request, larger ones are skipped
+                     and answered with an error
+    :param options: :class:`wcf.codec.Codec` options
+    """
+
+    def __init__(self, address, jobs=0, max_size=64 * 1024 * 1024,
+                 **options):
+        self.address = address
+        self.max_size = max_size
+        self.options = options
+        self.pool = None
+        if not isinstance(address, tuple):
+            _remove_stale_socket(address)
+        if jobs:
+            self.pool = ProcessPoolExecutor(jobs, initializer=_warm_up)
+            # starts the workers before the connection threads
+            self.pool.submit(_warm_up).result()
+        else:
+            _warm_up()
+        if isinstance(address, tuple):
+            self._server = _TCPServer(address, _Handler)
+        else:
+            self._server = _UnixServer(address, _Handler)
+        self._server.convert = self.convert
+        self._server.max_size = max_size
+
+    @property
+    def server_address(self):
+        """the bound address, with the actual port of a TCP server"""
+        return self._server.server_address
+
+    def convert(self, operation, payload):
+        """returns (status, payload) of a request"""
+        if self.pool is None:
+            return _convert(self.options, operation, payload)
+        return self.pool.submit(_convert, self.options, operation,
+                                payload).result()
+
+    def serve_forever(self, poll_interval=0.5):
+        """handles requests until :meth:`shutdown` is called"""
+        self._server.serve_forever(poll_interval)
+
+    def shutdown(self):
+        """stops serve_forever, called from another thread"""
+        self._server.shutdown()
+
+    def server_close(self):
+        """closes the socket and the workers"""
+        self._server.server_close()
+        if not isinstance(self.address, tuple):
+            try:
+                os.unlink(self.address)
+            except OSError:
+                pass
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+class Client(object):
+    """
+    connection to a :class:`Server`
+
+    :param address: path of the Unix socket or (host, port)
+    :param timeout: socket timeout in seconds
+    """
+
+    def __init__(self, address, timeout=None):
+        if isinstance(address, tuple):
+            self.sock = socket.create_connection(address, timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(address)
+
+    def request(self, operation, payload):
+        """
+        sends a request and returns the payload of the response
+
+        :raises ServerError: if the server couldn't convert the message
+        """
+        _send_message(self.sock, operation, payload)
+        header = _recv_header(self.sock)
+        if header is None:
+            raise EOFError('the server closed the connection')
+        status, size = header
+        payload = _recv_exactly(self.sock, size)
+        if status != OK:
+            raise ServerError(payload.decode('utf-8', 'replace'))
+        return payload
+
+    def decode(self, data):
+        """returns the XML of a binary message"""
+        return self.request(DECODE, bytes(data)).decode('utf-8')
+
+    def encode(self, xml):
+        """returns the binary message of a XML document"""
+        return self.request(ENCODE, xml.encode('utf-8'))
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,200 @@
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+#  Copyright (c) 2011, Timo Schmid <tschmid@ernw.de>
+#  All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#  * Neither the name of the ERMW GmbH nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Streams of many messages.
+
+A binary stream carries every message behind its length, either as a
+MultiByteInt31 (``'varint'``, the encoding used by the records
+themselves) or as a 4 byte unsigned integer in network byte order
+(``'uint32'``). XML documents are streamed as NDJSON, one JSON object
+per line.
+
+>>> from io import BytesIO
+>>> from wcf.records import ShortElementRecord
+>>> fp = BytesIO()
+>>> write_message(fp, [ShortElementRecord('Ping')])
+>>> write_message(fp, b'@\\x04Pong\\x01')
+>>> fp.getvalue()
+b'\\x07@\\x04Ping\\x01\\x07@\\x04Pong\\x01'
+>>> _ = fp.seek(0)
+>>> [str(r[0]) for r in iter_messages(fp)]
+['<Ping>', '<Pong>']
+
+>>> out = BytesIO()
+>>> write_ndjson(out, {'index': 0, 'xml': '<Ping></Ping>'})
+>>> out.getvalue()
+b'{"index": 0, "xml": "<Ping></Ping>"}\\n'
+>>> list(iter_ndjson(BytesIO(out.getvalue() + b'"<Pong />"\\n')))
+['<Ping></Ping>', '<Pong />']
+"""
+from __future__ import absolute_import, unicode_literals
+
+import json
+import struct
+
+from wcf.codec import Codec
+from wcf.datatypes import MultiByteInt31
+from wcf.records import dump_records
+
+__all__ = ['FRAMINGS', 'read_frame', 'iter_frames', 'iter_messages',
+           'write_message', 'iter_ndjson', 'write_ndjson']
+
+FRAMINGS = ('varint', 'uint32')
+
+_UINT32 = struct.Struct(b'>I')
+
+
+def _read_exactly(fp, size):
+    # pipes and sockets may return less than requested
+    data = fp.read(size)
+    if len(data) == size:
+        return data
+    chunks = [data]
+    remaining = size - len(data)
+    while remaining:
+        data = fp.read(remaining)
+        if not data:
+            raise EOFError('stream ended inside a message')
+        chunks.append(data)
+        remaining -= len(data)
+    return b''.join(chunks)
+
+
+def read_frame(fp, framing='varint', max_size=64 * 1024 * 1024):
+    """
+    reads the next message of a length prefixed stream
+
+    :param framing: ``'varint'`` or ``'uint32'``
+    :param max_size: a longer message raises a ValueError before it's
+                     read
+    :returns: the bytes of the message, None at the end of the stream
+    """
+    if framing == 'varint':
+        first = fp.read(1)
+        if not first:
+            return None
+        size = 0
+        byte = ord(first)
+        for shift in range(0, 35, 7):
+            size |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+            byte = ord(_read_exactly(fp, 1))
+        else:
+            raise ValueError('invalid message length')
+    elif framing == 'uint32':
+        prefix = fp.read(_UINT32.size)
+        if not prefix:
+            return None
+        if len(prefix) < _UINT32.size:
+            prefix += _read_exactly(fp, _UINT32.size - len(prefix))
+        size, = _UINT32.unpack(prefix)
+    else:
+        raise ValueError('unknown framing %r' % framing)
+    if size > max_size:
+        raise ValueError('message of %d bytes exceeds max_size' % size)
+    return _read_exactly(fp, size)
+
+
+def iter_frames(fp, framing='varint', max_size=64 * 1024 * 1024):
+    """yields the messages of a length prefixed stream as bytes"""
+    while True:
+        data = read_frame(fp, framing, max_size)
+        if data is None:
+            return
+        yield data
+
+
+def iter_messages(fp, framing='varint', max_size=64 * 1024 * 1024,
+                  session=None, **options):
+    """
+    yields the record trees of the messages of a length prefixed stream,
+    one at a time
+
+    :param fp: binary file like object
+    :param framing: ``'varint'`` or ``'uint32'``
+    :param session: a :class:`wcf.dictionary.DictionarySession` for all
+                    messages of the stream
+    :param options: :class:`wcf.codec.Codec` options
+    """
+    codec = Codec(**options)
+    for data in iter_frames(fp, framing, max_size):
+        yield codec.decode(data, session)
+
+
+def write_message(fp, message, framing='varint', session=None):
+    """
+    writes a message behind its length
+
+    :param message: a record tree or its bytes
+    :param session: session dictionary, see
+                    :func:`wcf.records.dump_records`
+    """
+    if not isinstance(message, (bytes, bytearray, memoryview)):
+        message = dump_records(message, session)
+    if framing == 'varint':
+        prefix = MultiByteInt31(len(message)).to_bytes()
+    elif framing == 'uint32':
+        prefix = _UINT32.pack(len(message))
+    else:
+        raise ValueError('unknown framing %r' % framing)
+    fp.write(prefix)
+    fp.write(message)
+
+
+def iter_ndjson(fp, errors=False):
+    """
+    yields the XML documents of a NDJSON stream: lines with a JSON
+    string or an object with the document in ``"xml"``. Empty lines are
+    skipped, as are objects without ``"xml"`` (like the errors written by
+    ``wcf2xml.py --ndjson``) unless errors is True: then those objects
+    are yielded as they are, so the position of the following documents
+    in the stream is known.
+
+    >>> from io import BytesIO
+    >>> lines = BytesIO(b'{"index": 0, "error": "failed"}\\n"<a />"\\n')
+    >>> list(iter_ndjson(lines, errors=True))
+    [{'index': 0, 'error': 'failed'}, '<a />']
+    """
+    for line in fp:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        value = json.loads(line)
+        if isinstance(value, dict) and value.get('xml') is not None:
+            value = value['xml']
+        elif isinstance(value, dict) and not errors:
+            continue
+        yield value
+
+
+def write_ndjson(fp, value):
+    """writes value as a line of JSON to the binary file object fp"""
+    fp.write(json.dumps(value, sort_keys=True).encode('utf-8') + b'\n')
@@ -0,0 +1,164 @@
+# vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
+#  Copyright (c) 2011, Timo Schmid <tschmid@ernw.de>
+#  All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#  * Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#  * Neither the name of the ERMW GmbH nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Structural validation of binary xml documents.
+
+The buffer is walked once with :mod:`wcf.records.scanner`; no record
+objects are created and no strings are decoded.
+"""
+from __future__ import absolute_import, unicode_literals
+
+from wcf.records.scanner import (ScanError, KINDS, ELEMENT, END_ELEMENT,
+                                 ATTRIBUTE, TEXT, TEXT_END, ARRAY,
+                                 read_mbi31, skip_element_header,
+                                 skip_record, text_payload)
+
+__all__ = ['ValidationResult', 'validate']
+
+
+class ValidationResult(object):
+    """
+    outcome of :func:`validate`. Evaluates to True if the document is
+    valid.
+
+    :ivar error: error message or None
+    :ivar offset: byte offset of the error or None
+    :ivar elements: number of elements (array items included)
+    :ivar max_depth: maximal element nesting
+    :ivar text_bytes: total length of all text payloads
+    """
+
+    def __init__(self, error=None, offset=None, elements=0, max_depth=0,
+                 text_bytes=0):
+        self.error = error
+        self.offset = offset
+        self.elements = elements
+        self.max_depth = max_depth
+        self.text_bytes = text_bytes
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __bool__(self):
+        return self.ok
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        if self.ok:
+            return ('<ValidationResult(ok, elements=%d, max_depth=%d, '
+                    'text_bytes=%d)>' % (self.elements, self.max_depth,
+                                         self.text_bytes))
+        return '<ValidationResult(%s at offset %d)>' % (self.error,
+                                                        self.offset)
+
+
+def validate(data):
+    """
+    checks that data is a well formed binary xml document: known record
+    types, one balanced root element, no text outside of it, attributes
+    only after elements, lengths within the buffer and valid ArrayRecord
+    headers.
+
+    :param data: bytes like object
+    :returns: ValidationResult
+
+    >>> validate(b'\\x40\\x01a\\x40\\x01b\\x99\\x01x\\x01')
+    <ValidationResult(ok, elements=2, max_depth=2, text_bytes=1)>
+    >>> validate(b'\\x40\\x01a\\x99\\x05x')
+    <ValidationResult(text record exceeds buffer at offset 3)>
+    >>> validate(b'\\x40\\x01a\\x40\\x01b\\x01')
+    <ValidationResult(element not closed at offset 7)>
+    >>> validate(b'\\x40\\x01a\\x01\\x01')
+    <ValidationResult(unbalanced EndElement at offset 4)>
+    >>> validate(b'\\x40\\x01a\\x01\\x9b\\x01\\x00x')
+    <ValidationResult(unbalanced EndElement at offset 4)>
+    >>> validate(b'\\x40\\x01a\\x01\\x40\\x01b\\x01')
+    <ValidationResult(multiple root elements at offset 4)>
+    >>> validate(b'\\x40\\x01a\\xff')
+    <ValidationResult(unknown record type 0xFF at offset 3)>
+    """
+    kinds = KINDS
+    pos = 0
+    end = len(data)
+    depth = 0
+    max_depth = 0
+    elements = 0
+    text_bytes = 0
+    try:
+        while pos < end:
+            kind = kinds[data[pos]]
+            if kind == ELEMENT:
+                if not depth and elements:
+                    raise ScanError('multiple root elements', pos)
+                pos = skip_element_header(data, pos)
+                elements += 1
+                depth += 1
+                if depth > max_depth:
+                    max_depth = depth
+            elif kind == TEXT or kind == TEXT_END:
+                if kind == TEXT_END and depth == 0:
+                    raise ScanError('unbalanced EndElement', pos)
+                if depth == 0:
+                    raise ScanError('text outside the root element', pos)
+                start, stop = text_payload(data, pos)
+                text_bytes += stop - start
+                pos = stop
+                if kind == TEXT_END:
+                    depth -= 1
+            elif kind == END_ELEMENT:
+                if depth == 0:
+                    raise ScanError('unbalanced EndElement', pos)
+                depth -= 1
+                pos += 1
+            elif kind == ATTRIBUTE:
+                raise ScanError('attribute without element', pos)
+            else:
+                stop = skip_record(data, pos)
+                if kind == ARRAY:
+                    # skip_record validated the header already
+                    hdr = skip_element_header(data, pos + 1)
+                    count, items = read_mbi31(data, hdr + 2)
+                    if not depth and (elements or count > 1):
+                        # an array at the top level repeats the root
+                        raise ScanError('multiple root elements', pos)
+                    elements += count
+                    text_bytes += stop - items
+                    if depth + 1 > max_depth:
+                        max_depth = depth + 1
+                pos = stop
+        if depth:
+            raise ScanError('element not closed', pos)
+        if not elements:
+            raise ScanError('no element found', pos)
+    except ScanError as e:
+        return ValidationResult(e.msg,
+                                e.offset, elements, max_depth, text_bytes)
+    return ValidationResult(None, None, elements, max_depth, text_bytes)
+
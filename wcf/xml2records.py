@@ -1,4 +1,4 @@
-#!/usr/bin/env python2
+#!/usr/bin/env python3
 # vim: set ts=4 sw=4 tw=79 fileencoding=utf-8:
 
 from __future__ import absolute_import
@@ -18,7 +18,7 @@ import logging
 log = logging.getLogger(__name__)
 
 from wcf.records import *
-from wcf.dictionary import inverted_dict
+from wcf.dictionary import DEFAULT_DICTIONARY, resolver
 
 
 classes = Record.records.values()
@@ -37,43 +37,58 @@ datetime_reg = re.compile(r'^\d{4}-\d{2}-\d{2}(T\d{2}:\d{2}:\d{2}(\.\d{1,7})?)?(
 
 class XMLParser(HTMLParser):
 
+    # static dictionary, session dictionary which names are added to and
+    # the one of both the records resolve their ids with, see parse
+    dictionary = DEFAULT_DICTIONARY
+    session = None
+    resolver = None
+
     def reset(self):
         HTMLParser.reset(self)
         self.records = []
-        self.last_record = Record()
-        self.last_record.childs = self.records
-        self.last_record.parent = None
+        # childs lists of the open elements
+        self.stack = [self.records]
         self.data = None
         self.is_cdata = False
 
+    def _index(self, string):
+        # dictionary id of string: from the static dictionary or, with a
+        # session, from the session dictionary which it's added to
+        index = self.dictionary.get(string)
+        if index is None and self.session is not None:
+            index = self.session.add(string)
+        return index
+
     def _parse_tag(self, tag):
         if ':' in tag:
             prefix = tag[:tag.find(':')]
             name = tag[tag.find(':')+1:]
+            index = self._index(name)
 
             if len(prefix) == 1:
                 cls_name = 'Element' + prefix.upper() + 'Record'
-                if name in inverted_dict:
+                if index is not None:
                     cls_name = 'PrefixDictionary' + cls_name
                     log.debug('New %s: %s' % (cls_name, name))
-                    return classes[cls_name](inverted_dict[name])
+                    return classes[cls_name](index, self.resolver)
                 else:
                     cls_name = 'Prefix' + cls_name
                     log.debug('New %s: %s' % (cls_name, name))
                     return classes[cls_name](name)
             else:
-                if name in inverted_dict:
+                if index is not None:
                     log.debug('New DictionaryElementRecord: %s:%s' % 
                             (prefix, name))
-                    return DictionaryElementRecord(prefix,
-                            inverted_dict[name])
+                    return DictionaryElementRecord(prefix, index,
+                            self.resolver)
                 else:
                     log.debug('New ElementRecord: %s:%s' % (prefix, name))
                     return ElementRecord(prefix, name)
         else:
-            if tag in inverted_dict:
+            index = self._index(tag)
+            if index is not None:
                 log.debug('New ShortDictionaryElementRecord: %s' % (tag, ))
-                return ShortDictionaryElementRecord(inverted_dict[tag])
+                return ShortDictionaryElementRecord(index, self.resolver)
             else:
                 log.debug('New ShortElementRecord: %s' % (tag, ))
                 return ShortElementRecord(tag)
@@ -84,7 +99,7 @@ class XMLParser(HTMLParser):
             return
         log.debug('New %s: %s' % (type(textrecord).__name__, data))
 
-        self.last_record.childs.append(textrecord)
+        self.stack[-1].append(textrecord)
         #if end:
         #    textrecord.type += 1
 
@@ -106,8 +121,10 @@ class XMLParser(HTMLParser):
             return FalseTextRecord()
         elif data.lower() == 'true':
             return TrueTextRecord()
-        elif len(data) > 3 and data[1] == ':' and data[2:] in inverted_dict:
-            return QNameDictionaryTextRecord(data[0], inverted_dict[data[2:]])
+        elif (len(data) > 3 and data[1] == ':' and
+              self.dictionary.get(data[2:]) is not None):
+            return QNameDictionaryTextRecord(
+                data[0], self.dictionary.get(data[2:]), self.resolver)
         elif uniqueid_reg.match(data):
             m = uniqueid_reg.match(data)
             return UniqueIdTextRecord(m.group(1))
@@ -139,8 +156,9 @@ class XMLParser(HTMLParser):
                 return Bytes32TextRecord(data)
         elif float_reg.match(data):
             return DoubleTextRecord(float(data))
-        elif data in inverted_dict:
-            return DictionaryTextRecord(inverted_dict[data])
+        elif self.dictionary.get(data) is not None:
+            return DictionaryTextRecord(self.dictionary.get(data),
+                                        self.resolver)
         elif datetime_reg.match(data) and False:  # TODO
             t = data.split('Z')
             tz = 0
@@ -181,35 +199,42 @@ class XMLParser(HTMLParser):
             name   = name[name.find(':')+1:]
 
             if prefix == 'xmlns':
-                if value in inverted_dict:
-                    return DictionaryXmlnsAttributeRecord(name,
-                            inverted_dict[value])
+                index = self._index(value)
+                if index is not None:
+                    return DictionaryXmlnsAttributeRecord(name, index,
+                            self.resolver)
                 else:
                     return XmlnsAttributeRecord(name, value)
             elif len(prefix) == 1:
                 value = self._parse_data(value)
                 cls_name = 'Attribute' + prefix.upper() + 'Record'
-                if name in inverted_dict:
+                index = self._index(name)
+                if index is not None:
                     return classes['PrefixDictionary' +
-                            cls_name](inverted_dict[name], value)
+                            cls_name](index, value, self.resolver)
                 else:
                     return classes['Prefix' + cls_name](name, value)
             else:
                 value = self._parse_data(value)
-                if name in inverted_dict:
-                    return DictionaryAttributeRecord(prefix,
-                            inverted_dict[name], value)
+                index = self._index(name)
+                if index is not None:
+                    return DictionaryAttributeRecord(prefix, index, value,
+                            self.resolver)
                 else:
                     return AttributeRecord(prefix, name, value)
         elif name == 'xmlns':
-            if value in inverted_dict:
-                return ShortDictionaryXmlnsAttributeRecord(inverted_dict[value])
+            index = self._index(value)
+            if index is not None:
+                return ShortDictionaryXmlnsAttributeRecord(index,
+                        self.resolver)
             else:
                 return ShortXmlnsAttributeRecord(value)
         else:
             value = self._parse_data(value)
-            if name in inverted_dict:
-                return ShortDictionaryAttributeRecord(inverted_dict[name], value)
+            index = self._index(name)
+            if index is not None:
+                return ShortDictionaryAttributeRecord(index, value,
+                        self.resolver)
             else:
                 return ShortAttributeRecord(name, value)
 
@@ -222,9 +247,8 @@ class XMLParser(HTMLParser):
         el = self._parse_tag(tag)
         for n, v in attrs:
             el.attributes.append(self._parse_attr(n, v))
-        self.last_record.childs.append(el)
-        el.parent = self.last_record
-        self.last_record = el
+        self.stack[-1].append(el)
+        self.stack.append(el.childs)
 
     def handle_startendtag(self, tag, attrs):
         if self.data:
@@ -235,7 +259,7 @@ class XMLParser(HTMLParser):
         el = self._parse_tag(tag)
         for n, v in attrs:
             el.attributes.append(self._parse_attr(n, v))
-        self.last_record.childs.append(el)
+        self.stack[-1].append(el)
         #self.last_record.childs.append(EndElementRecord())
 
     def handle_endtag(self, tag):
@@ -243,9 +267,9 @@ class XMLParser(HTMLParser):
             self._store_data(self.data, True, self.is_cdata)
             self.data = None
         else:
-            pass#self.last_record.childs.append(EndElementRecord())
+            pass#self.stack[-1].append(EndElementRecord())
 
-        self.last_record = self.last_record.parent
+        self.stack.pop()
 
     def handle_data(self, data):
         self.is_cdata = self.is_cdata or self.interesting == interesting_cdata
@@ -271,7 +295,7 @@ class XMLParser(HTMLParser):
             self.data = None
             self.is_cdata = False
 
-        self.last_record.childs.append(CommentRecord(comment))
+        self.stack[-1].append(CommentRecord(comment))
 
     def parse_marked_section(self, i, report=1):
         try:
@@ -304,11 +328,17 @@ class XMLParser(HTMLParser):
         return match.end(0)
 
     @classmethod
-    def parse(cls, data):
+    def parse(cls, data, session=None, dictionary=None):
         """
         Parses a XML String/Fileobject into a Record tree
 
         :param data: a XML string or fileobject
+        :param session: a :class:`wcf.dictionary.DictionarySession`; names
+                        and namespaces missing in the static dictionary
+                        are added to it and encoded by their session id
+        :param dictionary: the static :class:`wcf.dictionary.Dictionary`,
+                           by default the default dictionary; with a
+                           session the one of the session
         :returns: a Record tree
 
         >>> from wcf.records import dump_records, print_records
@@ -320,8 +350,20 @@ class XMLParser(HTMLParser):
         <s:Envelope>
          <b:Body></b:Body>
         </s:Envelope>
+
+        >>> from wcf.dictionary import DictionarySession
+        >>> session = DictionarySession()
+        >>> r = XMLParser.parse('<Order><Order /></Order>', session)
+        >>> dump_records(r, session)
+        b'\\x06\\x05OrderB\\x01B\\x01\\x01\\x01'
         """
         p = cls()
+        p.session = session
+        p.resolver = resolver(dictionary, session)
+        if session is not None:
+            p.dictionary = session.dictionary
+        elif dictionary is not None:
+            p.dictionary = dictionary
         xml = None
         if isinstance(data, str):
             xml = data
@@ -1,4 +1,4 @@
-#!/usr/bin/env python2
+#!/usr/bin/env python3
 #  Copyright (c) 2011, Timo Schmid <tschmid@ernw.de>
 #  All rights reserved.
 #  
@@ -29,16 +29,6 @@
 
 if __name__ == '__main__':
     import sys
-    from wcf.records import Record, print_records
+    from wcf.cli import main
 
-    if sys.version_info >= (3, 0, ):
-        fp = sys.stdin.buffer
-    else:
-        fp = sys.stdin
-    if len(sys.argv) > 1:
-        filename = sys.argv[1]
-        fp = open(filename, 'rb')
-    
-    with fp:
-        records = Record.parse(fp)
-        print_records(records)
+    sys.exit(main('decode'))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+#  Copyright (c) 2011, Timo Schmid <tschmid@ernw.de>
+#  All rights reserved.
+#  
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#  * Redistributions of source code must retain the above copyright 
+#    notice, this list of conditions and the following disclaimer.
+#  * Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#  * Neither the name of the ERMW GmbH nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+if __name__ == '__main__':
+    import argparse
+    import signal
+    import sys
+    from wcf.server import Server
+
+    parser = argparse.ArgumentParser(
+        description='serves binary <-> XML conversions on a Unix domain '
+                    'socket or a localhost TCP port, see wcf.server for '
+                    'the protocol')
+    parser.add_argument('--socket', metavar='PATH',
+                        help='path of the Unix domain socket')
+    parser.add_argument('--tcp', metavar='PORT', type=int,
+                        help='TCP port on 127.0.0.1')
+    parser.add_argument('-j', '--jobs', type=int, default=0,
+                        help='number of worker processes, by default the '
+                             'connection threads convert')
+    args = parser.parse_args()
+    if (args.socket is None) == (args.tcp is None):
+        parser.error('either --socket or --tcp is required')
+
+    address = args.socket if args.tcp is None else ('127.0.0.1', args.tcp)
+    try:
+        server = Server(address, jobs=args.jobs)
+    except (IOError, OSError) as e:
+        parser.error(str(e))
+    # the socket is removed on SIGTERM like on ^C
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    sys.stderr.write('serving on %s\n' % (server.server_address,))
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()